@@ -52,89 +52,80 @@ class MemoryFormationOutputSchema(BaseIOSchema):
     )
 
 
-# Initialize the system prompt generator with more selective criteria
-memory_formation_prompt = SystemPromptGenerator(
-    background=[
-        "You are an AI specialized in identifying and preserving truly significant, long-term relevant information about users.",
-        "You focus on extracting information that will remain relevant and useful over extended periods.",
-        "You carefully filter out temporary states, trivial events, and time-bound information.",
-        "You carefully filter out any memories that are already in the memory store.",
-        "You understand the difference between temporarily relevant details and permanently useful knowledge.",
-    ],
-    steps=[
-        "Analyze both the user's message and the assistant's message for context",
-        "Consider the conversation flow to better understand the information's significance",
-        "Look for information meeting these criteria:",
-        "  - Permanent or long-lasting relevance (e.g., traits, background, significant relationships)",
-        "  - Important biographical details (e.g., health conditions, cultural background)",
-        "  - Major life events that shape the user's context",
-        "  - Information that would be valuable months or years from now",
-        "Filter out information that is:",
-        "  - Temporary or time-bound",
-        "  - Trivial daily events",
-        "  - Current activities or states",
-        "  - Administrative or routine matters",
-        "  - Already in the existing memories",
-        "For each truly significant piece of information:",
-        "  - Formulate it in a way that preserves long-term relevance",
-        "  - Choose the appropriate memory type",
-        "  - Express it clearly and timelessly",
-    ],
-    output_instructions=[
-        "Create memories only for information with lasting significance",
-        "Do not create memories of things that are already in the memory store",
-        "Format memories to be relevant regardless of when they are accessed",
-        "Focus on permanent traits, important relationships, and significant events",
-        "Exclude temporary states and trivial occurrences",
-        "When in doubt, only store information that would be valuable in future conversations",
-    ],
-)
+def create_memory_formation_agent(
+    client: Optional[instructor.Instructor] = None,
+) -> BaseAgent:
+    """Create a memory formation agent with its own history and context providers.
+
+    Args:
+        client: Optional instructor client to share between agents. If not provided,
+            a new OpenAI client is created.
+    """
+    # Initialize the system prompt generator with more selective criteria
+    memory_formation_prompt = SystemPromptGenerator(
+        background=[
+            "You are an AI specialized in identifying and preserving truly significant, long-term relevant information about users.",
+            "You focus on extracting information that will remain relevant and useful over extended periods.",
+            "You carefully filter out temporary states, trivial events, and time-bound information.",
+            "You carefully filter out any memories that are already in the memory store.",
+            "You understand the difference between temporarily relevant details and permanently useful knowledge.",
+        ],
+        steps=[
+            "Analyze both the user's message and the assistant's message for context",
+            "Consider the conversation flow to better understand the information's significance",
+            "Look for information meeting these criteria:",
+            "  - Permanent or long-lasting relevance (e.g., traits, background, significant relationships)",
+            "  - Important biographical details (e.g., health conditions, cultural background)",
+            "  - Major life events that shape the user's context",
+            "  - Information that would be valuable months or years from now",
+            "Filter out information that is:",
+            "  - Temporary or time-bound",
+            "  - Trivial daily events",
+            "  - Current activities or states",
+            "  - Administrative or routine matters",
+            "  - Already in the existing memories",
+            "For each truly significant piece of information:",
+            "  - Formulate it in a way that preserves long-term relevance",
+            "  - Choose the appropriate memory type",
+            "  - Express it clearly and timelessly",
+        ],
+        output_instructions=[
+            "Create memories only for information with lasting significance",
+            "Do not create memories of things that are already in the memory store",
+            "Format memories to be relevant regardless of when they are accessed",
+            "Focus on permanent traits, important relationships, and significant events",
+            "Exclude temporary states and trivial occurrences",
+            "When in doubt, only store information that would be valuable in future conversations",
+        ],
+    )
 
-# Create the agent configuration
-memory_formation_config = BaseAgentConfig(
-    client=instructor.from_openai(OpenAI(api_key=os.getenv("OPENAI_API_KEY"))),
-    model="gpt-4o-mini",
-    memory=AgentMemory(max_messages=10),
-    system_prompt_generator=memory_formation_prompt,
-    input_schema=MemoryFormationInputSchema,
-    output_schema=MemoryFormationOutputSchema,
-)
+    # Create the agent configuration
+    memory_formation_config = BaseAgentConfig(
+        client=client
+        or instructor.from_openai(OpenAI(api_key=os.getenv("OPENAI_API_KEY"))),
+        model="gpt-4o-mini",
+        memory=AgentMemory(max_messages=10),
+        system_prompt_generator=memory_formation_prompt,
+        input_schema=MemoryFormationInputSchema,
+        output_schema=MemoryFormationOutputSchema,
+    )
 
-# Create the memory formation agent
-memory_formation_agent = BaseAgent(memory_formation_config)
+    return BaseAgent(memory_formation_config)
 
 
 if __name__ == "__main__":
     from rich.console import Console
     from rich.panel import Panel
 
+    from chat_with_memory.tools.eval_fixtures import TEST_CONVERSATIONS
+
     console = Console()
+    memory_formation_agent = create_memory_formation_agent()
     store_tool = MemoryStoreTool()
     query_tool = MemoryQueryTool()
 
-    # Update test examples to use the new input format
-    test_inputs = [
-        # Core biographical memories - health
-        {
-            "last_assistant_msg": "Is there anything important I should know about your health?",
-            "last_user_msg": "Yes, actually - I have a severe shellfish allergy that was discovered when I was 7 years old. It causes anaphylaxis and I always carry an EpiPen. I also have mild asthma that acts up during pollen season. I've been feeling a bit under the weather lately with a cold, but that's temporary.",
-        },
-        # Core biographical memories - background
-        {
-            "last_assistant_msg": "Tell me about your background.",
-            "last_user_msg": "I come from a multicultural family - my mother is Japanese and my father is Brazilian. I grew up speaking three languages at home: Portuguese, Japanese, and English. I have a PhD in Quantum Computing from MIT, which I completed in 2019. I've been working in quantum cryptography ever since. My coffee machine broke this morning and I had a terrible commute, but that's just today's drama!",
-        },
-        # Significant events and relationships
-        {
-            "last_assistant_msg": "Any significant changes in your life recently?",
-            "last_user_msg": "Yes, actually - I just got engaged last month to Alex, whom I met during our medical residency at Mayo Clinic. We're planning to move to Boston next year for my new position as Head of Cardiology at Mass General. My sister Maria just had her first child too - I'm an aunt now! The weather's been awful lately, and I need to get my car fixed, but those are minor concerns.",
-        },
-        # Work and professional development
-        {
-            "last_assistant_msg": "Tell me about your work.",
-            "last_user_msg": "I'm leading Project Aurora, our company's quantum-resistant cryptography implementation. It's a $2.5M initiative in collaboration with IBM Quantum, targeting Q4 2024 for rollout. I manage a team of 15 people and we're pioneering new approaches in post-quantum security. My office chair is uncomfortable and the AC is acting up, but that's not important in the grand scheme of things.",
-        },
-    ]
+    # Conversations shared with the retrieval evaluation fixtures
+    test_inputs = TEST_CONVERSATIONS
 
     # Store formed memories
     stored_memories = []
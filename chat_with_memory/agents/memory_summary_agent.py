@@ -0,0 +1,79 @@
+import instructor
+from openai import OpenAI
+import os
+import threading
+from typing import List, Optional
+from pydantic import Field
+
+from atomic_agents.agents.base_agent import BaseAgent, BaseAgentConfig, BaseIOSchema
+from atomic_agents.lib.components.system_prompt_generator import SystemPromptGenerator
+
+
+class MemorySummaryInputSchema(BaseIOSchema):
+    """Input schema for the Memory Summary Agent."""
+
+    memories: List[str] = Field(
+        ...,
+        description="Related memories about the user, most representative first",
+    )
+
+
+class MemorySummaryOutputSchema(BaseIOSchema):
+    """Output schema for the Memory Summary Agent."""
+
+    summary: str = Field(
+        ..., description="A one or two sentence summary of what the memories share"
+    )
+
+
+def create_memory_summary_agent(
+    client: Optional[instructor.Instructor] = None,
+) -> BaseAgent:
+    """Create an agent summarizing a cluster of related memories.
+
+    Args:
+        client: Optional instructor client to share between agents. If not provided,
+            a new OpenAI client is created.
+    """
+    return BaseAgent(
+        BaseAgentConfig(
+            client=client
+            or instructor.from_openai(OpenAI(api_key=os.getenv("OPENAI_API_KEY"))),
+            model="gpt-4o-mini",
+            system_prompt_generator=SystemPromptGenerator(
+                background=[
+                    "You condense groups of related memories about a user into short summaries.",
+                ],
+                steps=[
+                    "Identify the topic the memories have in common",
+                    "Keep the details that stay relevant over time, such as names and dates",
+                ],
+                output_instructions=[
+                    "Write at most two sentences",
+                    "Only state facts found in the memories",
+                ],
+            ),
+            input_schema=MemorySummaryInputSchema,
+            output_schema=MemorySummaryOutputSchema,
+        )
+    )
+
+
+class AgentSummarizer:
+    """Summarizer for the clustered backend that asks an agent for each summary."""
+
+    def __init__(self, agent: Optional[BaseAgent] = None) -> None:
+        """Initialize the summarizer.
+
+        Args:
+            agent: Optional summary agent; if not provided, one is created
+        """
+        self.agent = agent or create_memory_summary_agent()
+        self._lock = threading.Lock()
+
+    def __call__(self, documents: List[str]) -> str:
+        # Clusters are summarized independently, so no history is kept
+        with self._lock:
+            self.agent.reset_memory()
+            response = self.agent.run(MemorySummaryInputSchema(memories=documents))
+        return response.summary
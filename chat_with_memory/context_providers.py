@@ -18,6 +18,7 @@ class MemoryContextProvider(SystemPromptContextProviderBase):
     ):
         super().__init__(title)
         self.memories: List[BaseMemory] = []
+        self.summaries: List[str] = []
 
     def get_info(self) -> str:
         """
@@ -27,7 +28,15 @@ class MemoryContextProvider(SystemPromptContextProviderBase):
             Formatted string of current memory context
         """
 
-        output = "Timestamp | Memory Type | Content\n"
+        output = ""
+        if self.summaries:
+            # Compact overviews of whole groups of memories come first
+            output += "Related Memory Summaries\n"
+            for summary in self.summaries:
+                output += f"- {summary}\n"
+            output += "\n"
+
+        output += "Timestamp | Memory Type | Content\n"
         output += "-----------------------------------\n"
         for memory in self.memories:
             output += f"{memory.timestamp} | {memory.memory_type} | {memory.content}\n"
@@ -1,22 +1,29 @@
+import argparse
 import os
+from typing import List, Optional
+
 from rich.console import Console
 from rich.panel import Panel
 from rich.style import Style
 
 from chat_with_memory.agents.chat_agent import (
-    chat_agent,
+    create_chat_agent,
     ChatAgentInputSchema,
     ChatAgentOutputSchema,
 )
 from chat_with_memory.agents.memory_formation_agent import (
-    memory_formation_agent,
+    create_memory_formation_agent,
     MemoryFormationInputSchema,
 )
+from chat_with_memory.agents.memory_summary_agent import AgentSummarizer
+from chat_with_memory.services.chroma_db import ChromaDBService
 from chat_with_memory.tools.memory_store_tool import (
+    MemoryStoreConfig,
     MemoryStoreTool,
     MemoryStoreInputSchema,
 )
 from chat_with_memory.tools.memory_query_tool import (
+    MemoryQueryConfig,
     MemoryQueryInputSchema,
     MemoryQueryTool,
 )
@@ -24,6 +31,11 @@ from chat_with_memory.context_providers import (
     MemoryContextProvider,
     CurrentDateContextProvider,
 )
+from chat_with_memory.profiling import (
+    ProfileMode,
+    TurnProfiler,
+    load_recorded_messages,
+)
 
 
 def format_conversation_for_memory(role: str, content: str) -> str:
@@ -31,9 +43,41 @@ def format_conversation_for_memory(role: str, content: str) -> str:
     return f"{role}: {content}"
 
 
-def main() -> None:
+def main(
+    profile_dir: Optional[str] = None,
+    profile_mode: ProfileMode = "cprofile",
+    replay: Optional[List[str]] = None,
+    n_summaries: int = 3,
+) -> None:
+    """Run the chat loop.
+
+    Args:
+        profile_dir: Optional directory to write per-turn profiles to
+        profile_mode: "cprofile" or "sampling", see TurnProfiler
+        replay: Optional user messages to send instead of reading from the console
+        n_summaries: Number of memory cluster summaries added to the context each
+            turn; 0 disables them
+    """
     console = Console()
-    store_tool = MemoryStoreTool()
+    profiler = TurnProfiler(profile_dir, mode=profile_mode)
+    replay_messages = iter(replay) if replay is not None else None
+    # A single user's memories are few, so they are served from memory. Cluster
+    # summaries need the clustered in-memory index, written by an agent.
+    db_service = ChromaDBService(
+        collection_name=MemoryStoreConfig().collection_name,
+        backend="clustered" if n_summaries else "auto",
+        summarizer=AgentSummarizer() if n_summaries else None,
+    )
+    store_tool = MemoryStoreTool(
+        MemoryStoreConfig(write_ahead_log=True), db_service=db_service
+    )
+    # Memories are embedded and written to ChromaDB on the flusher thread, which
+    # the store phase does not cover
+    store_tool.flusher.apply = profiler.background(
+        "store-apply", store_tool.flusher.apply
+    )
+    chat_agent = create_chat_agent()
+    memory_formation_agent = create_memory_formation_agent()
 
     # Define muted style for background processes
     muted_style = Style(color="grey69", dim=True)
@@ -65,66 +109,128 @@ def main() -> None:
         while True:
             # Get user input
             console.print("[bold blue]User:[/bold blue]", end=" ")
-            user_input = input()
-
-            # Use the query tool to get the memory
-            memory_query_tool = MemoryQueryTool()
-            retrieved_memories = memory_query_tool.run(
-                MemoryQueryInputSchema(query=user_input, n_results=10)
-            )
-
-            memory_context_provider.memories = retrieved_memories.memories
+            if replay_messages is None:
+                user_input = input()
+            else:
+                user_input = next(replay_messages, None)
+                if user_input is None:
+                    raise EOFError
+                console.print(user_input)
+
+            with profiler.turn(user_input):
+                try:
+                    # Use the query tool to get the memory
+                    with profiler.phase("retrieval"):
+                        memory_query_tool = MemoryQueryTool(
+                            MemoryQueryConfig(), db_service=db_service
+                        )
+                        retrieved_memories = memory_query_tool.run(
+                            MemoryQueryInputSchema(
+                                query=user_input,
+                                n_results=10,
+                                n_summaries=n_summaries,
+                            )
+                        )
 
-            # Check if we need to form a new memory from the user input
-            memory_assessment = memory_formation_agent.run(
-                MemoryFormationInputSchema(
-                    last_user_msg=user_input, last_assistant_msg=last_assistant_msg
-                )
-            )
+                    memory_context_provider.memories = retrieved_memories.memories
+                    memory_context_provider.summaries = retrieved_memories.summaries
 
-            # Store and display any formed memories
-            if memory_assessment.memories:
-                console.print("\n", style=muted_style)
-                console.print(
-                    Panel(
-                        "📝 Forming new memories...",
-                        style=muted_style,
-                        title="Memory Formation",
-                    )
-                )
+                    # Check if we need to form a new memory from the user input
+                    with profiler.phase("formation"):
+                        memory_assessment = memory_formation_agent.run(
+                            MemoryFormationInputSchema(
+                                last_user_msg=user_input,
+                                last_assistant_msg=last_assistant_msg,
+                            )
+                        )
 
-                for memory in memory_assessment.memories:
-                    # Store the memory
-                    store_result = store_tool.run(MemoryStoreInputSchema(memory=memory))
+                    # Store and display any formed memories
+                    if memory_assessment.memories:
+                        console.print("\n", style=muted_style)
+                        console.print(
+                            Panel(
+                                "📝 Forming new memories...",
+                                style=muted_style,
+                                title="Memory Formation",
+                            )
+                        )
 
-                    # Display the stored memory in muted style
+                        for memory in memory_assessment.memories:
+                            # Store the memory
+                            with profiler.phase("store"):
+                                store_result = store_tool.run(
+                                    MemoryStoreInputSchema(memory=memory)
+                                )
+
+                            # Display the stored memory in muted style
+                            console.print(
+                                Panel(
+                                    f"Type: {memory.__class__.__name__}\n"
+                                    f"Content: {memory.content}\n",
+                                    style=muted_style,
+                                    title="Stored Memory",
+                                    border_style=muted_style,
+                                )
+                            )
+                        console.print()  # Add spacing after memories
+
+                    # Process user message through chat agent
+                    user_message = ChatAgentInputSchema(message=user_input)
+                    with profiler.phase("chat"):
+                        chat_response = chat_agent.run(user_message)
+
+                    last_assistant_msg = chat_response.response
+
+                    # Display assistant's response
                     console.print(
-                        Panel(
-                            f"Type: {memory.__class__.__name__}\n"
-                            f"Content: {memory.content}\n",
-                            style=muted_style,
-                            title="Stored Memory",
-                            border_style=muted_style,
-                        )
+                        f"[bold green]Assistant:[/bold green] {chat_response.response}"
                     )
-                console.print()  # Add spacing after memories
-
-            # Process user message through chat agent
-            user_message = ChatAgentInputSchema(message=user_input)
-            chat_response = chat_agent.run(user_message)
-
-            last_assistant_msg = chat_response.response
+                except Exception as e:
+                    # A failed turn is reported without ending the conversation;
+                    # memories already formed are safe in the write-ahead log
+                    console.print(f"\n[bold red]An error occurred: {str(e)}[/bold red]")
 
-            # Display assistant's response
+    except (KeyboardInterrupt, EOFError):
+        console.print("\n[bold yellow]Conversation ended. Goodbye![/bold yellow]")
+    finally:
+        # Store memories still in the write-ahead log before exiting
+        if not store_tool.close():
             console.print(
-                f"[bold green]Assistant:[/bold green] {chat_response.response}"
+                "[bold yellow]Some memories are not stored yet; they will be "
+                "stored on the next start.[/bold yellow]"
             )
-
-    except KeyboardInterrupt:
-        console.print("\n[bold yellow]Conversation ended. Goodbye![/bold yellow]")
-    except Exception as e:
-        console.print(f"\n[bold red]An error occurred: {str(e)}[/bold red]")
+        profiler.close(console)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Chat with a memory-backed assistant")
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="Write per-turn profiles and phase timings to DIR",
+    )
+    parser.add_argument(
+        "--profile-mode",
+        choices=["cprofile", "sampling"],
+        default="cprofile",
+        help="cProfile output for snakeviz, or sampled stacks for a flamegraph",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="FILE",
+        help="Send the messages of a recorded session (turns.jsonl or one per line)",
+    )
+    parser.add_argument(
+        "--summaries",
+        type=int,
+        default=3,
+        help="Memory cluster summaries added to each turn's context (0 disables)",
+    )
+    args = parser.parse_args()
+
+    main(
+        profile_dir=args.profile,
+        profile_mode=args.profile_mode,
+        replay=load_recorded_messages(args.replay) if args.replay else None,
+        n_summaries=args.summaries,
+    )
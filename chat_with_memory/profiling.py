@@ -0,0 +1,318 @@
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Literal, Optional
+
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+ProfileMode = Literal["cprofile", "sampling"]
+
+# Phases of a conversation turn, in the order they run
+PHASES = ("retrieval", "formation", "store", "chat")
+
+
+class SamplingProfiler:
+    """Wall-clock sampler recording the stacks of every thread as folded stacks.
+
+    Unlike cProfile, which only sees the thread it was enabled on and slows down
+    every call, the sampler looks at all threads (including the embedding and
+    write-ahead log workers) at a fixed interval, so time spent waiting on the
+    network shows up too. The result is the folded format read by flamegraph.pl,
+    speedscope and inferno: one "frame;frame;frame count" line per stack.
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        """Initialize the sampler.
+
+        Args:
+            interval: Seconds between samples
+        """
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.counts = Counter()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        """Stop sampling and return the sample count of each folded stack."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.counts
+
+    def _run(self) -> None:
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} "
+                        f"({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.counts[";".join(reversed(stack))] += 1
+
+
+class TurnProfiler:
+    """Per-turn profiles and wall-clock attribution to the phases of a turn.
+
+    Each turn is profiled on its own and written to the output directory as
+    turn-NNNN.prof (cProfile, viewable with snakeviz) or turn-NNNN.folded
+    (sampling, viewable as a flamegraph). Time spent in each phase is appended
+    to turns.jsonl together with the user message, so a recorded session can be
+    replayed against a newer build and compared turn by turn. close() writes the
+    whole session as session.prof or session.folded and prints a phase summary.
+
+    Work running on other threads, such as the write-ahead log flusher storing
+    memories, is wrapped with background() instead. Its time is recorded
+    separately from the turn's phases, since it overlaps them, and in
+    "cprofile" mode it is profiled on its own thread and merged into the turn's
+    profile. Background work finishing between turns counts toward the next one.
+
+    Without an output directory the profiler is disabled and costs nothing.
+    """
+
+    def __init__(
+        self,
+        output_dir: Optional[str],
+        mode: ProfileMode = "cprofile",
+        interval: float = 0.005,
+    ) -> None:
+        """Initialize the profiler.
+
+        Args:
+            output_dir: Directory to write profiles to, or None to disable profiling
+            mode: "cprofile" for deterministic profiles of the calling thread, or
+                "sampling" for wall-clock samples of every thread
+            interval: Seconds between samples in "sampling" mode
+        """
+        self.output_dir = output_dir
+        self.mode = mode
+        self.interval = interval
+        self.turns: List[Dict] = []
+        self._phases: Dict[str, float] = {}
+        self._background: Dict[str, float] = {}
+        self._background_profiles: List[cProfile.Profile] = []
+        self._background_lock = threading.Lock()
+        self._session_counts: Counter = Counter()
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            # A new session replaces the turn log of the previous one
+            open(os.path.join(output_dir, "turns.jsonl"), "w").close()
+
+    @property
+    def enabled(self) -> bool:
+        return self.output_dir is not None
+
+    @contextmanager
+    def turn(self, message: str = "") -> Iterator[None]:
+        """Profile one conversation turn, including a turn that raises.
+
+        Args:
+            message: User message of the turn, recorded for replays
+        """
+        if not self.enabled:
+            yield
+            return
+
+        number = len(self.turns) + 1
+        self._phases = {}
+        if self.mode == "sampling":
+            profiler = SamplingProfiler(self.interval)
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            total = time.perf_counter() - start
+            with self._background_lock:
+                background, self._background = self._background, {}
+                background_profiles = self._background_profiles
+                self._background_profiles = []
+            if self.mode == "sampling":
+                counts = profiler.stop()
+                self._session_counts.update(counts)
+                write_folded(counts, self._path(f"turn-{number:04d}.folded"))
+            else:
+                profiler.disable()
+                stats = pstats.Stats(profiler)
+                for background_profile in background_profiles:
+                    stats.add(background_profile)
+                stats.dump_stats(self._path(f"turn-{number:04d}.prof"))
+
+            record = {
+                "turn": number,
+                "message": message,
+                "total_ms": total * 1000,
+                "phases": {name: ms * 1000 for name, ms in self._phases.items()},
+                "background": {name: ms * 1000 for name, ms in background.items()},
+            }
+            self.turns.append(record)
+            with open(self._path("turns.jsonl"), "a") as turn_log:
+                turn_log.write(json.dumps(record) + "\n")
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Attribute the wall-clock time of a block to a phase of the current turn."""
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._phases[name] = self._phases.get(name, 0.0) + elapsed
+
+    def background(self, name: str, function: Callable[..., Any]) -> Callable[..., Any]:
+        """Wrap a function run on another thread to time it as a background phase.
+
+        Args:
+            name: Name of the background phase, such as "store-apply"
+            function: Function to wrap
+
+        Returns:
+            Callable[..., Any]: The function itself when profiling is disabled
+        """
+        if not self.enabled:
+            return function
+
+        def profiled(*args: Any, **kwargs: Any) -> Any:
+            profiler = None
+            if self.mode == "cprofile":
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Profilers built on sys.monitoring (Python 3.12+) are
+                    # process-wide, so the turn's profiler already sees this
+                    profiler = None
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                if profiler is not None:
+                    profiler.disable()
+                with self._background_lock:
+                    self._background[name] = self._background.get(name, 0.0) + elapsed
+                    if profiler is not None:
+                        self._background_profiles.append(profiler)
+
+        return profiled
+
+    def close(self, console: Optional[Console] = None) -> None:
+        """Write the session profile and print the per-phase summary."""
+        if not self.enabled or not self.turns:
+            return
+
+        if self.mode == "sampling":
+            write_folded(self._session_counts, self._path("session.folded"))
+        else:
+            stats = pstats.Stats(
+                *(self._path(f"turn-{turn['turn']:04d}.prof") for turn in self.turns)
+            )
+            stats.dump_stats(self._path("session.prof"))
+
+        console = console or Console()
+        console.print(phase_summary(self.turns))
+        console.print(f"Profiles written to {self.output_dir}")
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.output_dir, name)
+
+
+def write_folded(counts: Counter, path: str) -> None:
+    """Write sample counts in the folded stack format, heaviest stacks first."""
+    with open(path, "w") as folded:
+        for stack, count in counts.most_common():
+            folded.write(f"{stack} {count}\n")
+
+
+def phase_summary(turns: List[Dict]) -> Table:
+    """Table of per-phase wall-clock time over the profiled turns.
+
+    Time not spent in any phase (prompt rendering, console output) is shown as
+    "other". Background phases run alongside the turn, so they are listed after
+    the total and left out of "other".
+    """
+    table = Table(title=f"Wall-clock time per turn ({len(turns)} turns)")
+    table.add_column("Phase", style="cyan")
+    table.add_column("Mean (ms)", justify="right")
+    table.add_column("p50 (ms)", justify="right")
+    table.add_column("p99 (ms)", justify="right")
+    table.add_column("Share", justify="right", style="green")
+
+    totals = np.array([turn["total_ms"] for turn in turns])
+    names = list(PHASES) + sorted(
+        {name for turn in turns for name in turn["phases"]} - set(PHASES)
+    )
+    columns = {
+        name: np.array([turn["phases"].get(name, 0.0) for turn in turns])
+        for name in names
+    }
+    columns["other"] = totals - sum(columns.values())
+    columns["total"] = totals
+    for name in sorted({name for turn in turns for name in turn.get("background", {})}):
+        columns[f"{name} (background)"] = np.array(
+            [turn.get("background", {}).get(name, 0.0) for turn in turns]
+        )
+
+    for name, values in columns.items():
+        table.add_row(
+            name,
+            f"{values.mean():.1f}",
+            f"{np.percentile(values, 50):.1f}",
+            f"{np.percentile(values, 99):.1f}",
+            f"{values.sum() / max(totals.sum(), 1e-9):.0%}",
+        )
+    return table
+
+
+def load_recorded_messages(path: str) -> List[str]:
+    """Read the user messages of a recorded session.
+
+    Accepts the turns.jsonl written by TurnProfiler, or a plain text file with
+    one message per line.
+    """
+    messages = []
+    with open(path) as recording:
+        for line in recording:
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = None
+            if isinstance(record, dict) and "message" in record:
+                messages.append(record["message"])
+            else:
+                messages.append(line)
+    return messages
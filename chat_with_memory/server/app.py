@@ -0,0 +1,498 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Set, Tuple
+
+import instructor
+import openai
+from atomic_agents.agents.base_agent import BaseAgent
+
+from chat_with_memory.agents.chat_agent import (
+    ChatAgentInputSchema,
+    ChatAgentOutputSchema,
+    create_chat_agent,
+)
+from chat_with_memory.agents.memory_formation_agent import (
+    MemoryFormationInputSchema,
+    create_memory_formation_agent,
+)
+from chat_with_memory.context_providers import (
+    CurrentDateContextProvider,
+    MemoryContextProvider,
+)
+from chat_with_memory.services.chroma_db import ChromaDBService
+from chat_with_memory.tools.memory_query_tool import (
+    MemoryQueryConfig,
+    MemoryQueryInputSchema,
+    MemoryQueryTool,
+)
+from chat_with_memory.tools.memory_store_tool import (
+    MemoryStoreConfig,
+    MemoryStoreInputSchema,
+    MemoryStoreTool,
+)
+
+GREETING = "Hello, how are you?"
+MAX_BODY_BYTES = 1024 * 1024
+
+Response = Tuple[int, Dict[str, Any], Dict[str, str]]
+
+REASONS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+@dataclass
+class ChatSession:
+    """Per-user conversation state: agents with their own history and context.
+
+    Memories are stored and retrieved under the session's tenant, so sessions of
+    different users never see each other's memories.
+    """
+
+    session_id: str
+    tenant: str
+    chat_agent: BaseAgent
+    memory_formation_agent: BaseAgent
+    memory_context_provider: MemoryContextProvider
+    last_assistant_msg: str = GREETING
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    last_active: float = field(default_factory=time.monotonic)
+
+
+class ChatServer:
+    """Asyncio HTTP server running the chat-with-memory loop for many sessions.
+
+    Each session gets its own chat and memory formation agents, while the LLM
+    client and the memory store are shared. Memories are tagged with the
+    session's tenant (the user_id given when opening it, or else the session
+    ID) and retrieval is filtered on it. Blocking LLM calls and memory
+    store calls (which embed text) run on two bounded thread pools, and at most
+    max_inflight_turns turns are processed at once. Up to max_queued_turns more
+    wait for a slot; beyond that, requests are rejected with 503 and a
+    Retry-After header so clients back off instead of piling up.
+
+    Endpoints:
+        POST   /sessions                 {"user_id"?} -> {"session_id", "response"}
+        POST   /sessions/{id}/messages   {"message"} -> {"response", "memories"}
+        DELETE /sessions/{id}
+        GET    /health
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        client: Optional[instructor.Instructor] = None,
+        db_service: Optional[ChromaDBService] = None,
+        max_sessions: int = 1000,
+        session_ttl: float = 1800.0,
+        max_inflight_turns: int = 32,
+        max_queued_turns: int = 128,
+        llm_workers: int = 32,
+        memory_workers: int = 8,
+        n_results: int = 10,
+        write_ahead_log: bool = False,
+        n_summaries: int = 0,
+    ) -> None:
+        """Initialize the server.
+
+        Args:
+            host: Interface to listen on
+            port: Port to listen on; 0 picks a free port
+            client: Instructor client shared by all agents. If not provided, an
+                OpenAI client is created.
+            db_service: ChromaDBService shared by all sessions. If not provided, one
+                is created from the default tool configuration with embedding
+                calls coalesced across sessions.
+            max_sessions: Maximum number of concurrent sessions
+            session_ttl: Seconds of inactivity after which a session is evicted
+            max_inflight_turns: Maximum number of turns processed concurrently
+            max_queued_turns: Maximum number of turns waiting for a slot
+            llm_workers: Size of the thread pool running LLM calls
+            memory_workers: Size of the thread pool running memory queries and stores
+            n_results: Number of memories retrieved per turn
+            write_ahead_log: If True, formed memories are logged durably and stored
+                in the background, so turns don't wait for the store
+            n_summaries: Number of summaries of the session tenant's nearest memory
+                clusters added to each turn's context. Enabling them serves
+                queries from the clustered in-memory index with extractive
+                summaries, so no LLM call is made per cluster.
+        """
+        self.host = host
+        self.port = port
+        self.client = client
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.max_inflight_turns = max_inflight_turns
+        self.max_queued_turns = max_queued_turns
+        self.n_results = n_results
+        self.n_summaries = n_summaries
+
+        # Concurrent sessions share batched embedding requests
+        self.query_tool = MemoryQueryTool(
+            MemoryQueryConfig(
+                coalesce_embeddings=True,
+                backend="clustered" if n_summaries else "chroma",
+            ),
+            db_service=db_service,
+        )
+        self.store_tool = MemoryStoreTool(
+            MemoryStoreConfig(write_ahead_log=write_ahead_log),
+            db_service=self.query_tool.db_service,
+        )
+        self.llm_pool = ThreadPoolExecutor(llm_workers, thread_name_prefix="llm")
+        self.memory_pool = ThreadPoolExecutor(
+            memory_workers, thread_name_prefix="memory"
+        )
+
+        self.sessions: Dict[str, ChatSession] = {}
+        self.current_date_context_provider = CurrentDateContextProvider(
+            title="Current Date"
+        )
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.StreamWriter] = set()
+        self._turn_slots: Optional[asyncio.Semaphore] = None
+        self._pending_turns = 0
+        self._idle: Optional[asyncio.Event] = None
+        self._draining = False
+        self._drained: Optional[asyncio.Event] = None
+        self._sweeper: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Start listening and evicting idle sessions."""
+        if self.client is None:
+            self.client = instructor.from_openai(
+                openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+            )
+        self._turn_slots = asyncio.Semaphore(self.max_inflight_turns)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._drained = asyncio.Event()
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._sweeper = asyncio.create_task(self._evict_idle_sessions())
+
+    async def serve_until_drained(self) -> None:
+        """Serve requests until drain() has completed."""
+        await self._drained.wait()
+
+    async def drain(self, timeout: float = 30.0) -> None:
+        """Stop accepting work, finish in-flight turns and shut down.
+
+        New connections are refused and new turns get 503 immediately, while
+        turns already admitted run to completion (up to timeout seconds).
+        """
+        if self._draining:
+            await self._drained.wait()
+            return
+        self._draining = True
+        self._server.close()
+        self._sweeper.cancel()
+
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        for writer in list(self._connections):
+            writer.close()
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.store_tool.close, timeout
+        )
+        self.llm_pool.shutdown(wait=False, cancel_futures=True)
+        self.memory_pool.shutdown(wait=False, cancel_futures=True)
+        self._drained.set()
+
+    def create_session(self, tenant: Optional[str] = None) -> ChatSession:
+        """Create a session with its own agents and memory context.
+
+        Args:
+            tenant: Tenant whose memories the session stores and retrieves, such
+                as a user ID shared by that user's sessions. Defaults to the
+                session ID, which keeps memories private to the session.
+        """
+        chat_agent = create_chat_agent(self.client)
+        memory_formation_agent = create_memory_formation_agent(self.client)
+        memory_context_provider = MemoryContextProvider(title="Existing Memories")
+
+        for agent in (chat_agent, memory_formation_agent):
+            agent.register_context_provider("memory", memory_context_provider)
+            agent.register_context_provider(
+                "current_date", self.current_date_context_provider
+            )
+        chat_agent.memory.add_message(
+            "assistant", ChatAgentOutputSchema(response=GREETING)
+        )
+
+        session_id = uuid.uuid4().hex
+        session = ChatSession(
+            session_id=session_id,
+            tenant=tenant or session_id,
+            chat_agent=chat_agent,
+            memory_formation_agent=memory_formation_agent,
+            memory_context_provider=memory_context_provider,
+        )
+        self.sessions[session.session_id] = session
+        return session
+
+    async def run_turn(self, session: ChatSession, message: str) -> Dict[str, Any]:
+        """Run one conversation turn: retrieve, form and store memories, then chat."""
+        loop = asyncio.get_running_loop()
+
+        retrieved = await loop.run_in_executor(
+            self.memory_pool,
+            self.query_tool.run,
+            MemoryQueryInputSchema(
+                query=message,
+                n_results=self.n_results,
+                n_summaries=self.n_summaries,
+                tenant=session.tenant,
+            ),
+        )
+        session.memory_context_provider.memories = retrieved.memories
+        session.memory_context_provider.summaries = retrieved.summaries
+
+        assessment = await loop.run_in_executor(
+            self.llm_pool,
+            session.memory_formation_agent.run,
+            MemoryFormationInputSchema(
+                last_user_msg=message, last_assistant_msg=session.last_assistant_msg
+            ),
+        )
+        stored = []
+        for memory in assessment.memories or []:
+            await loop.run_in_executor(
+                self.memory_pool,
+                self.store_tool.run,
+                MemoryStoreInputSchema(memory=memory, tenant=session.tenant),
+            )
+            stored.append({"type": memory.memory_type, "content": memory.content})
+
+        chat_response = await loop.run_in_executor(
+            self.llm_pool,
+            session.chat_agent.run,
+            ChatAgentInputSchema(message=message),
+        )
+        session.last_assistant_msg = chat_response.response
+        return {"response": chat_response.response, "memories": stored}
+
+    async def _handle_message(self, session_id: str, body: Dict[str, Any]) -> Response:
+        session = self.sessions.get(session_id)
+        if session is None:
+            return 404, {"error": "Unknown session"}, {}
+        message = body.get("message")
+        if not isinstance(message, str) or not message:
+            return 400, {"error": "Expected a non-empty 'message' string"}, {}
+        if session.lock.locked():
+            return 409, {"error": "A turn is already running for this session"}, {}
+        if self._draining:
+            return 503, {"error": "Server is shutting down"}, {}
+        if self._pending_turns >= self.max_inflight_turns + self.max_queued_turns:
+            return 503, {"error": "Server busy"}, {"Retry-After": "1"}
+
+        self._pending_turns += 1
+        self._idle.clear()
+        try:
+            async with session.lock, self._turn_slots:
+                session.last_active = time.monotonic()
+                result = await self.run_turn(session, message)
+                session.last_active = time.monotonic()
+            return 200, result, {}
+        finally:
+            self._pending_turns -= 1
+            if self._pending_turns == 0:
+                self._idle.set()
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Response:
+        parts = [part for part in path.split("?")[0].split("/") if part]
+        try:
+            payload = json.loads(body) if body else {}
+        except json.JSONDecodeError:
+            return 400, {"error": "Invalid JSON body"}, {}
+
+        if parts == ["health"] and method == "GET":
+            return (
+                200,
+                {
+                    "status": "draining" if self._draining else "ok",
+                    "sessions": len(self.sessions),
+                    "pending_turns": self._pending_turns,
+                },
+                {},
+            )
+
+        if parts == ["sessions"] and method == "POST":
+            if self._draining:
+                return 503, {"error": "Server is shutting down"}, {}
+            if len(self.sessions) >= self.max_sessions:
+                return 503, {"error": "Too many sessions"}, {"Retry-After": "5"}
+            user_id = payload.get("user_id")
+            if user_id is not None and (not isinstance(user_id, str) or not user_id):
+                return 400, {"error": "Expected 'user_id' to be a non-empty string"}, {}
+            session = self.create_session(user_id)
+            return 201, {"session_id": session.session_id, "response": GREETING}, {}
+
+        if len(parts) == 2 and parts[0] == "sessions" and method == "DELETE":
+            if self.sessions.pop(parts[1], None) is None:
+                return 404, {"error": "Unknown session"}, {}
+            return 200, {"status": "closed"}, {}
+
+        if len(parts) == 3 and parts[0] == "sessions" and parts[2] == "messages":
+            if method != "POST":
+                return 405, {"error": "Method not allowed"}, {}
+            return await self._handle_message(parts[1], payload)
+
+        return 404, {"error": "Not found"}, {}
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serve HTTP/1.1 requests on one keep-alive connection."""
+        self._connections.add(writer)
+        try:
+            while not self._draining:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    await self._write_response(
+                        writer, 413, {"error": "Body too large"}, {}, False
+                    )
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                try:
+                    status, payload, extra_headers = await self._dispatch(
+                        method, path, body
+                    )
+                except Exception as e:
+                    status, payload, extra_headers = 500, {"error": str(e)}, {}
+
+                keep_alive = (
+                    headers.get("connection", "").lower() != "close"
+                    and not self._draining
+                )
+                await self._write_response(
+                    writer, status, payload, extra_headers, keep_alive
+                )
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    @staticmethod
+    async def _write_response(
+        writer: asyncio.StreamWriter,
+        status: int,
+        payload: Dict[str, Any],
+        extra_headers: Dict[str, str],
+        keep_alive: bool,
+    ) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        headers = {
+            "Content-Type": "application/json",
+            "Content-Length": str(len(body)),
+            "Connection": "keep-alive" if keep_alive else "close",
+            **extra_headers,
+        }
+        head = f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n" + "".join(
+            f"{name}: {value}\r\n" for name, value in headers.items()
+        )
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+
+    async def _evict_idle_sessions(self) -> None:
+        """Periodically drop sessions that have been idle longer than session_ttl."""
+        while True:
+            await asyncio.sleep(min(60.0, self.session_ttl))
+            cutoff = time.monotonic() - self.session_ttl
+            for session_id, session in list(self.sessions.items()):
+                if session.last_active < cutoff and not session.lock.locked():
+                    del self.sessions[session_id]
+
+
+async def serve(server: ChatServer) -> None:
+    """Run a server until SIGINT or SIGTERM, then drain it."""
+    await server.start()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, lambda: asyncio.create_task(server.drain()))
+    print(f"Chat server listening on http://{server.host}:{server.port}")
+    await server.serve_until_drained()
+    print("Chat server drained. Goodbye!")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Multi-session chat with memory server"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-sessions", type=int, default=1000)
+    parser.add_argument("--max-inflight-turns", type=int, default=32)
+    parser.add_argument("--max-queued-turns", type=int, default=128)
+    parser.add_argument("--llm-workers", type=int, default=32)
+    parser.add_argument("--memory-workers", type=int, default=8)
+    parser.add_argument(
+        "--write-ahead-log",
+        action="store_true",
+        help="Log formed memories durably and store them in the background",
+    )
+    parser.add_argument(
+        "--summaries",
+        type=int,
+        default=0,
+        help="Summaries of the user's nearest memory clusters added to each turn",
+    )
+    args = parser.parse_args()
+
+    asyncio.run(
+        serve(
+            ChatServer(
+                host=args.host,
+                port=args.port,
+                max_sessions=args.max_sessions,
+                max_inflight_turns=args.max_inflight_turns,
+                max_queued_turns=args.max_queued_turns,
+                llm_workers=args.llm_workers,
+                memory_workers=args.memory_workers,
+                write_ahead_log=args.write_ahead_log,
+                n_summaries=args.summaries,
+            )
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
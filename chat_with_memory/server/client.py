@@ -0,0 +1,165 @@
+import argparse
+import asyncio
+import json
+from typing import Any, Dict, Optional, Tuple
+
+from rich.console import Console
+
+# Methods that are safe to send again when the response was lost
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+
+class ServerBusyError(RuntimeError):
+    """Raised when the server rejects a request with 503."""
+
+    def __init__(self, message: str, retry_after: Optional[float]) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ChatClient:
+    """Minimal asyncio client for the chat server over one keep-alive connection."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765) -> None:
+        self.host = host
+        self.port = port
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(
+        self, method: str, path: str, payload: Optional[Dict[str, Any]] = None
+    ) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+        """Send a request and return the status, JSON body and headers.
+
+        The connection is opened lazily. A keep-alive connection the server has
+        already closed is replaced before anything is written to it. Once a
+        request has been written, it is only resent after a connection error if
+        its method is idempotent: a POST the server received but did not answer
+        may already have run, and resending it would run the turn twice.
+        """
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        head = (
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n"
+        )
+
+        for attempt in range(2):
+            if self._writer is not None and self._reader.at_eof():
+                await self.close()
+            if self._writer is None:
+                self._reader, self._writer = await asyncio.open_connection(
+                    self.host, self.port
+                )
+            try:
+                self._writer.write(head.encode("latin-1") + body)
+                await self._writer.drain()
+                return await self._read_response()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if attempt or method not in IDEMPOTENT_METHODS:
+                    raise
+        raise RuntimeError("unreachable")
+
+    async def create_session(self, user_id: Optional[str] = None) -> Tuple[str, str]:
+        """Open a session and return its id and the greeting.
+
+        Args:
+            user_id: Optional user whose memories the session shares with the
+                user's other sessions; without it, memories stay in the session
+        """
+        status, body, headers = await self.request(
+            "POST", "/sessions", {"user_id": user_id} if user_id else None
+        )
+        self._raise_for_status(status, body, headers)
+        return body["session_id"], body["response"]
+
+    async def send_message(self, session_id: str, message: str) -> Dict[str, Any]:
+        """Run one turn and return the response and the memories formed."""
+        status, body, headers = await self.request(
+            "POST", f"/sessions/{session_id}/messages", {"message": message}
+        )
+        self._raise_for_status(status, body, headers)
+        return body
+
+    async def close_session(self, session_id: str) -> None:
+        await self.request("DELETE", f"/sessions/{session_id}")
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _read_response(self) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by server")
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        body = await self._reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, json.loads(body) if body else {}, headers
+
+    @staticmethod
+    def _raise_for_status(
+        status: int, body: Dict[str, Any], headers: Dict[str, str]
+    ) -> None:
+        if status == 503:
+            retry_after = headers.get("retry-after")
+            raise ServerBusyError(
+                body.get("error", "Server busy"),
+                float(retry_after) if retry_after else None,
+            )
+        if status >= 400:
+            raise RuntimeError(f"{status}: {body.get('error', 'Request failed')}")
+
+
+async def chat(host: str, port: int, user_id: Optional[str] = None) -> None:
+    """Interactive chat against a running server."""
+    console = Console()
+    client = ChatClient(host, port)
+    session_id, greeting = await client.create_session(user_id)
+    console.print(f"[bold green]Assistant:[/bold green] {greeting}")
+
+    try:
+        while True:
+            console.print("[bold blue]User:[/bold blue]", end=" ")
+            user_input = await asyncio.get_running_loop().run_in_executor(None, input)
+            result = await client.send_message(session_id, user_input)
+            for memory in result["memories"]:
+                console.print(
+                    f"[grey69]Stored {memory['type']} memory: {memory['content']}[/grey69]"
+                )
+            console.print(f"[bold green]Assistant:[/bold green] {result['response']}")
+    finally:
+        await client.close_session(session_id)
+        await client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Chat with a running chat server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--user-id", help="Share memories with earlier sessions of this user"
+    )
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(chat(args.host, args.port, args.user_id))
+    except (KeyboardInterrupt, EOFError):
+        print("\nConversation ended. Goodbye!")
+
+
+if __name__ == "__main__":
+    main()
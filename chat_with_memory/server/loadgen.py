@@ -0,0 +1,182 @@
+import argparse
+import asyncio
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+from chat_with_memory.server.app import ChatServer
+from chat_with_memory.server.client import ChatClient, ServerBusyError
+from chat_with_memory.server.stubs import StubInstructor
+from chat_with_memory.services.chroma_db import ChromaDBService
+from chat_with_memory.services.hash_embeddings import HashEmbeddingFunction
+
+USER_MESSAGES = [
+    "Hi, I'm a software engineer working on a recommendation system",
+    "I went hiking in the Alps last weekend",
+    "My sister is visiting next month, any restaurant ideas?",
+    "Remind me what project I said I was working on",
+    "I've started learning Japanese in the evenings",
+]
+
+
+async def simulate_user(
+    host: str, port: int, user: int, turns: int, stats: Dict[str, List[float]]
+) -> None:
+    """Open a session, run a number of turns and close it, backing off on 503."""
+    client = ChatClient(host, port)
+    try:
+        while True:
+            try:
+                session_id, _ = await client.create_session()
+                break
+            except ServerBusyError as e:
+                stats["rejected"].append(1)
+                await asyncio.sleep(e.retry_after or 0.1)
+        stats["sessions"].append(1)
+
+        for turn in range(turns):
+            message = USER_MESSAGES[(user + turn) % len(USER_MESSAGES)]
+            while True:
+                start = time.perf_counter()
+                try:
+                    await client.send_message(session_id, f"{message} ({user})")
+                    stats["latencies"].append(time.perf_counter() - start)
+                    break
+                except ServerBusyError as e:
+                    stats["rejected"].append(1)
+                    await asyncio.sleep(e.retry_after or 0.1)
+
+        await client.close_session(session_id)
+    finally:
+        await client.close()
+
+
+async def run_load(
+    users: int = 50,
+    turns: int = 5,
+    llm_latency: float = 0.05,
+    embedding_latency: float = 0.01,
+    max_inflight_turns: int = 32,
+    max_queued_turns: int = 128,
+    llm_workers: int = 32,
+    memory_workers: int = 8,
+    coalesce_embeddings: bool = True,
+    write_ahead_log: bool = False,
+) -> Dict[str, float]:
+    """Run an in-process server on stubbed LLM and embeddings and load it.
+
+    Returns:
+        Dict[str, float]: Throughput, latency percentiles and rejection counts
+    """
+    embedding_function = HashEmbeddingFunction(latency=embedding_latency)
+    with tempfile.TemporaryDirectory() as persist_directory:
+        db_service = ChromaDBService(
+            collection_name="loadgen_memories",
+            persist_directory=persist_directory,
+            embedding_function=embedding_function,
+            coalesce_embeddings=coalesce_embeddings,
+        )
+        server = ChatServer(
+            port=0,
+            client=StubInstructor(latency=llm_latency),
+            db_service=db_service,
+            max_sessions=users,
+            max_inflight_turns=max_inflight_turns,
+            max_queued_turns=max_queued_turns,
+            llm_workers=llm_workers,
+            memory_workers=memory_workers,
+            write_ahead_log=write_ahead_log,
+        )
+        await server.start()
+
+        stats: Dict[str, List[float]] = {
+            "latencies": [],
+            "sessions": [],
+            "rejected": [],
+        }
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                simulate_user(server.host, server.port, user, turns, stats)
+                for user in range(users)
+            )
+        )
+        elapsed = time.perf_counter() - start
+        await server.drain()
+
+        latencies = np.asarray(stats["latencies"]) * 1000
+        return {
+            "elapsed_s": elapsed,
+            "sessions_per_s": len(stats["sessions"]) / elapsed,
+            "turns_per_s": len(latencies) / elapsed,
+            "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+            "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+            "rejected": len(stats["rejected"]),
+            "memories": db_service.get_count(),
+            "embedding_calls": embedding_function.calls,
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Load test the chat server with stubbed LLM and embedding calls"
+    )
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--embedding-latency", type=float, default=0.01)
+    parser.add_argument("--max-inflight-turns", type=int, default=32)
+    parser.add_argument("--max-queued-turns", type=int, default=128)
+    parser.add_argument("--llm-workers", type=int, default=32)
+    parser.add_argument("--memory-workers", type=int, default=8)
+    parser.add_argument(
+        "--no-coalesce",
+        action="store_true",
+        help="Send every embedding call to the provider separately",
+    )
+    parser.add_argument(
+        "--write-ahead-log",
+        action="store_true",
+        help="Store memories in the background through the write-ahead log",
+    )
+    args = parser.parse_args()
+
+    console = Console()
+    console.print(
+        f"\n[bold blue]Simulating {args.users} users x {args.turns} turns[/bold blue]"
+    )
+    metrics = asyncio.run(
+        run_load(
+            users=args.users,
+            turns=args.turns,
+            llm_latency=args.llm_latency,
+            embedding_latency=args.embedding_latency,
+            max_inflight_turns=args.max_inflight_turns,
+            max_queued_turns=args.max_queued_turns,
+            llm_workers=args.llm_workers,
+            memory_workers=args.memory_workers,
+            coalesce_embeddings=not args.no_coalesce,
+            write_ahead_log=args.write_ahead_log,
+        )
+    )
+
+    table = Table(title="Chat server load test")
+    table.add_column("Metric", style="cyan")
+    table.add_column("Value", justify="right", style="green")
+    table.add_row("Elapsed (s)", f"{metrics['elapsed_s']:.2f}")
+    table.add_row("Sessions / s", f"{metrics['sessions_per_s']:.1f}")
+    table.add_row("Turns / s", f"{metrics['turns_per_s']:.1f}")
+    table.add_row("Turn p50 (ms)", f"{metrics['p50_ms']:.1f}")
+    table.add_row("Turn p99 (ms)", f"{metrics['p99_ms']:.1f}")
+    table.add_row("Rejected (503)", str(metrics["rejected"]))
+    table.add_row("Memories stored", str(metrics["memories"]))
+    table.add_row("Embedding calls", str(metrics["embedding_calls"]))
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
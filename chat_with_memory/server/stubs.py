@@ -0,0 +1,54 @@
+import itertools
+import time
+from typing import Any, Dict, List, Type
+
+import instructor
+from pydantic import BaseModel
+
+from chat_with_memory.agents.chat_agent import ChatAgentOutputSchema
+from chat_with_memory.agents.memory_formation_agent import MemoryFormationOutputSchema
+from chat_with_memory.agents.memory_summary_agent import MemorySummaryOutputSchema
+from chat_with_memory.tools.memory_models import EventMemory
+
+
+class StubInstructor(instructor.Instructor):
+    """Instructor client that answers with canned responses after a fixed delay.
+
+    Agents built on it run their real prompt generation and history handling,
+    so load tests measure everything except the LLM provider itself.
+    """
+
+    def __init__(self, latency: float = 0.05, memory_every: int = 3) -> None:
+        """Initialize the stub client.
+
+        Args:
+            latency: Seconds each completion takes
+            memory_every: Form one memory on every Nth memory formation call
+        """
+        super().__init__(client=None, create=self.create)
+        self.latency = latency
+        self.memory_every = memory_every
+        self._calls = itertools.count(1)
+
+    def create(
+        self,
+        response_model: Type[BaseModel],
+        messages: List[Dict[str, Any]],
+        **kwargs: Any,
+    ) -> BaseModel:
+        time.sleep(self.latency)
+        call = next(self._calls)
+        last_message = str(messages[-1]["content"])[:200]
+
+        if response_model is ChatAgentOutputSchema:
+            return ChatAgentOutputSchema(response=f"Stub reply to {last_message}")
+        if response_model is MemoryFormationOutputSchema:
+            memories = []
+            if self.memory_every and call % self.memory_every == 0:
+                memories.append(EventMemory(content=f"User mentioned {last_message}"))
+            return MemoryFormationOutputSchema(
+                reasoning=["Stub reasoning"] * 3, memories=memories
+            )
+        if response_model is MemorySummaryOutputSchema:
+            return MemorySummaryOutputSchema(summary=f"Stub summary of {last_message}")
+        raise ValueError(f"No stub response for {response_model.__name__}")
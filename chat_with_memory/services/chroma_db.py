@@ -1,9 +1,51 @@
+import fcntl
 import os
+import threading
+import warnings
 import chromadb
+import numpy as np
+from chromadb.api.types import Documents, Embedding, EmbeddingFunction, Embeddings
+from chromadb.errors import InvalidCollectionException
 from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
-from typing import Dict, List, Optional, TypedDict, Union
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Literal, Optional, Tuple, TypedDict, Union
 import uuid
 
+from chat_with_memory.services.cluster_index import ClusterIndex, Summarizer
+from chat_with_memory.services.embedding_dispatcher import EmbeddingDispatcher
+from chat_with_memory.services.index_profiles import (
+    DEFAULT_PROFILE,
+    DistanceMetric,
+    IndexProfile,
+    get_index_profile,
+)
+from chat_with_memory.services.memory_graph import MemoryGraph, get_memory_graph
+from chat_with_memory.services.numpy_index import NumpyIndex
+from chat_with_memory.services.quantization import (
+    QuantizationMethod,
+    TruncatedEmbeddingFunction,
+    create_quantizer,
+)
+from chat_with_memory.services.snapshot import SnapshotIndex, export_snapshot
+
+MIGRATION_SUFFIX = "__migrating"
+
+MemoryIndex = Union[NumpyIndex, ClusterIndex]
+
+# In-memory indexes are shared by every service instance in the process that
+# points at the same collection with the same storage options, so writes
+# through one are seen by all
+_MEMORY_INDEXES: Dict[Tuple[str, str, str], MemoryIndex] = {}
+_MEMORY_INDEXES_LOCK = threading.Lock()
+
+# Per-index locks: "build" lets one load of an index run at a time, "write"
+# orders writes to an index with swapping in its rebuilt replacement
+_INDEX_LOCKS: Dict[Tuple[Tuple[str, str, str], str], threading.Lock] = {}
+
+# Writes made while an index is rebuilt in the background, replayed onto the
+# new index before it replaces the old one
+_REBUILD_JOURNALS: Dict[Tuple[str, str, str], List[Tuple[str, tuple]]] = {}
+
 
 class QueryResult(TypedDict):
     documents: List[str]
@@ -12,6 +54,55 @@ class QueryResult(TypedDict):
     ids: List[str]
 
 
+class GetResult(TypedDict):
+    documents: List[str]
+    metadatas: List[Dict[str, str]]
+    ids: List[str]
+
+
+class PrecomputedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Embedding function for services that are only given embedded rows.
+
+    Shard workers and tools reading stored embeddings use it so that they never
+    build an OpenAI client they don't need.
+    """
+
+    def __call__(self, input: Documents) -> Embeddings:
+        raise RuntimeError(
+            "This service does not embed; pass precomputed embeddings instead"
+        )
+
+
+def create_embedding_function(
+    embedding_function: Optional[EmbeddingFunction[Documents]] = None,
+    embedding_dimensions: Optional[int] = None,
+    coalesce_embeddings: bool = False,
+) -> EmbeddingFunction[Documents]:
+    """Build the embedding function a service embeds documents and queries with.
+
+    Args:
+        embedding_function: Optional embedding function replacing the OpenAI one
+        embedding_dimensions: Optional Matryoshka truncation of embeddings
+        coalesce_embeddings: If True, concurrent calls are batched together
+
+    Returns:
+        EmbeddingFunction[Documents]: The configured embedding function
+    """
+    if embedding_function is None:
+        embedding_function = OpenAIEmbeddingFunction(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            model_name="text-embedding-3-small",
+            dimensions=embedding_dimensions,
+        )
+    elif embedding_dimensions is not None:
+        embedding_function = TruncatedEmbeddingFunction(
+            embedding_function, embedding_dimensions
+        )
+    if coalesce_embeddings:
+        embedding_function = EmbeddingDispatcher(embedding_function)
+    return embedding_function
+
+
 class ChromaDBService:
     """Service for interacting with ChromaDB using OpenAI embeddings."""
 
@@ -20,6 +111,21 @@ class ChromaDBService:
         collection_name: str,
         persist_directory: str = "./chroma_db",
         recreate_collection: bool = False,
+        index_profile: Optional[Union[str, IndexProfile]] = None,
+        distance: Optional[DistanceMetric] = None,
+        migrate_index: bool = False,
+        backend: Literal["auto", "chroma", "numpy", "clustered"] = "chroma",
+        memory_index_threshold: int = 5000,
+        memory_index_dtype: Literal["float32", "float16"] = "float32",
+        embedding_function: Optional[EmbeddingFunction[Documents]] = None,
+        embedding_dimensions: Optional[int] = None,
+        quantization: Optional[QuantizationMethod] = None,
+        pq_subspaces: int = 64,
+        rerank_factor: int = 4,
+        snapshot_path: Optional[str] = None,
+        coalesce_embeddings: bool = False,
+        cluster_probes: int = 4,
+        summarizer: Optional[Summarizer] = None,
     ) -> None:
         """Initialize ChromaDB service with OpenAI embeddings.
 
@@ -27,12 +133,75 @@ class ChromaDBService:
             collection_name: Name of the collection to use
             persist_directory: Directory to persist ChromaDB data
             recreate_collection: If True, deletes the collection if it exists before creating
+            index_profile: Optional HNSW profile ("small", "large", "bulk_load") for new collections
+            distance: Optional distance metric ("cosine", "l2", "ip") overriding the profile's
+            migrate_index: If True, migrates an existing collection built with different
+                index parameters to the requested profile
+            backend: Query backend. "chroma" (the default) always uses ChromaDB's HNSW
+                index, "numpy" serves queries from an in-memory brute-force index and
+                "auto" uses the in-memory index while the collection is at most
+                memory_index_threshold documents. "clustered" serves queries from an in-memory index that
+                searches only the clusters nearest to the query, for collections too
+                large to scan. ChromaDB remains the durable store in every mode.
+            memory_index_threshold: Collection size above which "auto" switches to ChromaDB
+            memory_index_dtype: Storage dtype of the in-memory embedding matrix
+            embedding_function: Optional embedding function replacing the OpenAI one
+            embedding_dimensions: Optional Matryoshka truncation of embeddings to their
+                leading dimensions, shrinking both ChromaDB and in-memory storage
+            quantization: Optional quantization of the in-memory index: "int8" scalar
+                quantization or "pq" product quantization. Only the index shrinks;
+                ChromaDB still keeps its float32 vectors in memory, so process
+                memory stays above the "chroma" backend.
+            pq_subspaces: Number of subspaces (code bytes per vector) for "pq"; must
+                divide the embedding dimension
+            rerank_factor: Candidates re-ranked at full precision per requested result
+                when the in-memory index is quantized
+            snapshot_path: Optional snapshot directory written by export_snapshot. The
+                service then runs read-only, serving queries from the memory-mapped
+                snapshot without opening ChromaDB.
+            coalesce_embeddings: If True, embedding calls made concurrently from
+                several threads are batched into shared provider requests
+            cluster_probes: Number of clusters searched per query by "clustered"
+            summarizer: Optional function summarizing a cluster's memories for
+                cluster_summaries; defaults to an extractive summary
         """
-        # Initialize embedding function with OpenAI
-        self.embedding_function = OpenAIEmbeddingFunction(
-            api_key=os.getenv("OPENAI_API_KEY"), model_name="text-embedding-3-small"
+        if backend == "clustered" and quantization is not None:
+            raise ValueError("The clustered backend does not support quantization")
+
+        self.backend = backend
+        self.memory_index_threshold = memory_index_threshold
+        self.memory_index_dtype = np.dtype(memory_index_dtype)
+        self.quantization = quantization
+        self.pq_subspaces = pq_subspaces
+        if embedding_dimensions is not None:
+            self._check_pq_dimensions(embedding_dimensions)
+        self.rerank_factor = rerank_factor
+        self.cluster_probes = cluster_probes
+        self.summarizer = summarizer
+        layout = "clustered" if backend == "clustered" else "flat"
+        self._memory_index_key = (
+            os.path.realpath(persist_directory),
+            collection_name,
+            f"{self.memory_index_dtype.name}/{quantization}/{pq_subspaces}/{layout}",
+        )
+
+        self.embedding_function = create_embedding_function(
+            embedding_function, embedding_dimensions, coalesce_embeddings
         )
 
+        # Links between related memories, kept next to the collection
+        self.memory_graph: MemoryGraph = get_memory_graph(
+            self.data_path(".graph.jsonl")
+        )
+
+        # Read-only replicas serve queries straight from a memory-mapped snapshot
+        self.snapshot: Optional[SnapshotIndex] = None
+        if snapshot_path is not None:
+            self.snapshot = SnapshotIndex(snapshot_path)
+            self.client = None
+            self.collection = None
+            return
+
         # Initialize persistent client
         self.client = chromadb.PersistentClient(path=persist_directory)
 
@@ -43,17 +212,55 @@ class ChromaDBService:
             except ValueError:
                 # Collection doesn't exist, ignore the error
                 pass
+            self._drop_memory_index()
+            self.memory_graph.clear()
+
+        # Finish a profile migration that was interrupted before the swap
+        self._recover_interrupted_migration(collection_name)
+
+        # Without an explicit profile, keep ChromaDB's defaults
+        requested_profile = None
+        if index_profile is not None or distance is not None:
+            requested_profile = get_index_profile(
+                index_profile if index_profile is not None else DEFAULT_PROFILE,
+                distance,
+            )
 
         # Get or create collection
         self.collection = self.client.get_or_create_collection(
-            name=collection_name, embedding_function=self.embedding_function
+            name=collection_name,
+            embedding_function=self.embedding_function,
+            metadata=requested_profile.to_metadata() if requested_profile else None,
         )
 
+        # HNSW parameters are fixed at creation, so existing collections keep theirs
+        if requested_profile and not requested_profile.matches(
+            self.collection.metadata
+        ):
+            if migrate_index:
+                self.migrate_index_profile(requested_profile)
+            else:
+                warnings.warn(
+                    f"Collection '{collection_name}' was built with different index "
+                    f"parameters than profile '{requested_profile.name}'; pass "
+                    "migrate_index=True to migrate it."
+                )
+
+        if embedding_dimensions is not None:
+            self._check_embedding_dimensions(embedding_dimensions)
+        elif self.quantization == "pq":
+            sample = self._collection_call("get", limit=1, include=["embeddings"])
+            if sample["ids"]:
+                self._check_pq_dimensions(len(sample["embeddings"][0]))
+
+        self._sync_memory_index()
+
     def add_documents(
         self,
         documents: List[str],
         metadatas: Optional[List[Dict[str, str]]] = None,
         ids: Optional[List[str]] = None,
+        embeddings: Optional[Embeddings] = None,
     ) -> List[str]:
         """Add documents to the collection.
 
@@ -61,14 +268,54 @@ class ChromaDBService:
             documents: List of text documents to add
             metadatas: Optional list of metadata dicts for each document
             ids: Optional list of IDs for each document. If not provided, UUIDs will be generated.
+            embeddings: Optional precomputed embeddings of the documents
 
         Returns:
             List[str]: The IDs of the added documents
         """
+        self._ensure_writable()
         if ids is None:
             ids = [str(uuid.uuid4()) for _ in documents]
 
-        self.collection.add(documents=documents, metadatas=metadatas, ids=ids)
+        # Reject vectors the product quantizer cannot split before they are stored,
+        # rather than when the quantizer trains and every later query fails
+        if self.quantization == "pq" and documents:
+            if embeddings is None:
+                embeddings = self.embedding_function(documents)
+            self._check_pq_dimensions(len(embeddings[0]))
+
+        if self.memory_index is None:
+            with self._migration_lock(shared=True):
+                self._collection_call(
+                    "add",
+                    documents=documents,
+                    metadatas=metadatas,
+                    ids=ids,
+                    embeddings=embeddings,
+                )
+            return ids
+
+        # Embed once and feed the same vectors to ChromaDB and the in-memory index
+        if embeddings is None:
+            embeddings = self.embedding_function(documents)
+        with self._migration_lock(shared=True):
+            self._collection_call(
+                "add",
+                documents=documents,
+                metadatas=metadatas,
+                ids=ids,
+                embeddings=embeddings,
+            )
+        memory_index = self._update_memory_index(
+            "add", ids, embeddings, documents, metadatas
+        )
+
+        if (
+            self.backend == "auto"
+            and memory_index is not None
+            and len(memory_index) > self.memory_index_threshold
+        ):
+            self._drop_memory_index()
         return ids
 
     def query(
@@ -87,9 +334,60 @@ class ChromaDBService:
         Returns:
             QueryResult containing documents, metadata, distances and IDs
         """
-        results = self.collection.query(
-            query_texts=[query_text],
-            n_results=max(1, min(n_results, self.get_count())),
+        query_embedding = self.embedding_function([query_text])[0]
+        return self.query_embedding(query_embedding, n_results=n_results, where=where)
+
+    def query_embedding(
+        self,
+        embedding: Embedding,
+        n_results: int = 5,
+        where: Optional[Dict[str, str]] = None,
+    ) -> QueryResult:
+        """Query the collection for documents similar to an embedding.
+
+        Args:
+            embedding: Embedding to find similar documents for
+            n_results: Number of results to return
+            where: Optional filter criteria
+
+        Returns:
+            QueryResult containing documents, metadata, distances and IDs
+        """
+        count = self.get_count()
+        if count == 0:
+            return {"documents": [], "metadatas": [], "distances": [], "ids": []}
+        n_results = max(1, min(n_results, count))
+
+        if self.snapshot is not None:
+            # A replica has no ChromaDB to fall back to
+            if not self.snapshot.supports_filter(where):
+                raise ValueError(
+                    f"The snapshot cannot answer the filter {where}; only equality, "
+                    "$eq, $in and $and are supported"
+                )
+            return self.snapshot.query(embedding, n_results=n_results, where=where)
+
+        memory_index = self._sync_memory_index(count)
+        # The index may be shared with services configured differently, so the
+        # query settings of this service are passed with each query
+        if isinstance(memory_index, ClusterIndex) and memory_index.supports_filter(
+            where
+        ):
+            return memory_index.query(
+                embedding, n_results=n_results, where=where, n_probe=self.cluster_probes
+            )
+        if memory_index is not None and memory_index.supports_filter(where):
+            return memory_index.query(
+                embedding,
+                n_results=n_results,
+                where=where,
+                rerank_factor=self.rerank_factor,
+            )
+
+        results = self._collection_call(
+            "query",
+            query_embeddings=[embedding],
+            n_results=n_results,
             where=where,
             include=["documents", "metadatas", "distances"],
         )
@@ -101,20 +399,393 @@ class ChromaDBService:
             "ids": results["ids"][0],
         }
 
+    def cluster_summaries(
+        self,
+        embedding: Embedding,
+        n_clusters: int = 3,
+        where: Optional[Dict[str, str]] = None,
+    ) -> List[str]:
+        """Summaries of the memory clusters nearest to an embedding.
+
+        Only the "clustered" backend groups memories; other backends return none.
+
+        Args:
+            embedding: Query embedding
+            n_clusters: Number of clusters to summarize
+            where: Optional filter on the memories summarized, such as a tenant
+
+        Returns:
+            List[str]: One summary per cluster, nearest cluster first
+        """
+        memory_index = self._sync_memory_index()
+        if not isinstance(memory_index, ClusterIndex) or not (
+            memory_index.supports_filter(where)
+        ):
+            return []
+        return memory_index.summaries(
+            embedding, n_clusters, self.summarizer, where=where
+        )
+
+    def get_documents(self, ids: List[str]) -> GetResult:
+        """Fetch documents by ID without a vector search.
+
+        Args:
+            ids: IDs of the documents to fetch
+
+        Returns:
+            GetResult with the documents found, in the order of ids
+        """
+        if self.snapshot is not None:
+            return self.snapshot.get(ids)
+
+        memory_index = self.memory_index
+        if memory_index is not None:
+            return memory_index.get(ids)
+
+        stored = self._collection_call(
+            "get", ids=ids, include=["documents", "metadatas"]
+        )
+        by_id = {
+            id_: (document, metadata)
+            for id_, document, metadata in zip(
+                stored["ids"], stored["documents"], stored["metadatas"]
+            )
+        }
+        found = [id_ for id_ in ids if id_ in by_id]
+        return {
+            "documents": [by_id[id_][0] for id_ in found],
+            "metadatas": [by_id[id_][1] for id_ in found],
+            "ids": found,
+        }
+
+    def migrate_index_profile(
+        self,
+        index_profile: Union[str, IndexProfile],
+        distance: Optional[DistanceMetric] = None,
+        batch_size: int = 500,
+    ) -> None:
+        """Rebuild the current collection with a different index profile.
+
+        Documents, metadata and stored embeddings are copied into a staging
+        collection, so nothing is re-embedded. The copy and swap run under an
+        exclusive lock file next to the collection, which writers of every
+        service sharing the persist directory take shared, so no write is lost
+        between the copy and the swap. The original collection is only deleted
+        once the staging collection holds exactly its IDs, and a crash between
+        the delete and the rename is recovered the next time a service is
+        initialized. Services still holding the old collection reopen it by name.
+
+        Args:
+            index_profile: Name of the target profile, or an IndexProfile instance
+            distance: Optional distance metric overriding the profile's
+            batch_size: Number of documents copied per batch
+        """
+        self._ensure_writable()
+        profile = get_index_profile(index_profile, distance)
+
+        with self._migration_lock(shared=False):
+            # Another process may have migrated the collection since it was opened
+            source = self.client.get_collection(
+                name=self.collection.name, embedding_function=self.embedding_function
+            )
+            staging_name = f"{source.name}{MIGRATION_SUFFIX}"
+
+            # A leftover staging collection next to its source is an incomplete copy
+            try:
+                self.client.delete_collection(name=staging_name)
+            except ValueError:
+                pass
+
+            staging = self.client.create_collection(
+                name=staging_name,
+                embedding_function=self.embedding_function,
+                metadata=profile.to_metadata(),
+            )
+
+            offset = 0
+            while True:
+                batch = source.get(
+                    limit=batch_size,
+                    offset=offset,
+                    include=["embeddings", "documents", "metadatas"],
+                )
+                if not batch["ids"]:
+                    break
+                staging.add(
+                    ids=batch["ids"],
+                    embeddings=batch["embeddings"],
+                    documents=batch["documents"],
+                    metadatas=batch["metadatas"],
+                )
+                offset += len(batch["ids"])
+
+            source_ids = set(source.get(include=[])["ids"])
+            staging_ids = set(staging.get(include=[])["ids"])
+            if staging_ids != source_ids:
+                self.client.delete_collection(name=staging_name)
+                raise RuntimeError(
+                    f"Migration of '{source.name}' copied {len(staging_ids)} "
+                    f"documents, {len(source_ids - staging_ids)} missing and "
+                    f"{len(staging_ids - source_ids)} unexpected; the original "
+                    "collection was left untouched."
+                )
+
+            self.client.delete_collection(name=source.name)
+            staging.modify(name=source.name)
+            self.collection = self.client.get_collection(
+                name=source.name, embedding_function=self.embedding_function
+            )
+
+        # The distance metric may have changed, so the in-memory index is rebuilt
+        self._drop_memory_index()
+        self._sync_memory_index()
+
+    def export_snapshot(
+        self, path: str, dtype: str = "float32", overwrite: bool = False
+    ) -> Dict[str, Union[str, int, list]]:
+        """Export the collection to a memory-mapped snapshot for read-only replicas.
+
+        Args:
+            path: Directory to write the snapshot to
+            dtype: Storage dtype of the snapshot's embedding matrix
+            overwrite: If True, replaces an existing snapshot at path
+
+        Returns:
+            The snapshot manifest
+        """
+        self._ensure_writable()
+        return export_snapshot(self.collection, path, dtype=dtype, overwrite=overwrite)
+
+    @property
+    def read_only(self) -> bool:
+        """Whether the service serves a snapshot and rejects writes."""
+        return self.snapshot is not None
+
+    def _ensure_writable(self) -> None:
+        if self.read_only:
+            raise RuntimeError(
+                "ChromaDBService is serving a read-only snapshot and cannot be modified"
+            )
+
+    @property
+    def memory_index(self) -> Optional[MemoryIndex]:
+        """The in-memory index serving queries, or None when ChromaDB serves them."""
+        if self.backend == "chroma" or self.read_only:
+            return None
+        return _MEMORY_INDEXES.get(self._memory_index_key)
+
+    def _sync_memory_index(self, count: Optional[int] = None) -> Optional[MemoryIndex]:
+        """Load, reload or drop the in-memory index for the current collection size.
+
+        The index is reloaded when its size no longer matches the collection, which
+        catches writes made by other processes sharing the persist directory, and
+        when a clustered or quantized index has grown enough to be retrained. Such
+        reloads run on a background thread while queries keep using the current
+        index, which is swapped out once the new one is ready; only a missing
+        index is loaded before returning.
+
+        Args:
+            count: Current collection size, if already known
+
+        Returns:
+            Optional[MemoryIndex]: The index to query, or None to use ChromaDB
+        """
+        if self.backend == "chroma" or self.read_only:
+            return None
+
+        count = self.get_count() if count is None else count
+        if self.backend == "auto" and count > self.memory_index_threshold:
+            self._drop_memory_index()
+            return None
+
+        space = (self.collection.metadata or {}).get("hnsw:space", "l2")
+        key = self._memory_index_key
+        memory_index = _MEMORY_INDEXES.get(key)
+        if memory_index is not None and memory_index.space == space:
+            if len(memory_index) != count or memory_index.needs_rebuild:
+                self._rebuild_in_background(memory_index, space)
+            return memory_index
+
+        with _index_lock(key, "build"):
+            memory_index = _MEMORY_INDEXES.get(key)
+            if memory_index is None or memory_index.space != space:
+                memory_index = self._load_memory_index(space)
+                with _MEMORY_INDEXES_LOCK:
+                    _MEMORY_INDEXES[key] = memory_index
+        return memory_index
+
+    def _load_memory_index(self, space: DistanceMetric) -> MemoryIndex:
+        """Build an in-memory index holding every row of the collection."""
+        if self.backend == "clustered":
+            memory_index = ClusterIndex(space=space, dtype=self.memory_index_dtype)
+        else:
+            memory_index = NumpyIndex(
+                space=space,
+                dtype=self.memory_index_dtype,
+                quantizer=(
+                    create_quantizer(self.quantization, self.pq_subspaces)
+                    if self.quantization
+                    else None
+                ),
+                rerank_source=self._get_embeddings,
+            )
+
+        # Load everything before adding so a quantizer or the clusters are
+        # trained on all rows
+        batch = self._collection_call(
+            "get", include=["embeddings", "documents", "metadatas"]
+        )
+        if batch["ids"]:
+            memory_index.add(
+                batch["ids"],
+                batch["embeddings"],
+                batch["documents"],
+                batch["metadatas"],
+            )
+        return memory_index
+
+    def _rebuild_in_background(self, stale: MemoryIndex, space: DistanceMetric) -> None:
+        """Reload an index on a thread and swap it in, unless one is running."""
+        key = self._memory_index_key
+        with _MEMORY_INDEXES_LOCK:
+            if key in _REBUILD_JOURNALS:
+                return
+            _REBUILD_JOURNALS[key] = []
+
+        def rebuild() -> None:
+            fresh = None
+            try:
+                with _index_lock(key, "build"):
+                    fresh = self._load_memory_index(space)
+            except Exception as error:
+                warnings.warn(
+                    f"Rebuilding the in-memory index of '{key[1]}' failed: {error}"
+                )
+            with _index_lock(key, "write"):
+                journal = _REBUILD_JOURNALS.pop(key)
+                # An index dropped or reloaded meanwhile is not replaced
+                if fresh is not None and _MEMORY_INDEXES.get(key) is stale:
+                    for method, args in journal:
+                        getattr(fresh, method)(*args)
+                    _MEMORY_INDEXES[key] = fresh
+
+        threading.Thread(
+            target=rebuild, name="memory-index-rebuild", daemon=True
+        ).start()
+
+    def _update_memory_index(self, method: str, *args: Any) -> Optional[MemoryIndex]:
+        """Apply a write to the in-memory index and to a rebuild in progress."""
+        key = self._memory_index_key
+        with _index_lock(key, "write"):
+            memory_index = _MEMORY_INDEXES.get(key)
+            if memory_index is not None:
+                getattr(memory_index, method)(*args)
+            if key in _REBUILD_JOURNALS:
+                _REBUILD_JOURNALS[key].append((method, args))
+        return memory_index
+
+    def _get_embeddings(self, ids: List[str]) -> np.ndarray:
+        """Fetch stored full-precision embeddings in the order of the given IDs."""
+        stored = self._collection_call("get", ids=ids, include=["embeddings"])
+        by_id = dict(zip(stored["ids"], stored["embeddings"]))
+        return np.asarray([by_id[id_] for id_ in ids], dtype=np.float32)
+
+    def _check_embedding_dimensions(self, embedding_dimensions: int) -> None:
+        """Ensure an existing collection was built with the configured dimensions."""
+        sample = self._collection_call("get", limit=1, include=["embeddings"])
+        if sample["ids"] and len(sample["embeddings"][0]) != embedding_dimensions:
+            raise ValueError(
+                f"Collection '{self.collection.name}' stores "
+                f"{len(sample['embeddings'][0])}-dimensional embeddings, but "
+                f"embedding_dimensions={embedding_dimensions} was requested. "
+                "Use a new collection or re-embed the existing memories."
+            )
+
+    def _check_pq_dimensions(self, dimensions: int) -> None:
+        """Ensure product quantization can split embeddings into equal subspaces."""
+        if self.quantization == "pq" and dimensions % self.pq_subspaces:
+            raise ValueError(
+                f"pq_subspaces={self.pq_subspaces} does not divide the embedding "
+                f"dimension {dimensions}; choose a divisor of {dimensions}."
+            )
+
+    def _drop_memory_index(self, collection_name: Optional[str] = None) -> None:
+        """Forget the in-memory indexes of a collection, whatever their storage."""
+        persist_directory, current_name, _ = self._memory_index_key
+        collection = (persist_directory, collection_name or current_name)
+        with _MEMORY_INDEXES_LOCK:
+            for key in [key for key in _MEMORY_INDEXES if key[:2] == collection]:
+                del _MEMORY_INDEXES[key]
+
+    def data_path(self, suffix: str, collection_name: Optional[str] = None) -> str:
+        """Path of a file kept next to a collection in the persist directory.
+
+        Args:
+            suffix: File name suffix, such as ".wal"
+            collection_name: Collection the file belongs to; defaults to the current one
+        """
+        persist_directory, current_name, _ = self._memory_index_key
+        return os.path.join(
+            persist_directory, f"{collection_name or current_name}{suffix}"
+        )
+
+    def _recover_interrupted_migration(self, collection_name: str) -> None:
+        """Rename a verified staging collection whose source was already deleted."""
+        # A migration running in another process holds the lock until its swap
+        with self._migration_lock(shared=False):
+            existing = {
+                collection.name for collection in self.client.list_collections()
+            }
+            staging_name = f"{collection_name}{MIGRATION_SUFFIX}"
+            if staging_name in existing and collection_name not in existing:
+                self.client.get_collection(name=staging_name).modify(
+                    name=collection_name
+                )
+
+    @contextmanager
+    def _migration_lock(self, shared: bool) -> Iterator[None]:
+        """Hold the lock migrations take exclusively and writes take shared."""
+        path = self.data_path(".migration.lock")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+
+    def _reopen_collection(self) -> chromadb.Collection:
+        """Fetch the collection by name again, after any migration running finishes."""
+        with self._migration_lock(shared=True):
+            self.collection = self.client.get_collection(
+                name=self.collection.name, embedding_function=self.embedding_function
+            )
+        return self.collection
+
+    def _collection_call(self, method: str, **kwargs: Any) -> Any:
+        """Call a collection method, reopening a collection replaced by a migration."""
+        try:
+            return getattr(self.collection, method)(**kwargs)
+        except InvalidCollectionException:
+            self._reopen_collection()
+            return getattr(self.collection, method)(**kwargs)
+
     def delete_collection(self, collection_name: Optional[str] = None) -> None:
         """Delete a collection by name.
 
         Args:
             collection_name: Name of the collection to delete. If None, deletes the current collection.
         """
+        self._ensure_writable()
         name_to_delete = (
             collection_name if collection_name is not None else self.collection.name
         )
         self.client.delete_collection(name=name_to_delete)
+        self._drop_memory_index(name_to_delete)
+        get_memory_graph(self.data_path(".graph.jsonl", name_to_delete)).clear()
 
     def get_count(self) -> int:
         """Get the number of documents in the collection."""
-        return self.collection.count()
+        if self.snapshot is not None:
+            return len(self.snapshot)
+        return self._collection_call("count")
 
     def delete_by_ids(self, ids: List[str]) -> None:
         """Delete documents from the collection by their IDs.
@@ -122,7 +793,18 @@ class ChromaDBService:
         Args:
             ids: List of IDs to delete
         """
-        self.collection.delete(ids=ids)
+        self._ensure_writable()
+        with self._migration_lock(shared=True):
+            self._collection_call("delete", ids=ids)
+        if self.memory_index is not None:
+            self._update_memory_index("delete", ids)
+        self.memory_graph.remove(ids)
+
+
+def _index_lock(key: Tuple[str, str, str], kind: str) -> threading.Lock:
+    """Return the "build" or "write" lock of an in-memory index."""
+    with _MEMORY_INDEXES_LOCK:
+        return _INDEX_LOCKS.setdefault((key, kind), threading.Lock())
 
 
 if __name__ == "__main__":
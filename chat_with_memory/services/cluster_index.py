@@ -0,0 +1,347 @@
+import json
+import math
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from chat_with_memory.services.index_profiles import DistanceMetric
+from chat_with_memory.services.numpy_index import NumpyIndex
+from chat_with_memory.services.quantization import _kmeans, _nearest_centroids
+
+# Turns the most central documents of a cluster into a short summary
+Summarizer = Callable[[List[str]], str]
+
+
+def extractive_summary(documents: List[str], max_items: int = 3) -> str:
+    """Summarize a cluster by joining its most central documents."""
+    return "; ".join(documents[:max_items])
+
+
+class ClusterIndex:
+    """Two-level in-memory index routing queries through cluster centroids.
+
+    Rows are grouped by k-means into about sqrt(n) clusters, each held in its own
+    NumpyIndex. A query first ranks the centroids, then searches only the n_probe
+    nearest clusters, so it scores O(sqrt(n)) rows instead of n. Neighbours in
+    clusters that were not probed are missed; raising n_probe trades speed for
+    recall.
+
+    New rows join their nearest cluster without moving the centroids. Once the
+    index has grown by rebuild_growth since it was clustered, needs_rebuild turns
+    True and the owner reloads it, which reclusters every row.
+
+    Each cluster also has a summary of its most central documents, built by the
+    summarizer when first requested and again after the cluster changes. With a
+    where filter, only matching documents are summarized, so a tenant's
+    summaries never include another tenant's memories.
+    """
+
+    def __init__(
+        self,
+        space: DistanceMetric = "l2",
+        dtype: np.dtype = np.float32,
+        n_clusters: Optional[int] = None,
+        n_probe: int = 4,
+        summarizer: Optional[Summarizer] = None,
+        summary_documents: int = 10,
+        rebuild_growth: float = 0.5,
+        iterations: int = 10,
+        max_training_rows: int = 20000,
+        seed: int = 0,
+    ) -> None:
+        """Initialize an empty index; clusters are trained on the first add.
+
+        Args:
+            space: Distance metric of the collection the index mirrors
+            dtype: Storage dtype of the cluster matrices (float32 or float16)
+            n_clusters: Number of clusters; defaults to sqrt of the first batch size
+            n_probe: Number of nearest clusters searched per query
+            summarizer: Function summarizing a cluster's most central documents;
+                defaults to extractive_summary
+            summary_documents: Number of central documents passed to the summarizer
+            rebuild_growth: Fraction the index may grow by before needs_rebuild
+            iterations: Number of k-means iterations
+            max_training_rows: Maximum number of vectors used for clustering
+            seed: Random seed for sampling and centroid initialization
+        """
+        self.space = space
+        self.dtype = dtype
+        self.n_clusters = n_clusters
+        self.n_probe = n_probe
+        self.summarizer = summarizer or extractive_summary
+        self.summary_documents = summary_documents
+        self.rebuild_growth = rebuild_growth
+        self.iterations = iterations
+        self.max_training_rows = max_training_rows
+        self.seed = seed
+        self._centroids: Optional[np.ndarray] = None
+        self._clusters: List[NumpyIndex] = []
+        self._cluster_of: Dict[str, int] = {}
+        self._versions: List[int] = []
+        self._summaries: Dict[int, Dict[Tuple[Summarizer, str], str]] = {}
+        self._trained_size = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._cluster_of)
+
+    def __contains__(self, id_: str) -> bool:
+        return id_ in self._cluster_of
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes used by the cluster matrices and the centroids."""
+        centroid_bytes = self._centroids.nbytes if self._centroids is not None else 0
+        return centroid_bytes + sum(cluster.nbytes for cluster in self._clusters)
+
+    @property
+    def needs_rebuild(self) -> bool:
+        """Whether enough rows were added since clustering to recluster."""
+        return len(self) > self._trained_size * (1 + self.rebuild_growth)
+
+    def add(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: Optional[Sequence[Optional[str]]] = None,
+        metadatas: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+    ) -> None:
+        """Add rows to their nearest clusters, replacing rows with the same IDs.
+
+        The first add trains the clusters, so load all rows in one call.
+
+        Args:
+            ids: IDs of the rows
+            embeddings: Embedding of each row
+            documents: Optional document text of each row
+            metadatas: Optional metadata dict of each row
+        """
+        vectors = self._prepare(embeddings)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("Expected one embedding per id")
+
+        with self._lock:
+            self.delete([id_ for id_ in ids if id_ in self._cluster_of])
+            if self._centroids is None:
+                self._train(vectors)
+
+            assignments = _nearest_centroids(vectors, self._centroids)
+            for cluster in np.unique(assignments):
+                rows = np.flatnonzero(assignments == cluster)
+                cluster_ids = [ids[row] for row in rows]
+                self._clusters[cluster].add(
+                    cluster_ids,
+                    vectors[rows],
+                    [documents[row] for row in rows] if documents else None,
+                    [metadatas[row] for row in rows] if metadatas else None,
+                )
+                for id_ in cluster_ids:
+                    self._cluster_of[id_] = int(cluster)
+                self._changed(int(cluster))
+
+    def delete(self, ids: Sequence[str]) -> None:
+        """Delete rows by ID, ignoring IDs that are not in the index."""
+        with self._lock:
+            by_cluster: Dict[int, List[str]] = {}
+            for id_ in ids:
+                cluster = self._cluster_of.pop(id_, None)
+                if cluster is not None:
+                    by_cluster.setdefault(cluster, []).append(id_)
+            for cluster, cluster_ids in by_cluster.items():
+                self._clusters[cluster].delete(cluster_ids)
+                self._changed(cluster)
+
+    def query(
+        self,
+        embedding: Sequence[float],
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        n_probe: Optional[int] = None,
+    ) -> Dict[str, List[Any]]:
+        """Find the nearest rows to an embedding within the nearest clusters.
+
+        Clusters without rows matching the filter do not count as probed, and
+        probing continues past n_probe clusters until n_results rows were found.
+
+        Args:
+            embedding: Query embedding
+            n_results: Number of results to return
+            where: Optional ChromaDB-style filter using equality, $eq, $in or $and
+            n_probe: Number of nearest clusters searched, overriding the index's
+
+        Returns:
+            Dict with documents, metadatas, distances and ids lists, nearest first
+        """
+        query = self._prepare([embedding])[0]
+        merged: Dict[str, List[Any]] = {
+            "documents": [],
+            "metadatas": [],
+            "distances": [],
+            "ids": [],
+        }
+
+        n_probe = n_probe or self.n_probe
+        with self._lock:
+            probed = 0
+            for cluster in self._route(query):
+                if probed >= n_probe and len(merged["ids"]) >= n_results:
+                    break
+                results = self._clusters[cluster].query(query, n_results, where)
+                if results["ids"]:
+                    probed += 1
+                    for key in merged:
+                        merged[key].extend(results[key])
+
+        order = np.argsort(merged["distances"], kind="stable")[:n_results]
+        return {key: [values[i] for i in order] for key, values in merged.items()}
+
+    def get(self, ids: Sequence[str]) -> Dict[str, List[Any]]:
+        """Look up rows by ID, skipping IDs that are not in the index.
+
+        Returns:
+            Dict with documents, metadatas and ids lists in the order of ids
+        """
+        with self._lock:
+            by_cluster: Dict[int, List[str]] = {}
+            for id_ in ids:
+                if id_ in self._cluster_of:
+                    by_cluster.setdefault(self._cluster_of[id_], []).append(id_)
+            rows = {}
+            for cluster, cluster_ids in by_cluster.items():
+                found = self._clusters[cluster].get(cluster_ids)
+                for document, metadata, id_ in zip(
+                    found["documents"], found["metadatas"], found["ids"]
+                ):
+                    rows[id_] = (document, metadata)
+
+        found_ids = [id_ for id_ in ids if id_ in rows]
+        return {
+            "documents": [rows[id_][0] for id_ in found_ids],
+            "metadatas": [rows[id_][1] for id_ in found_ids],
+            "ids": found_ids,
+        }
+
+    def supports_filter(self, where: Optional[Dict[str, Any]]) -> bool:
+        """Check whether a where filter can be answered by this index."""
+        with self._lock:
+            cluster = self._clusters[0] if self._clusters else NumpyIndex(self.space)
+        return cluster.supports_filter(where)
+
+    def summaries(
+        self,
+        embedding: Sequence[float],
+        n_clusters: int = 3,
+        summarizer: Optional[Summarizer] = None,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> List[str]:
+        """Summaries of the clusters nearest to an embedding.
+
+        Summaries are cached per cluster, summarizer and filter; the summarizer
+        runs without holding the index lock, so a slow LLM summarizer does not
+        block queries.
+
+        Args:
+            embedding: Query embedding
+            n_clusters: Number of clusters to summarize
+            summarizer: Summarizer to use, overriding the index's
+            where: Optional filter on the documents summarized; clusters without
+                matching documents are skipped
+
+        Returns:
+            List[str]: One summary per cluster, nearest cluster first
+        """
+        summarizer = summarizer or self.summarizer
+        cache_key = (summarizer, json.dumps(where or {}, sort_keys=True))
+        query = self._prepare([embedding])[0]
+        with self._lock:
+            sizes = {}
+            for cluster in self._route(query):
+                if len(sizes) == n_clusters:
+                    break
+                size = self._clusters[cluster].count(where)
+                if size:
+                    sizes[cluster] = size
+            clusters = list(sizes)
+            pending = {}
+            for cluster in clusters:
+                if cache_key not in self._summaries.get(cluster, {}):
+                    central = self._clusters[cluster].query(
+                        self._centroids[cluster], self.summary_documents, where
+                    )
+                    pending[cluster] = (self._versions[cluster], central["documents"])
+
+        summaries = {}
+        for cluster, (version, documents) in pending.items():
+            summaries[cluster] = summarizer(documents)
+            with self._lock:
+                if self._versions[cluster] == version:
+                    self._summaries.setdefault(cluster, {})[cache_key] = summaries[
+                        cluster
+                    ]
+
+        with self._lock:
+            for cluster in clusters:
+                summaries.setdefault(
+                    cluster, self._summaries.get(cluster, {}).get(cache_key, "")
+                )
+        return [
+            f"{summaries[cluster]} ({sizes[cluster]} "
+            f"{'memory' if sizes[cluster] == 1 else 'memories'})"
+            for cluster in clusters
+        ]
+
+    def _prepare(self, embeddings: Sequence[Sequence[float]]) -> np.ndarray:
+        """Convert to float32, normalizing for cosine so clusters follow the angle."""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if self.space == "cosine" and vectors.ndim == 2:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+        return vectors
+
+    def _train(self, vectors: np.ndarray) -> None:
+        """Cluster the first batch of rows and create one sub-index per cluster."""
+        rng = np.random.default_rng(self.seed)
+        n_clusters = self.n_clusters or max(1, round(math.sqrt(len(vectors))))
+        n_clusters = min(n_clusters, len(vectors))
+        self._trained_size = len(vectors)
+        if len(vectors) > self.max_training_rows:
+            vectors = vectors[
+                rng.choice(len(vectors), self.max_training_rows, replace=False)
+            ]
+        self._centroids = _kmeans(vectors, n_clusters, self.iterations, rng)
+        self._clusters = [
+            NumpyIndex(space=self.space, dtype=self.dtype, initial_capacity=64)
+            for _ in range(n_clusters)
+        ]
+        self._versions = [0] * n_clusters
+
+    def _route(self, query: np.ndarray) -> List[int]:
+        """Cluster numbers ordered by the distance of their centroid to the query."""
+        if self._centroids is None:
+            return []
+        return np.argsort(
+            _centroid_distances(query, self._centroids, self.space)
+        ).tolist()
+
+    def _changed(self, cluster: int) -> None:
+        self._versions[cluster] += 1
+        self._summaries.pop(cluster, None)
+
+
+def _centroid_distances(
+    query: np.ndarray, centroids: np.ndarray, space: DistanceMetric = "l2"
+) -> np.ndarray:
+    """Distances from the query to each centroid in the index's space.
+
+    Squared L2 up to a constant for "l2", negated dot product for "ip" (whose
+    nearest rows have the largest dot product, not the closest position) and
+    negated cosine similarity for "cosine".
+    """
+    dots = centroids @ query
+    if space == "ip":
+        return -dots
+    if space == "cosine":
+        norms = np.linalg.norm(centroids, axis=1)
+        return -dots / np.maximum(norms, np.finfo(np.float32).tiny)
+    return (centroids**2).sum(axis=1) - 2 * dots
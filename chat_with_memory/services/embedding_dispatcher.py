@@ -0,0 +1,184 @@
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import openai
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+# HTTP statuses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class EmbeddingDispatcher(EmbeddingFunction[Documents]):
+    """Embedding function that coalesces concurrent calls into batched requests.
+
+    Threads calling the dispatcher enqueue their texts and wait. A collector
+    thread gathers everything that arrives within max_wait seconds, up to
+    max_batch_size texts, and sends it to the wrapped embedding function in one
+    call, then fans the vectors back out. A text that is already queued or being
+    embedded is not sent again; later callers wait on the same result.
+
+    Rate limits and transient errors are retried with exponential backoff and
+    jitter, honouring the provider's Retry-After header. While backing off, no
+    other batch is sent either, so concurrent batches don't keep hitting a
+    rate-limited endpoint.
+    """
+
+    def __init__(
+        self,
+        embedding_function: EmbeddingFunction[Documents],
+        max_batch_size: int = 256,
+        max_wait: float = 0.005,
+        max_concurrent_batches: int = 4,
+        max_retries: int = 6,
+        initial_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ) -> None:
+        """Initialize the dispatcher.
+
+        Args:
+            embedding_function: Embedding function that performs the provider calls
+            max_batch_size: Maximum number of texts sent in one provider call
+            max_wait: Seconds to wait for more texts before sending a partial batch
+            max_concurrent_batches: Maximum number of provider calls in flight
+            max_retries: Maximum number of retries of a failed batch
+            initial_backoff: Backoff in seconds before the first retry
+            max_backoff: Upper bound of the backoff in seconds
+        """
+        self.embedding_function = embedding_function
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+        self._condition = threading.Condition()
+        self._queue: List[str] = []
+        self._inflight: Dict[str, Future] = {}
+        self._resume_at = 0.0
+        self._closed = False
+        self._batches = ThreadPoolExecutor(
+            max_concurrent_batches, thread_name_prefix="embedding-batch"
+        )
+        self._slots = threading.BoundedSemaphore(max_concurrent_batches)
+        self._collector = threading.Thread(
+            target=self._collect, name="embedding-dispatcher", daemon=True
+        )
+        self._collector.start()
+
+    def __call__(self, input: Documents) -> Embeddings:
+        if not input:
+            return []
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Embedding dispatcher is closed")
+            futures = []
+            for text in input:
+                future = self._inflight.get(text)
+                if future is None:
+                    future = Future()
+                    self._inflight[text] = future
+                    self._queue.append(text)
+                futures.append(future)
+            self._condition.notify()
+
+        return [future.result() for future in futures]
+
+    def close(self) -> None:
+        """Send the queued texts, then stop the collector and batch threads."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._collector.join()
+        self._batches.shutdown(wait=True)
+
+    def _collect(self) -> None:
+        """Form batches from the queue and hand them to the batch threads."""
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+
+                # Give concurrent callers a short window to join the batch
+                deadline = time.monotonic() + self.max_wait
+                while len(self._queue) < self.max_batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                batch = self._queue[: self.max_batch_size]
+                del self._queue[: self.max_batch_size]
+
+            self._slots.acquire()
+            self._batches.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[str]) -> None:
+        try:
+            embeddings, error = self._embed_with_retries(batch)
+        finally:
+            self._slots.release()
+
+        with self._condition:
+            futures = [self._inflight.pop(text) for text in batch]
+        for index, future in enumerate(futures):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(embeddings[index])
+
+    def _embed_with_retries(
+        self, batch: List[str]
+    ) -> Tuple[Optional[Embeddings], Optional[BaseException]]:
+        attempt = 0
+        while True:
+            pause = self._resume_at - time.monotonic()
+            if pause > 0:
+                time.sleep(pause)
+            try:
+                return self.embedding_function(batch), None
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None or attempt == self.max_retries:
+                    return None, e
+                with self._condition:
+                    self._resume_at = max(self._resume_at, time.monotonic() + delay)
+                attempt += 1
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying after an error, or None if it is fatal."""
+        if isinstance(error, openai.APIConnectionError):
+            status = None
+        elif isinstance(error, openai.APIStatusError):
+            status = error.status_code
+            if status not in RETRYABLE_STATUSES:
+                return None
+        elif isinstance(error, (ConnectionError, TimeoutError)):
+            status = None
+        else:
+            return None
+
+        backoff = min(self.max_backoff, self.initial_backoff * 2**attempt)
+        delay = random.uniform(backoff / 2, backoff)
+        if status is not None:
+            retry_after = _retry_after_seconds(error)
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+
+def _retry_after_seconds(error: "openai.APIStatusError") -> Optional[float]:
+    headers = error.response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
@@ -0,0 +1,45 @@
+import hashlib
+import re
+import threading
+import time
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+
+class HashEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Deterministic bag-of-words embeddings built from hashed tokens.
+
+    Texts sharing words get similar vectors, which is enough for load tests and
+    offline runs that must not call the embedding API.
+    """
+
+    def __init__(self, dimensions: int = 256, latency: float = 0.0) -> None:
+        """Initialize the stub embedding function.
+
+        Args:
+            dimensions: Embedding dimension
+            latency: Seconds each call takes, regardless of batch size
+        """
+        self.dimensions = dimensions
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, input: Documents) -> Embeddings:
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        embeddings = []
+        for text in input:
+            vector = np.zeros(self.dimensions, dtype=np.float32)
+            for token in re.findall(r"\w+", text.lower()):
+                digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                vector[value % self.dimensions] += 1.0 if value & 1 << 63 else -1.0
+            if not vector.any():
+                vector[0] = 1.0
+            embeddings.append(vector / np.linalg.norm(vector))
+        return embeddings
@@ -0,0 +1,89 @@
+from dataclasses import dataclass, replace
+from typing import Dict, Literal, Optional, Union
+
+DistanceMetric = Literal["cosine", "l2", "ip"]
+
+
+@dataclass(frozen=True)
+class IndexProfile:
+    """HNSW parameters applied to a ChromaDB collection when it is created."""
+
+    name: str
+    space: DistanceMetric = "cosine"
+    construction_ef: int = 100
+    search_ef: int = 10
+    M: int = 16
+    batch_size: int = 100
+    sync_threshold: int = 1000
+
+    def to_metadata(self) -> Dict[str, Union[str, int]]:
+        """Convert the profile to ChromaDB collection metadata."""
+        return {
+            "index_profile": self.name,
+            "hnsw:space": self.space,
+            "hnsw:construction_ef": self.construction_ef,
+            "hnsw:search_ef": self.search_ef,
+            "hnsw:M": self.M,
+            "hnsw:batch_size": self.batch_size,
+            "hnsw:sync_threshold": self.sync_threshold,
+        }
+
+    def matches(self, metadata: Optional[Dict[str, Union[str, int, float]]]) -> bool:
+        """Check whether existing collection metadata was built with this profile.
+
+        Collections created without metadata use ChromaDB's defaults, so missing
+        keys are compared against those rather than treated as a mismatch.
+        """
+        metadata = metadata or {}
+        current = DEFAULT_PROFILE.to_metadata()
+        current.update(metadata)
+        return all(
+            current.get(key) == value
+            for key, value in self.to_metadata().items()
+            if key.startswith("hnsw:")
+        )
+
+
+# ChromaDB's own defaults, used for collections created without metadata
+DEFAULT_PROFILE = IndexProfile(name="default", space="l2")
+
+INDEX_PROFILES: Dict[str, IndexProfile] = {
+    # Few thousand memories per user: a sparser graph keeps inserts and queries cheap
+    "small": IndexProfile(name="small", construction_ef=100, search_ef=32, M=12),
+    # Large collections: denser graph and wider search beam for recall
+    "large": IndexProfile(name="large", construction_ef=200, search_ef=128, M=32),
+    # Initial imports: cheap construction and infrequent index syncs to disk
+    "bulk_load": IndexProfile(
+        name="bulk_load",
+        construction_ef=64,
+        search_ef=64,
+        M=16,
+        batch_size=1000,
+        sync_threshold=10000,
+    ),
+}
+
+
+def get_index_profile(
+    profile: Union[str, IndexProfile], distance: Optional[DistanceMetric] = None
+) -> IndexProfile:
+    """Resolve a profile name to an IndexProfile, optionally overriding its distance.
+
+    Args:
+        profile: Name of one of INDEX_PROFILES, or an IndexProfile instance
+        distance: Optional distance metric overriding the profile's space
+
+    Returns:
+        IndexProfile: The resolved profile
+    """
+    if isinstance(profile, str):
+        if profile not in INDEX_PROFILES:
+            raise ValueError(
+                f"Unknown index profile '{profile}'. "
+                f"Available profiles: {', '.join(INDEX_PROFILES)}"
+            )
+        profile = INDEX_PROFILES[profile]
+
+    if distance is not None and distance != profile.space:
+        profile = replace(profile, space=distance)
+    return profile
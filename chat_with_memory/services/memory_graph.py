@@ -0,0 +1,322 @@
+import fcntl
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+# Capitalized words that start a sentence are usually not names
+ENTITY_PATTERN = re.compile(r"\b[A-Z][\w'&-]*(?:\s+[A-Z][\w'&-]*)*")
+POSSESSIVE = re.compile(r"'s$")
+SENTENCE_START = re.compile(r"(?:^|[.!?;:]\s+)$")
+STOPWORDS = {"i", "i'm", "i've", "the", "a", "an", "my", "our", "their", "they"}
+
+# Rewrite the edge log once it holds this many times more lines than live entries
+COMPACTION_RATIO = 2
+
+# Graphs are shared by every service instance in the process that uses the
+# same log file, so links written by the store tool are seen by the query tool
+_GRAPHS: Dict[str, "MemoryGraph"] = {}
+_GRAPHS_LOCK = threading.Lock()
+
+
+def extract_entities(text: str) -> Set[str]:
+    """Extract lowercased names and proper nouns from a memory's text.
+
+    Runs of capitalized words are taken as entities ("Project Aurora", "IBM
+    Quantum"). A run starting a sentence loses its first word, which is more
+    often a capitalized verb or pronoun than part of a name.
+    """
+    entities = set()
+    for match in ENTITY_PATTERN.finditer(text):
+        words = match.group().split()
+        if SENTENCE_START.search(text[: match.start()]):
+            words = words[1:]
+        entity = POSSESSIVE.sub("", " ".join(words)).strip("'").lower()
+        if entity and entity not in STOPWORDS:
+            entities.add(entity)
+    return entities
+
+
+class MemoryGraph:
+    """Adjacency index linking related memories for multi-hop retrieval.
+
+    Each memory is linked to its nearest neighbours at store time and to other
+    memories of the same tenant mentioning the same entities; memories of
+    different tenants are never linked. Links are weighted, undirected and
+    kept in memory as an adjacency list, so following them at query time costs
+    a few dictionary lookups instead of extra vector searches. Changes are
+    appended to a JSON lines log that is replayed on startup.
+
+    Several processes may share a log. Each operation first reads the lines
+    other processes appended since the last one, and reloads the whole log when
+    it was rewritten or removed. Writes and compaction hold an exclusive lock
+    on a lock file next to the log, so compaction never drops a line another
+    process is appending.
+    """
+
+    def __init__(self, path: str, max_entity_links: int = 20) -> None:
+        """Load a graph from its edge log, or start an empty one.
+
+        Args:
+            path: Path of the edge log; created on the first write
+            max_entity_links: Maximum number of existing memories a new memory is
+                linked to per shared entity, which keeps common entities from
+                turning into hubs
+        """
+        self.path = path
+        self.max_entity_links = max_entity_links
+        self._adjacency: Dict[str, Dict[str, float]] = {}
+        self._entities: Dict[str, Set[str]] = {}
+        self._tenants: Dict[str, Optional[str]] = {}
+        self._members: Dict[Tuple[Optional[str], str], List[str]] = {}
+        self._lock = threading.RLock()
+        self._log_lines = 0
+        # Inode of the log as last read and the bytes of it applied so far
+        self._log_inode: Optional[int] = None
+        self._log_offset = 0
+
+        with self._lock:
+            self._refresh()
+            if self._log_lines > COMPACTION_RATIO * max(self._live_entries(), 1):
+                self.compact()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._entities)
+
+    def __contains__(self, memory_id: str) -> bool:
+        with self._lock:
+            self._refresh()
+            return memory_id in self._entities
+
+    def add_memory(
+        self,
+        memory_id: str,
+        content: str,
+        neighbours: Sequence[Tuple[str, float]] = (),
+        tenant: Optional[str] = None,
+    ) -> None:
+        """Add a memory and link it to its neighbours and shared-entity memories.
+
+        Args:
+            memory_id: ID of the stored memory
+            content: Text of the memory, used for entity extraction
+            neighbours: (ID, distance) pairs of the memory's nearest neighbours
+            tenant: Tenant owning the memory; it is only linked to memories of
+                the same tenant
+        """
+        with self._lock, self._file_lock():
+            self._refresh()
+            if memory_id in self._entities:
+                return
+            entities = extract_entities(content)
+            records = [
+                {
+                    "op": "node",
+                    "id": memory_id,
+                    "entities": sorted(entities),
+                    "tenant": tenant,
+                }
+            ]
+
+            links: Dict[str, float] = {}
+            for neighbour, distance in neighbours:
+                if neighbour == memory_id:
+                    continue
+                if self._tenants.get(neighbour, tenant) != tenant:
+                    continue
+                links[neighbour] = links.get(neighbour, 0.0) + 1 / (1 + distance)
+            for entity in entities:
+                members = self._members.get((tenant, entity), [])
+                for other in members[-self.max_entity_links :]:
+                    if other != memory_id:
+                        links[other] = links.get(other, 0.0) + 1.0
+
+            for other, weight in links.items():
+                records.append({"op": "edge", "a": memory_id, "b": other, "w": weight})
+            self._apply(records)
+            self._append(records)
+
+    def remove(self, memory_ids: Iterable[str]) -> None:
+        """Remove memories and all their links."""
+        with self._lock, self._file_lock():
+            self._refresh()
+            records = [
+                {"op": "remove", "id": memory_id}
+                for memory_id in memory_ids
+                if memory_id in self._entities or memory_id in self._adjacency
+            ]
+            if records:
+                self._apply(records)
+                self._append(records)
+
+    def neighbours(
+        self, memory_ids: Sequence[str], limit: int = 3, hops: int = 1
+    ) -> List[str]:
+        """Follow links from a set of memories.
+
+        Args:
+            memory_ids: IDs of the memories to expand
+            limit: Maximum number of strongest links followed per memory
+            hops: Number of link hops to follow
+
+        Returns:
+            List[str]: IDs of linked memories not in memory_ids, in the order found
+        """
+        with self._lock:
+            self._refresh()
+            seen = set(memory_ids)
+            frontier = list(memory_ids)
+            found = []
+            for _ in range(hops):
+                next_frontier = []
+                for memory_id in frontier:
+                    links = self._adjacency.get(memory_id, {})
+                    ranked = sorted(links, key=links.__getitem__, reverse=True)
+                    added = 0
+                    for neighbour in ranked:
+                        if added == limit:
+                            break
+                        if neighbour in seen:
+                            continue
+                        seen.add(neighbour)
+                        found.append(neighbour)
+                        next_frontier.append(neighbour)
+                        added += 1
+                frontier = next_frontier
+            return found
+
+    def clear(self) -> None:
+        """Remove every memory and delete the edge log."""
+        with self._lock, self._file_lock():
+            self._reset()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def compact(self) -> None:
+        """Rewrite the edge log with only the live nodes and edges."""
+        with self._lock, self._file_lock():
+            # Include lines other processes appended before the lock was taken
+            self._refresh()
+            records = [
+                {
+                    "op": "node",
+                    "id": memory_id,
+                    "entities": sorted(entities),
+                    "tenant": self._tenants.get(memory_id),
+                }
+                for memory_id, entities in self._entities.items()
+            ]
+            records += [
+                {"op": "edge", "a": a, "b": b, "w": weight}
+                for a, links in self._adjacency.items()
+                for b, weight in links.items()
+                if a < b
+            ]
+            temporary_path = f"{self.path}.tmp"
+            with open(temporary_path, "w") as log:
+                log.writelines(json.dumps(record) + "\n" for record in records)
+            os.replace(temporary_path, self.path)
+            stat = os.stat(self.path)
+            self._log_inode = stat.st_ino
+            self._log_offset = stat.st_size
+            self._log_lines = len(records)
+
+    def _apply(self, records: List[dict]) -> None:
+        for record in records:
+            op = record["op"]
+            if op == "node":
+                # Logs written before tenants were recorded hold untenanted nodes
+                tenant = record.get("tenant")
+                self._entities[record["id"]] = set(record["entities"])
+                self._tenants[record["id"]] = tenant
+                for entity in record["entities"]:
+                    self._members.setdefault((tenant, entity), []).append(record["id"])
+            elif op == "edge":
+                a, b, weight = record["a"], record["b"], record["w"]
+                self._adjacency.setdefault(a, {})[b] = weight
+                self._adjacency.setdefault(b, {})[a] = weight
+            elif op == "remove":
+                memory_id = record["id"]
+                for neighbour in self._adjacency.pop(memory_id, {}):
+                    self._adjacency.get(neighbour, {}).pop(memory_id, None)
+                tenant = self._tenants.pop(memory_id, None)
+                for entity in self._entities.pop(memory_id, set()):
+                    members = self._members.get((tenant, entity), [])
+                    if memory_id in members:
+                        members.remove(memory_id)
+
+    def _append(self, records: List[dict]) -> None:
+        """Append records; the caller holds the file lock and has refreshed."""
+        with open(self.path, "a") as log:
+            log.writelines(json.dumps(record) + "\n" for record in records)
+            self._log_offset = log.tell()
+        self._log_inode = os.stat(self.path).st_ino
+        self._log_lines += len(records)
+
+    def _refresh(self) -> None:
+        """Apply lines other processes appended, or reload a rewritten log."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self._log_inode is not None:
+                # Cleared by another process
+                self._reset()
+            return
+
+        if stat.st_ino != self._log_inode or stat.st_size < self._log_offset:
+            # Compacted or recreated since it was read
+            self._reset()
+            self._log_inode = stat.st_ino
+        elif stat.st_size == self._log_offset:
+            return
+
+        with open(self.path, "rb") as log:
+            log.seek(self._log_offset)
+            data = log.read()
+        # A line still being written is picked up once it is complete
+        data = data[: data.rfind(b"\n") + 1]
+        records = []
+        for line in data.splitlines():
+            self._log_lines += 1
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A torn line from a crash mid-write only loses its links
+                continue
+        self._apply(records)
+        self._log_offset += len(data)
+
+    def _reset(self) -> None:
+        self._adjacency.clear()
+        self._entities.clear()
+        self._tenants.clear()
+        self._members.clear()
+        self._log_lines = 0
+        self._log_inode = None
+        self._log_offset = 0
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Hold the exclusive lock writers of the edge log take, across processes."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            yield
+
+    def _live_entries(self) -> int:
+        edges = sum(len(links) for links in self._adjacency.values()) // 2
+        return len(self._entities) + edges
+
+
+def get_memory_graph(path: str) -> MemoryGraph:
+    """Return the process-wide graph for an edge log, loading it on first use."""
+    path = os.path.realpath(path)
+    with _GRAPHS_LOCK:
+        graph = _GRAPHS.get(path)
+        if graph is None:
+            graph = _GRAPHS[path] = MemoryGraph(path)
+        return graph
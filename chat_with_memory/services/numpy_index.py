@@ -0,0 +1,443 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from chat_with_memory.services.index_profiles import DistanceMetric
+from chat_with_memory.services.quantization import Quantizer
+
+# float16 rows are upcast in blocks of this many rows to bound temporary memory
+SCORE_BLOCK_ROWS = 4096
+
+
+class UnsupportedFilterError(ValueError):
+    """Raised when a where filter cannot be answered from precomputed masks."""
+
+
+class NumpyIndex:
+    """Memory-resident brute-force index over a contiguous embedding matrix.
+
+    Rows are kept densely packed (deletes move the last row into the gap), so a
+    query is a single matrix-vector product followed by an argpartition. Metadata
+    is stored columnar, with one int32 category-code column per key (-1 where a
+    row lacks the key), so equality filters cost one vectorized comparison and
+    memory grows with rows times keys rather than with distinct values.
+
+    Distances match ChromaDB's definitions for the same space: squared L2 for
+    "l2", 1 - cosine similarity for "cosine" and 1 - dot product for "ip".
+
+    With a quantizer, rows are stored as codes and scored approximately. When a
+    rerank source is given, the top rerank_factor * n_results candidates are then
+    re-scored with full-precision vectors fetched from it. Rows stay float until
+    min_training_rows are held, then the quantizer is trained on all of them and
+    the matrix is re-encoded. Once the index has grown by retrain_growth since
+    training, needs_rebuild turns True and the owner reloads it, which retrains
+    the quantizer on every row.
+    """
+
+    def __init__(
+        self,
+        space: DistanceMetric = "l2",
+        dtype: np.dtype = np.float32,
+        initial_capacity: int = 1024,
+        quantizer: Optional[Quantizer] = None,
+        rerank_source: Optional[Callable[[List[str]], np.ndarray]] = None,
+        rerank_factor: int = 4,
+        min_training_rows: int = 1024,
+        retrain_growth: float = 1.0,
+    ) -> None:
+        """Initialize an empty index.
+
+        Args:
+            space: Distance metric of the collection the index mirrors
+            dtype: Storage dtype of the embedding matrix (float32 or float16)
+            initial_capacity: Number of rows to allocate up front
+            quantizer: Optional quantizer storing rows as codes instead of floats.
+                If not already fitted, it is trained once min_training_rows are held.
+            rerank_source: Optional callable returning full-precision embeddings for
+                a list of IDs, used to re-rank quantized candidates
+            rerank_factor: Number of candidates re-ranked per requested result
+            min_training_rows: Number of rows kept as floats before the quantizer
+                is trained on all of them
+            retrain_growth: Fraction the index may grow by after training before
+                needs_rebuild
+        """
+        self.space = space
+        self.quantizer = quantizer
+        self.rerank_source = rerank_source
+        self.rerank_factor = rerank_factor
+        self.min_training_rows = min_training_rows
+        self.retrain_growth = retrain_growth
+        self.dtype = np.dtype(dtype)
+        self._trained_size = 0
+        if self.quantized:
+            self.dtype = np.dtype(quantizer.code_dtype)
+        self._capacity = initial_capacity
+        self._size = 0
+        self._dimensions: Optional[int] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._squared_norms = np.zeros(initial_capacity, dtype=np.float32)
+        self._ids: List[str] = []
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+        self._codes: Dict[str, np.ndarray] = {}
+        self._value_codes: Dict[str, Dict[Any, int]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, id_: str) -> bool:
+        return id_ in self._positions
+
+    @property
+    def quantized(self) -> bool:
+        """Whether rows are currently stored as quantizer codes."""
+        return self.quantizer is not None and self.quantizer.is_fitted
+
+    @property
+    def needs_rebuild(self) -> bool:
+        """Whether enough rows were added since training to retrain the quantizer."""
+        return (
+            self.quantized
+            and self._trained_size > 0
+            and len(self) > self._trained_size * (1 + self.retrain_growth)
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes used by the embedding matrix (or codes) and its row norms."""
+        matrix_bytes = self._matrix.nbytes if self._matrix is not None else 0
+        return matrix_bytes + self._squared_norms.nbytes
+
+    def add(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: Optional[Sequence[Optional[str]]] = None,
+        metadatas: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+    ) -> None:
+        """Add rows to the index, replacing any rows with the same IDs.
+
+        Args:
+            ids: IDs of the rows
+            embeddings: Embedding of each row
+            documents: Optional document text of each row
+            metadatas: Optional metadata dict of each row
+        """
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("Expected one embedding per id")
+        if self.space == "cosine":
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+
+        with self._lock:
+            self.delete([id_ for id_ in ids if id_ in self._positions])
+            if (
+                self.quantizer is not None
+                and not self.quantized
+                and self._size + len(ids) >= self.min_training_rows
+            ):
+                self._train(vectors)
+            self._ensure_capacity(self._size + len(ids), vectors.shape[1])
+
+            start, end = self._size, self._size + len(ids)
+            if self.quantized:
+                codes = self.quantizer.encode(vectors)
+                self._matrix[start:end] = codes
+                # L2 scoring uses the norms of what is actually stored
+                vectors = self.quantizer.decode(codes)
+            else:
+                self._matrix[start:end] = vectors
+            self._squared_norms[start:end] = (vectors**2).sum(axis=1)
+
+            for offset, id_ in enumerate(ids):
+                metadata = dict(metadatas[offset] or {}) if metadatas else {}
+                self._positions[id_] = start + offset
+                self._ids.append(id_)
+                self._documents.append(documents[offset] if documents else None)
+                self._metadatas.append(metadata)
+                for key, value in metadata.items():
+                    codes = self._value_codes.setdefault(key, {})
+                    self._column_for(key)[start + offset] = codes.setdefault(
+                        value, len(codes)
+                    )
+            self._size = end
+
+    def delete(self, ids: Sequence[str]) -> None:
+        """Delete rows by ID, ignoring IDs that are not in the index."""
+        with self._lock:
+            for id_ in ids:
+                position = self._positions.pop(id_, None)
+                if position is None:
+                    continue
+                last = self._size - 1
+
+                if position != last:
+                    # Move the last row into the gap to keep the matrix dense
+                    moved_id = self._ids[last]
+                    self._matrix[position] = self._matrix[last]
+                    self._squared_norms[position] = self._squared_norms[last]
+                    self._ids[position] = moved_id
+                    self._documents[position] = self._documents[last]
+                    self._metadatas[position] = self._metadatas[last]
+                    for column in self._codes.values():
+                        column[position] = column[last]
+                    self._positions[moved_id] = position
+
+                for column in self._codes.values():
+                    column[last] = -1
+
+                self._ids.pop()
+                self._documents.pop()
+                self._metadatas.pop()
+                self._size = last
+
+    def query(
+        self,
+        embedding: Sequence[float],
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        rerank_factor: Optional[int] = None,
+    ) -> Dict[str, List[Any]]:
+        """Find the nearest rows to an embedding.
+
+        Args:
+            embedding: Query embedding
+            n_results: Number of results to return
+            where: Optional ChromaDB-style filter using equality, $eq, $in or $and
+            rerank_factor: Candidates re-ranked per result, overriding the index's
+
+        Returns:
+            Dict with documents, metadatas, distances and ids lists, nearest first
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+
+        with self._lock:
+            if where:
+                rows = np.flatnonzero(self._filter_mask(where)[: self._size])
+            else:
+                rows = None
+
+            candidates = self._size if rows is None else len(rows)
+            if candidates == 0 or n_results <= 0:
+                return {"documents": [], "metadatas": [], "distances": [], "ids": []}
+
+            distances = self._distances(query, rows)
+            k = min(n_results, candidates)
+            rerank = self.quantized and self.rerank_source is not None
+            rerank_factor = rerank_factor or self.rerank_factor
+            shortlist = min(k * rerank_factor, candidates) if rerank else k
+
+            top = top_k(distances, shortlist)
+            positions = top if rows is None else rows[top]
+            distances = distances[top]
+
+            if rerank:
+                ids = [self._ids[p] for p in positions]
+                exact = self._exact_distances(query, self.rerank_source(ids))
+                order = np.argsort(exact, kind="stable")[:k]
+                positions, distances = positions[order], exact[order]
+
+            return {
+                "documents": [self._documents[p] for p in positions],
+                "metadatas": [self._metadatas[p] for p in positions],
+                "distances": distances.tolist(),
+                "ids": [self._ids[p] for p in positions],
+            }
+
+    def get(self, ids: Sequence[str]) -> Dict[str, List[Any]]:
+        """Look up rows by ID, skipping IDs that are not in the index.
+
+        Returns:
+            Dict with documents, metadatas and ids lists in the order of ids
+        """
+        with self._lock:
+            positions = [self._positions[id_] for id_ in ids if id_ in self._positions]
+            return {
+                "documents": [self._documents[p] for p in positions],
+                "metadatas": [self._metadatas[p] for p in positions],
+                "ids": [self._ids[p] for p in positions],
+            }
+
+    def count(self, where: Optional[Dict[str, Any]] = None) -> int:
+        """Number of rows, or of rows matching a where filter."""
+        with self._lock:
+            if not where:
+                return self._size
+            return int(self._filter_mask(where)[: self._size].sum())
+
+    def supports_filter(self, where: Optional[Dict[str, Any]]) -> bool:
+        """Check whether a where filter can be answered by this index."""
+        try:
+            with self._lock:
+                self._filter_mask(where or {})
+        except UnsupportedFilterError:
+            return False
+        return True
+
+    def _distances(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Compute distances from the query to all rows, or to the given rows."""
+        if self.space == "cosine":
+            query = query / max(float(np.linalg.norm(query)), np.finfo(np.float32).tiny)
+
+        matrix = self._matrix[: self._size] if rows is None else self._matrix[rows]
+        if self.quantized:
+            dots = self.quantizer.dot(query, matrix)
+        else:
+            dots = matrix_dot(matrix, query)
+
+        if self.space == "l2":
+            squared_norms = self._squared_norms[: self._size]
+            if rows is not None:
+                squared_norms = self._squared_norms[rows]
+            return np.maximum(squared_norms - 2 * dots + float(query @ query), 0.0)
+        return 1.0 - dots
+
+    def _exact_distances(self, query: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        """Compute full-precision distances from the query to the given vectors."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.space == "l2":
+            return ((vectors - query) ** 2).sum(axis=1)
+        if self.space == "cosine":
+            norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query)
+            return 1.0 - (vectors @ query) / np.maximum(
+                norms, np.finfo(np.float32).tiny
+            )
+        return 1.0 - vectors @ query
+
+    def _filter_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        """Build the row mask for a ChromaDB-style where filter."""
+        return where_mask(where, self._value_mask, self._capacity)
+
+    def _value_mask(self, key: str, value: Any) -> np.ndarray:
+        code = self._value_codes.get(key, {}).get(value)
+        if code is None:
+            return np.zeros(self._capacity, dtype=bool)
+        return self._codes[key] == code
+
+    def _column_for(self, key: str) -> np.ndarray:
+        column = self._codes.get(key)
+        if column is None:
+            column = np.full(self._capacity, -1, dtype=np.int32)
+            self._codes[key] = column
+        return column
+
+    def _ensure_capacity(self, required: int, dimensions: int) -> None:
+        """Allocate or grow the matrix, doubling capacity to amortize copies."""
+        if self._dimensions is None:
+            self._dimensions = dimensions
+        elif dimensions != self._dimensions:
+            raise ValueError(
+                f"Embedding dimension {dimensions} does not match index "
+                f"dimension {self._dimensions}"
+            )
+
+        if self._matrix is not None and required <= self._capacity:
+            return
+
+        capacity = self._capacity
+        while capacity < required:
+            capacity *= 2
+
+        row_size = (
+            self.quantizer.code_size(dimensions) if self.quantized else dimensions
+        )
+        matrix = np.zeros((capacity, row_size), dtype=self.dtype)
+        squared_norms = np.zeros(capacity, dtype=np.float32)
+        if self._matrix is not None:
+            matrix[: self._size] = self._matrix[: self._size]
+            squared_norms[: self._size] = self._squared_norms[: self._size]
+        self._matrix = matrix
+        self._squared_norms = squared_norms
+
+        for key, column in self._codes.items():
+            grown = np.full(capacity, -1, dtype=np.int32)
+            grown[: len(column)] = column
+            self._codes[key] = grown
+        self._capacity = capacity
+
+    def _train(self, vectors: np.ndarray) -> None:
+        """Train the quantizer on the float rows held so far plus new vectors.
+
+        Rows already in the matrix are re-encoded as codes in place of floats.
+        """
+        held = (
+            self._matrix[: self._size].astype(np.float32)
+            if self._matrix is not None
+            else np.empty((0, vectors.shape[1]), dtype=np.float32)
+        )
+        self.quantizer.fit(np.concatenate([held, vectors]))
+        self._trained_size = len(held) + len(vectors)
+        self.dtype = np.dtype(self.quantizer.code_dtype)
+        if self._matrix is None:
+            return
+
+        codes = self.quantizer.encode(held)
+        matrix = np.zeros((self._capacity, codes.shape[1]), dtype=self.dtype)
+        matrix[: self._size] = codes
+        self._matrix = matrix
+        self._squared_norms[: self._size] = (self.quantizer.decode(codes) ** 2).sum(
+            axis=1
+        )
+
+
+def where_mask(
+    where: Dict[str, Any],
+    value_mask: Callable[[str, Any], np.ndarray],
+    size: int,
+) -> np.ndarray:
+    """Evaluate a ChromaDB-style where filter from per-value row masks.
+
+    Supports plain equality, $eq, $in and $and.
+
+    Args:
+        where: The filter to evaluate
+        value_mask: Returns the boolean row mask of rows where key equals value
+        size: Length of the masks
+
+    Returns:
+        np.ndarray: Boolean mask of matching rows
+    """
+    mask = np.ones(size, dtype=bool)
+    for key, condition in where.items():
+        if key == "$and":
+            for clause in condition:
+                mask &= where_mask(clause, value_mask, size)
+        elif key.startswith("$"):
+            raise UnsupportedFilterError(f"Unsupported operator: {key}")
+        elif isinstance(condition, dict):
+            if set(condition) == {"$eq"}:
+                mask &= value_mask(key, condition["$eq"])
+            elif set(condition) == {"$in"}:
+                values = np.zeros(size, dtype=bool)
+                for value in condition["$in"]:
+                    values |= value_mask(key, value)
+                mask &= values
+            else:
+                raise UnsupportedFilterError(f"Unsupported condition: {condition}")
+        else:
+            mask &= value_mask(key, condition)
+    return mask
+
+
+def matrix_dot(matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Dot products of each row with the query, upcasting float16 rows in blocks."""
+    if matrix.dtype == np.float32:
+        return matrix @ query
+    dots = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), SCORE_BLOCK_ROWS):
+        block = matrix[start : start + SCORE_BLOCK_ROWS]
+        dots[start : start + len(block)] = block.astype(np.float32) @ query
+    return dots
+
+
+def top_k(distances: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k smallest distances, sorted nearest first."""
+    if k < len(distances):
+        top = np.argpartition(distances, k - 1)[:k]
+    else:
+        top = np.arange(len(distances))
+    return top[np.argsort(distances[top], kind="stable")]
@@ -0,0 +1,224 @@
+from typing import List, Literal, Optional, Union
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+# Codes are upcast in blocks of this many rows to bound temporary memory
+DECODE_BLOCK_ROWS = 4096
+
+QuantizationMethod = Literal["int8", "pq"]
+
+
+class ScalarQuantizer:
+    """8-bit scalar quantizer with a per-dimension affine range.
+
+    Each component is mapped onto 256 levels between the minimum and maximum
+    seen during fitting, cutting storage to a quarter of float32. Values outside
+    the fitted range are clipped.
+    """
+
+    code_dtype = np.uint8
+
+    def __init__(self) -> None:
+        self.offset: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.scale is not None
+
+    def code_size(self, dimensions: int) -> int:
+        """Number of code bytes per vector."""
+        return dimensions
+
+    def fit(self, vectors: np.ndarray) -> "ScalarQuantizer":
+        """Learn the per-dimension range from training vectors."""
+        low = vectors.min(axis=0)
+        high = vectors.max(axis=0)
+        self.offset = low.astype(np.float32)
+        self.scale = np.maximum((high - low) / 255.0, 1e-12).astype(np.float32)
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        levels = np.rint((vectors - self.offset) / self.scale)
+        return np.clip(levels, 0, 255).astype(self.code_dtype)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) * self.scale + self.offset
+
+    def dot(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Dot products between a query and the decoded vectors of the codes."""
+        scaled_query = query * self.scale
+        bias = float(self.offset @ query)
+        dots = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), DECODE_BLOCK_ROWS):
+            block = codes[start : start + DECODE_BLOCK_ROWS]
+            dots[start : start + len(block)] = block.astype(np.float32) @ scaled_query
+        return dots + bias
+
+
+class ProductQuantizer:
+    """Product quantizer splitting vectors into subspaces with 256-entry codebooks.
+
+    Each vector is stored as one byte per subspace, so a 1536-dim embedding with
+    64 subspaces takes 64 bytes. Dot products are computed from a per-query lookup
+    table (asymmetric distance computation), which is only an approximation and is
+    meant to be followed by a full-precision re-ranking of the top candidates.
+    """
+
+    code_dtype = np.uint8
+
+    def __init__(
+        self,
+        subspaces: int = 64,
+        centroids: int = 256,
+        iterations: int = 20,
+        max_training_rows: int = 20000,
+        seed: int = 0,
+    ) -> None:
+        """Initialize an untrained product quantizer.
+
+        Args:
+            subspaces: Number of subspaces; must divide the embedding dimension
+            centroids: Codebook size per subspace, at most 256
+            iterations: Number of k-means iterations per codebook
+            max_training_rows: Maximum number of vectors used for training
+            seed: Random seed for sampling and codebook initialization
+        """
+        if not 1 <= centroids <= 256:
+            raise ValueError("Product quantization supports at most 256 centroids")
+        self.subspaces = subspaces
+        self.centroids = centroids
+        self.iterations = iterations
+        self.max_training_rows = max_training_rows
+        self.seed = seed
+        self.codebooks: Optional[np.ndarray] = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.codebooks is not None
+
+    def code_size(self, dimensions: int) -> int:
+        """Number of code bytes per vector."""
+        return self.subspaces
+
+    def fit(self, vectors: np.ndarray) -> "ProductQuantizer":
+        """Train one k-means codebook per subspace."""
+        dimensions = vectors.shape[1]
+        if dimensions % self.subspaces:
+            raise ValueError(
+                f"Embedding dimension {dimensions} is not divisible by "
+                f"{self.subspaces} subspaces"
+            )
+
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > self.max_training_rows:
+            vectors = vectors[
+                rng.choice(len(vectors), self.max_training_rows, replace=False)
+            ]
+
+        # Small collections are trained with as many centroids as they have rows
+        centroids = min(self.centroids, len(vectors))
+        sub_dimensions = dimensions // self.subspaces
+        self.codebooks = np.stack(
+            [
+                _kmeans(
+                    vectors[:, s * sub_dimensions : (s + 1) * sub_dimensions],
+                    centroids,
+                    self.iterations,
+                    rng,
+                )
+                for s in range(self.subspaces)
+            ]
+        )
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(vectors), self.subspaces), dtype=self.code_dtype)
+        for s, sub_vectors in enumerate(self._split(vectors)):
+            codes[:, s] = _nearest_centroids(sub_vectors, self.codebooks[s])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = [self.codebooks[s][codes[:, s]] for s in range(self.subspaces)]
+        return np.concatenate(parts, axis=1)
+
+    def dot(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Approximate dot products using a per-query lookup table."""
+        table = np.einsum(
+            "skd,sd->sk", self.codebooks, query.reshape(self.subspaces, -1)
+        )
+        dots = np.zeros(len(codes), dtype=np.float32)
+        for s in range(self.subspaces):
+            dots += table[s][codes[:, s]]
+        return dots
+
+    def _split(self, vectors: np.ndarray) -> List[np.ndarray]:
+        return np.split(vectors, self.subspaces, axis=1)
+
+
+Quantizer = Union[ScalarQuantizer, ProductQuantizer]
+
+
+def create_quantizer(method: QuantizationMethod, pq_subspaces: int = 64) -> Quantizer:
+    """Create an untrained quantizer for a quantization method.
+
+    Args:
+        method: "int8" for scalar quantization or "pq" for product quantization
+        pq_subspaces: Number of subspaces used by product quantization
+
+    Returns:
+        Quantizer: The untrained quantizer
+    """
+    if method == "int8":
+        return ScalarQuantizer()
+    if method == "pq":
+        return ProductQuantizer(subspaces=pq_subspaces)
+    raise ValueError(f"Unknown quantization method '{method}'. Use 'int8' or 'pq'.")
+
+
+class TruncatedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Matryoshka-style truncation of another embedding function's output.
+
+    Models trained with Matryoshka representation learning, such as
+    text-embedding-3-small, keep most of their quality when only the leading
+    dimensions are kept. Truncated vectors are renormalized to unit length.
+    """
+
+    def __init__(
+        self, embedding_function: EmbeddingFunction[Documents], dimensions: int
+    ) -> None:
+        self.embedding_function = embedding_function
+        self.dimensions = dimensions
+
+    def __call__(self, input: Documents) -> Embeddings:
+        vectors = np.asarray(self.embedding_function(input), dtype=np.float32)
+        return truncate_embeddings(vectors, self.dimensions)
+
+
+def truncate_embeddings(vectors: np.ndarray, dimensions: int) -> List[np.ndarray]:
+    """Keep the leading dimensions of each vector and renormalize to unit length."""
+    truncated = vectors[:, :dimensions]
+    norms = np.linalg.norm(truncated, axis=1, keepdims=True)
+    return list(truncated / np.maximum(norms, np.finfo(np.float32).tiny))
+
+
+def _kmeans(
+    vectors: np.ndarray, k: int, iterations: int, rng: np.random.Generator
+) -> np.ndarray:
+    """Lloyd's k-means returning the centroid matrix."""
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assignments = _nearest_centroids(vectors, centroids)
+        counts = np.bincount(assignments, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        # Empty clusters keep their previous centroid
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    distances = -2 * vectors @ centroids.T + (centroids**2).sum(axis=1)[None, :]
+    return np.argmin(distances, axis=1)
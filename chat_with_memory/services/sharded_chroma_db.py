@@ -0,0 +1,645 @@
+import argparse
+import hashlib
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, List, Literal, Optional, Sequence, Set, Tuple
+
+from chromadb.api.types import Documents, Embedding, EmbeddingFunction, Embeddings
+from rich.console import Console
+from rich.table import Table
+
+from chat_with_memory.services.chroma_db import (
+    ChromaDBService,
+    GetResult,
+    PrecomputedEmbeddingFunction,
+    QueryResult,
+    create_embedding_function,
+)
+from chat_with_memory.services.memory_graph import MemoryGraph, get_memory_graph
+
+ShardBy = Literal["id", "tenant"]
+
+# File inside each shard directory holding the ID rows are placed by
+SHARD_ID_FILE = ".shard_id"
+
+# Services are shared by every tool in the process that uses the same shards, so
+# each shard directory is only ever opened by one worker process. The options a
+# service was started with are kept to reject callers asking for other ones.
+_SERVICES: Dict[
+    Tuple[str, Tuple[str, ...]], Tuple["ShardedChromaDBService", Dict[str, Any]]
+] = {}
+_SERVICES_LOCK = threading.Lock()
+
+# The service opened by a shard worker process
+_SHARD: Optional[ChromaDBService] = None
+
+
+class ShardedChromaDBService:
+    """ChromaDBService front-end spreading one collection over several persist directories.
+
+    Rows are placed by rendezvous hashing of their ID, or of a tenant metadata
+    field, so adding a shard only moves the rows that hash to the new shard.
+    Each shard is served by its own worker process owning the shard's ChromaDB
+    client, so writes to different shards run in parallel on separate SQLite
+    files while writes to one shard stay serialized.
+
+    Documents and queries are embedded once in the parent process. Queries run on
+    every shard that can hold a match in parallel and the per-shard top-k lists
+    are merged by distance, so all shards must use the same distance metric.
+
+    The object offers the ChromaDBService methods used by the memory tools and
+    can be passed to them as db_service.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        persist_directories: Sequence[str],
+        shard_by: ShardBy = "id",
+        tenant_key: str = "tenant",
+        embedding_function: Optional[EmbeddingFunction[Documents]] = None,
+        embedding_dimensions: Optional[int] = None,
+        coalesce_embeddings: bool = False,
+        **shard_options: Any,
+    ) -> None:
+        """Start one worker process per shard.
+
+        Args:
+            collection_name: Name of the collection in every shard
+            persist_directories: Shard directories. Each shard is identified by the
+                ID in its .shard_id file, so directories can be moved or given by
+                another path without changing where rows belong.
+            shard_by: "id" spreads memories evenly by ID. "tenant" keeps each
+                tenant's memories on one shard, so queries filtering on the tenant
+                only touch that shard.
+            tenant_key: Metadata field holding the tenant when shard_by="tenant"
+            embedding_function: Optional embedding function replacing the OpenAI one
+            embedding_dimensions: Optional Matryoshka truncation of embeddings
+            coalesce_embeddings: If True, concurrent embedding calls are batched
+            **shard_options: Options passed to each shard's ChromaDBService, such as
+                index_profile, distance, backend or quantization
+        """
+        if not persist_directories:
+            raise ValueError("At least one persist directory is required")
+        self.collection_name = collection_name
+        self.shard_by = shard_by
+        self.tenant_key = tenant_key
+        self.shard_options = shard_options
+        self.embedding_function = create_embedding_function(
+            embedding_function, embedding_dimensions, coalesce_embeddings
+        )
+
+        self.shards: List[str] = []
+        self._shard_ids: Dict[str, str] = {}
+        self._workers: Dict[str, ProcessPoolExecutor] = {}
+        self._rebalancing = False
+        self._rebalance_lock = threading.Lock()
+        # IDs deleted while a rebalance runs, which a row copy must not revive
+        self._tombstones: Set[str] = set()
+        self._tombstones_lock = threading.Lock()
+        for persist_directory in persist_directories:
+            self.shards.append(self._register_shard(persist_directory))
+        started = [self._start_shard(shard) for shard in self.shards]
+        # Fail here rather than on the first request if a shard cannot be opened
+        for future in started:
+            future.result()
+
+        # Files of the front-end live next to the first shard's collection
+        self._data_directory = self.shards[0]
+        self.memory_graph: MemoryGraph = get_memory_graph(
+            self.data_path(".graph.jsonl")
+        )
+
+    @property
+    def read_only(self) -> bool:
+        return False
+
+    def shard_for(self, key: str, shards: Optional[Sequence[str]] = None) -> str:
+        """Shard owning a routing key: the one with the highest rendezvous score."""
+        return max(
+            shards or self.shards,
+            key=lambda shard: _score(self._shard_ids[shard], key),
+        )
+
+    def add_documents(
+        self,
+        documents: List[str],
+        metadatas: Optional[List[Dict[str, str]]] = None,
+        ids: Optional[List[str]] = None,
+        embeddings: Optional[Embeddings] = None,
+    ) -> List[str]:
+        """Embed documents once and add them to their shards in parallel.
+
+        Args:
+            documents: List of text documents to add
+            metadatas: Optional list of metadata dicts for each document; required
+                with shard_by="tenant"
+            ids: Optional list of IDs for each document. If not provided, UUIDs will be generated.
+            embeddings: Optional precomputed embeddings of the documents
+
+        Returns:
+            List[str]: The IDs of the added documents
+        """
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in documents]
+        if self._rebalancing:
+            with self._tombstones_lock:
+                self._tombstones.difference_update(ids)
+        if embeddings is None:
+            embeddings = self.embedding_function(documents)
+
+        batches: Dict[str, List[int]] = {}
+        for position, id_ in enumerate(ids):
+            key = self._routing_key(id_, metadatas[position] if metadatas else None)
+            if key is None:
+                raise ValueError(
+                    f"Memory '{id_}' has no '{self.tenant_key}' metadata to shard by"
+                )
+            batches.setdefault(self.shard_for(key), []).append(position)
+
+        futures = [
+            self._submit(
+                shard,
+                "add_documents",
+                [documents[p] for p in positions],
+                [metadatas[p] for p in positions] if metadatas else None,
+                [ids[p] for p in positions],
+                [embeddings[p] for p in positions],
+            )
+            for shard, positions in batches.items()
+        ]
+        for future in futures:
+            future.result()
+        return ids
+
+    def query(
+        self,
+        query_text: str,
+        n_results: int = 5,
+        where: Optional[Dict[str, str]] = None,
+    ) -> QueryResult:
+        """Query the shards for similar documents.
+
+        Args:
+            query_text: Text to find similar documents for
+            n_results: Number of results to return
+            where: Optional filter criteria
+
+        Returns:
+            QueryResult containing documents, metadata, distances and IDs
+        """
+        query_embedding = self.embedding_function([query_text])[0]
+        return self.query_embedding(query_embedding, n_results=n_results, where=where)
+
+    def query_embedding(
+        self,
+        embedding: Embedding,
+        n_results: int = 5,
+        where: Optional[Dict[str, str]] = None,
+    ) -> QueryResult:
+        """Query the relevant shards in parallel and merge their nearest documents.
+
+        Args:
+            embedding: Embedding to find similar documents for
+            n_results: Number of results to return
+            where: Optional filter criteria; a tenant equality filter restricts the
+                query to that tenant's shard
+
+        Returns:
+            QueryResult containing documents, metadata, distances and IDs
+        """
+        futures = [
+            self._submit(shard, "query_embedding", embedding, n_results, where)
+            for shard in self._shards_for_filter(where)
+        ]
+        rows = []
+        for future in futures:
+            result = future.result()
+            rows.extend(
+                zip(
+                    result["distances"],
+                    result["documents"],
+                    result["metadatas"],
+                    result["ids"],
+                )
+            )
+
+        # A row being moved by a rebalance can briefly exist on two shards
+        merged: Dict[str, tuple] = {}
+        for row in sorted(rows, key=lambda row: row[0]):
+            merged.setdefault(row[3], row)
+        top = list(merged.values())[:n_results]
+        return {
+            "documents": [row[1] for row in top],
+            "metadatas": [row[2] for row in top],
+            "distances": [row[0] for row in top],
+            "ids": [row[3] for row in top],
+        }
+
+    def get_documents(self, ids: List[str]) -> GetResult:
+        """Fetch documents by ID from the shards holding them.
+
+        Args:
+            ids: IDs of the documents to fetch
+
+        Returns:
+            GetResult with the documents found, in the order of ids
+        """
+        futures = [
+            self._submit(shard, "get_documents", shard_ids)
+            for shard, shard_ids in self._group_ids(ids).items()
+        ]
+        found: Dict[str, tuple] = {}
+        for future in futures:
+            result = future.result()
+            for document, metadata, id_ in zip(
+                result["documents"], result["metadatas"], result["ids"]
+            ):
+                found[id_] = (document, metadata)
+
+        found_ids = [id_ for id_ in ids if id_ in found]
+        return {
+            "documents": [found[id_][0] for id_ in found_ids],
+            "metadatas": [found[id_][1] for id_ in found_ids],
+            "ids": found_ids,
+        }
+
+    def cluster_summaries(
+        self,
+        embedding: Embedding,
+        n_clusters: int = 3,
+        where: Optional[Dict[str, str]] = None,
+    ) -> List[str]:
+        """Summaries of the nearest memory clusters, taken from each shard in turn."""
+        futures = [
+            self._submit(shard, "cluster_summaries", embedding, n_clusters, where)
+            for shard in self._shards_for_filter(where)
+        ]
+        per_shard = [future.result() for future in futures]
+        interleaved = [
+            summaries[rank]
+            for rank in range(n_clusters)
+            for summaries in per_shard
+            if rank < len(summaries)
+        ]
+        return interleaved[:n_clusters]
+
+    def delete_by_ids(self, ids: List[str]) -> None:
+        """Delete documents from the shards holding them.
+
+        Args:
+            ids: List of IDs to delete
+        """
+        if self._rebalancing:
+            # Recorded before the delete is sent, so a row copied to its new
+            # shard concurrently is deleted there by the move itself
+            with self._tombstones_lock:
+                self._tombstones.update(ids)
+        futures = [
+            self._submit(shard, "delete_by_ids", shard_ids)
+            for shard, shard_ids in self._group_ids(ids).items()
+        ]
+        for future in futures:
+            future.result()
+        self.memory_graph.remove(ids)
+
+    def get_count(self) -> int:
+        """Get the number of documents across all shards."""
+        return sum(self.shard_counts().values())
+
+    def shard_counts(self) -> Dict[str, int]:
+        """Get the number of documents in each shard."""
+        futures = {shard: self._submit(shard, "get_count") for shard in self.shards}
+        return {shard: future.result() for shard, future in futures.items()}
+
+    def delete_collection(self) -> None:
+        """Delete the collection from every shard."""
+        for future in [
+            self._submit(shard, "delete_collection") for shard in self.shards
+        ]:
+            future.result()
+        self.memory_graph.clear()
+
+    def add_shard(self, persist_directory: str, batch_size: int = 500) -> int:
+        """Add a shard and move the rows it now owns, while serving requests.
+
+        New writes go to the new placement right away. Until the move finishes,
+        reads by ID or tenant are sent to every shard, so rows are found whether
+        or not they were moved yet.
+
+        Args:
+            persist_directory: Directory of the new shard
+            batch_size: Number of rows moved per batch
+
+        Returns:
+            int: Number of rows moved to the new shard
+        """
+        with self._rebalance_lock:
+            shard = self._register_shard(persist_directory)
+            try:
+                self._start_shard(shard).result()
+            except Exception:
+                del self._shard_ids[shard]
+                raise
+            self._rebalancing = True
+            try:
+                self.shards = self.shards + [shard]
+                return self._move_misplaced_rows(batch_size)
+            finally:
+                self._finish_rebalance()
+
+    def rebalance(self, batch_size: int = 500) -> int:
+        """Move every row that is not on the shard owning it.
+
+        Use it after changing the shard list between runs, or to finish an
+        add_shard that was interrupted.
+
+        Args:
+            batch_size: Number of rows moved per batch
+
+        Returns:
+            int: Number of rows moved
+        """
+        with self._rebalance_lock:
+            self._rebalancing = True
+            try:
+                return self._move_misplaced_rows(batch_size)
+            finally:
+                self._finish_rebalance()
+
+    def data_path(self, suffix: str, collection_name: Optional[str] = None) -> str:
+        """Path of a front-end file, such as the write-ahead log or memory graph.
+
+        Args:
+            suffix: File name suffix, such as ".wal"
+            collection_name: Collection the file belongs to; defaults to the current one
+        """
+        return os.path.join(
+            self._data_directory,
+            f"{collection_name or self.collection_name}.sharded{suffix}",
+        )
+
+    def close(self) -> None:
+        """Stop the shard worker processes."""
+        for worker in self._workers.values():
+            worker.shutdown(wait=True)
+        self._workers.clear()
+
+    def _register_shard(self, persist_directory: str) -> str:
+        """Resolve a shard directory and read its ID, rejecting duplicate shards.
+
+        Returns:
+            str: The shard's resolved path, used to address its worker
+        """
+        shard = os.path.realpath(persist_directory)
+        shard_id = read_shard_id(persist_directory)
+        if shard in self._shard_ids or shard_id in self._shard_ids.values():
+            raise ValueError(f"'{persist_directory}' is already a shard")
+        self._shard_ids[shard] = shard_id
+        return shard
+
+    def _start_shard(self, persist_directory: str) -> Future:
+        """Start the worker process of a shard; the future completes once it is open."""
+        worker = ProcessPoolExecutor(
+            max_workers=1,
+            # Worker processes must not inherit the parent's threads and locks
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_open_shard,
+            initargs=(self.collection_name, persist_directory, self.shard_options),
+        )
+        self._workers[persist_directory] = worker
+        return worker.submit(_call_shard, "get_count")
+
+    def _finish_rebalance(self) -> None:
+        self._rebalancing = False
+        with self._tombstones_lock:
+            self._tombstones.clear()
+
+    def _submit(self, shard: str, method: str, *args: Any) -> Future:
+        return self._workers[shard].submit(_call_shard, method, *args)
+
+    def _routing_key(
+        self, id_: str, metadata: Optional[Dict[str, Any]]
+    ) -> Optional[str]:
+        if self.shard_by == "id":
+            return id_
+        value = (metadata or {}).get(self.tenant_key)
+        return None if value is None else str(value)
+
+    def _shards_for_filter(self, where: Optional[Dict[str, Any]]) -> List[str]:
+        """Shards that can hold rows matching a filter."""
+        tenant = _tenant_filter(where, self.tenant_key)
+        if self.shard_by == "tenant" and tenant is not None:
+            return self._owners(tenant)
+        return self.shards
+
+    def _owners(self, key: str) -> List[str]:
+        """Shards that may hold rows with a routing key."""
+        return list(self.shards) if self._rebalancing else [self.shard_for(key)]
+
+    def _group_ids(self, ids: List[str]) -> Dict[str, List[str]]:
+        """Group IDs by the shards that may hold them."""
+        if self.shard_by == "tenant":
+            return {shard: list(ids) for shard in self.shards}
+        groups: Dict[str, List[str]] = {}
+        for id_ in ids:
+            for shard in self._owners(id_):
+                groups.setdefault(shard, []).append(id_)
+        return groups
+
+    def _move_misplaced_rows(self, batch_size: int) -> int:
+        """Copy rows to their owning shard, then delete them from their old one.
+
+        A row is only deleted after its copy was written, and adding a row that
+        already exists is a no-op, so an interrupted move can simply be re-run.
+        Rows deleted while their batch was being copied are deleted from the
+        target again after the copy, so the move does not bring them back.
+        """
+        tenant_key = self.tenant_key if self.shard_by == "tenant" else None
+        moved = 0
+        for source in list(self.shards):
+            targets: Dict[str, List[str]] = {}
+            for id_, key in self._submit(source, "routing_keys", tenant_key).result():
+                if key is None:
+                    continue
+                target = self.shard_for(key)
+                if target != source:
+                    targets.setdefault(target, []).append(id_)
+
+            for target, ids in targets.items():
+                for start in range(0, len(ids), batch_size):
+                    batch = self._submit(
+                        source, "export_rows", ids[start : start + batch_size]
+                    ).result()
+                    self._submit(
+                        target,
+                        "add_documents",
+                        batch["documents"],
+                        batch["metadatas"],
+                        batch["ids"],
+                        batch["embeddings"],
+                    ).result()
+                    with self._tombstones_lock:
+                        deleted = [
+                            id_ for id_ in batch["ids"] if id_ in self._tombstones
+                        ]
+                    if deleted:
+                        self._submit(target, "delete_by_ids", deleted).result()
+                    self._submit(source, "delete_by_ids", batch["ids"]).result()
+                    moved += len(batch["ids"])
+        return moved
+
+
+def get_sharded_service(
+    collection_name: str, persist_directories: Sequence[str], **options: Any
+) -> ShardedChromaDBService:
+    """Return the process-wide sharded service for a collection, starting it on first use.
+
+    Raises:
+        ValueError: If the service is already running with different options
+    """
+    key = (
+        collection_name,
+        tuple(os.path.realpath(directory) for directory in persist_directories),
+    )
+    with _SERVICES_LOCK:
+        if key not in _SERVICES:
+            service = ShardedChromaDBService(
+                collection_name, persist_directories, **options
+            )
+            _SERVICES[key] = (service, options)
+        service, started_options = _SERVICES[key]
+        differing = sorted(
+            name
+            for name in set(options) | set(started_options)
+            if options.get(name) != started_options.get(name)
+        )
+        if differing:
+            raise ValueError(
+                f"Sharded collection '{collection_name}' is already open with "
+                f"different {', '.join(differing)}; configure every tool using "
+                "these shards the same way"
+            )
+        return service
+
+
+def read_shard_id(persist_directory: str) -> str:
+    """Read the ID of a shard directory, assigning one on first use.
+
+    A directory without an ID file gets a random ID, whether or not it already
+    holds data. Rows placed before shards had IDs may then be on the wrong shard;
+    run rebalance() once to move them.
+
+    Args:
+        persist_directory: Directory of the shard
+
+    Returns:
+        str: The shard ID
+    """
+    path = os.path.join(persist_directory, SHARD_ID_FILE)
+    if not os.path.exists(path):
+        os.makedirs(persist_directory, exist_ok=True)
+        temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary_path, "w") as shard_id_file:
+            shard_id_file.write(uuid.uuid4().hex)
+        try:
+            # Linking fails if the file exists, so concurrent first opens agree
+            # on one ID and never see a partly written file
+            os.link(temporary_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temporary_path)
+    with open(path) as shard_id_file:
+        return shard_id_file.read().strip()
+
+
+def _score(shard_id: str, key: str) -> int:
+    digest = hashlib.blake2b(f"{shard_id}\0{key}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def _tenant_filter(where: Optional[Dict[str, Any]], tenant_key: str) -> Optional[str]:
+    """Tenant a where filter requires by equality, if any."""
+    if not where:
+        return None
+    condition = where.get(tenant_key)
+    if isinstance(condition, dict) and set(condition) == {"$eq"}:
+        condition = condition["$eq"]
+    if condition is not None and not isinstance(condition, dict):
+        return str(condition)
+    for clause in where.get("$and", []):
+        tenant = _tenant_filter(clause, tenant_key)
+        if tenant is not None:
+            return tenant
+    return None
+
+
+def _open_shard(
+    collection_name: str, persist_directory: str, options: Dict[str, Any]
+) -> None:
+    """Open the shard served by this worker process."""
+    global _SHARD
+    _SHARD = ChromaDBService(
+        collection_name=collection_name,
+        persist_directory=persist_directory,
+        embedding_function=PrecomputedEmbeddingFunction(),
+        **options,
+    )
+
+
+def _call_shard(method: str, *args: Any) -> Any:
+    """Run a request in a shard worker process."""
+    if method == "routing_keys":
+        (tenant_key,) = args
+        rows = _SHARD._collection_call("get", include=["metadatas"])
+        return [
+            (id_, id_ if tenant_key is None else (metadata or {}).get(tenant_key))
+            for id_, metadata in zip(rows["ids"], rows["metadatas"])
+        ]
+    if method == "export_rows":
+        (ids,) = args
+        return _SHARD._collection_call(
+            "get", ids=ids, include=["documents", "metadatas", "embeddings"]
+        )
+    return getattr(_SHARD, method)(*args)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Move memories to the shards that own them after changing shards"
+    )
+    parser.add_argument("--collection", default="chat_memories")
+    parser.add_argument(
+        "--shards", nargs="+", required=True, help="Persist directory of each shard"
+    )
+    parser.add_argument("--shard-by", choices=["id", "tenant"], default="id")
+    parser.add_argument("--tenant-key", default="tenant")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    service = ShardedChromaDBService(
+        args.collection,
+        args.shards,
+        shard_by=args.shard_by,
+        tenant_key=args.tenant_key,
+        embedding_function=PrecomputedEmbeddingFunction(),
+    )
+    try:
+        moved = service.rebalance(batch_size=args.batch_size)
+
+        table = Table(title=f"Shards of '{args.collection}' ({moved} memories moved)")
+        table.add_column("Shard", style="cyan")
+        table.add_column("Memories", justify="right", style="green")
+        for shard, count in service.shard_counts().items():
+            table.add_row(shard, str(count))
+        Console().print(table)
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
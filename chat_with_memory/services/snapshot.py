@@ -0,0 +1,453 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from chat_with_memory.services.numpy_index import (
+    UnsupportedFilterError,
+    matrix_dot,
+    top_k,
+    where_mask,
+)
+
+SNAPSHOT_FORMAT_VERSION = 2
+
+# Version 1 snapshots left high-cardinality metadata keys out entirely
+READABLE_FORMAT_VERSIONS = (1, 2)
+
+# Metadata keys with more distinct values than this (e.g. timestamps or tenants)
+# are stored as a column of value hashes instead of category codes, which keeps
+# the manifest small
+MAX_CATEGORIES = 1024
+
+BLOB_NAMES = ("ids", "documents", "metadatas")
+
+
+class _BlobWriter:
+    """Streams UTF-8 strings into a byte blob plus an int64 offsets array."""
+
+    def __init__(self, directory: str, name: str) -> None:
+        self.directory = directory
+        self.name = name
+        self.file = open(os.path.join(directory, f"{name}.bin"), "wb")
+        self.offsets = [0]
+
+    def write(self, value: str) -> None:
+        encoded = value.encode("utf-8")
+        self.file.write(encoded)
+        self.offsets.append(self.offsets[-1] + len(encoded))
+
+    def close(self) -> None:
+        self.file.close()
+        np.save(
+            os.path.join(self.directory, f"{self.name}.offsets.npy"),
+            np.asarray(self.offsets, dtype=np.int64),
+        )
+
+
+class _BlobReader:
+    """Memory-mapped access to strings written by _BlobWriter."""
+
+    def __init__(self, directory: str, name: str) -> None:
+        self.offsets = np.load(
+            os.path.join(directory, f"{name}.offsets.npy"), mmap_mode="r"
+        )
+        blob_path = os.path.join(directory, f"{name}.bin")
+        # np.memmap cannot map empty files
+        if os.path.getsize(blob_path):
+            self.blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            self.blob = np.zeros(0, dtype=np.uint8)
+
+    def __getitem__(self, position: int) -> str:
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return self.blob[start:end].tobytes().decode("utf-8")
+
+
+def export_snapshot(
+    collection: Any,
+    path: str,
+    dtype: str = "float32",
+    batch_size: int = 1000,
+    overwrite: bool = False,
+) -> Dict[str, Any]:
+    """Export a ChromaDB collection into a memory-mappable snapshot directory.
+
+    The snapshot holds the embedding matrix as a .npy file, ids, documents and
+    JSON-encoded metadata as byte blobs with offset arrays, and a filter column
+    per metadata key: category codes for low-cardinality keys and value hashes
+    for the rest. Each export is written to its own version directory next to
+    path, and path is a symlink switched to the new version with os.replace, so
+    readers see either the old or the new snapshot and never a partial one.
+    The previous version is kept until the next export, so processes that
+    already opened it keep reading it until they reopen.
+
+    Args:
+        collection: ChromaDB collection to export
+        path: Directory to write the snapshot to
+        dtype: Storage dtype of the embedding matrix (float32 or float16)
+        batch_size: Number of documents read from ChromaDB per batch
+        overwrite: If True, replaces an existing snapshot at path
+
+    Returns:
+        Dict[str, Any]: The snapshot manifest
+    """
+    path = os.path.abspath(path)
+    if os.path.lexists(path) and not overwrite:
+        raise FileExistsError(f"Snapshot directory '{path}' already exists")
+
+    count = collection.count()
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+    parent, name = os.path.split(path)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=_version_prefix(name), dir=parent)
+
+    try:
+        dimensions = 0
+        embeddings = None
+        squared_norms = np.zeros(count, dtype=np.float32)
+        blobs = {name: _BlobWriter(staging, name) for name in BLOB_NAMES}
+        metadata_values: Dict[str, Dict[Any, int]] = {}
+        metadata_codes: Dict[str, np.ndarray] = {}
+
+        row = 0
+        for offset in range(0, count, batch_size):
+            batch = collection.get(
+                limit=batch_size,
+                offset=offset,
+                include=["embeddings", "documents", "metadatas"],
+            )
+            if not batch["ids"]:
+                break
+
+            vectors = np.asarray(batch["embeddings"], dtype=np.float32)
+            if space == "cosine":
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                vectors = vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+            if embeddings is None:
+                dimensions = vectors.shape[1]
+                embeddings = np.lib.format.open_memmap(
+                    os.path.join(staging, "embeddings.npy"),
+                    mode="w+",
+                    dtype=np.dtype(dtype),
+                    shape=(count, dimensions),
+                )
+
+            end = row + len(vectors)
+            if end > count:
+                raise RuntimeError("Collection grew during export")
+            embeddings[row:end] = vectors
+            # Norms of what is stored, so float16 snapshots score consistently
+            squared_norms[row:end] = (embeddings[row:end].astype(np.float32) ** 2).sum(
+                axis=1
+            )
+
+            for position, (id_, document, metadata) in enumerate(
+                zip(batch["ids"], batch["documents"], batch["metadatas"]), start=row
+            ):
+                metadata = metadata or {}
+                blobs["ids"].write(id_)
+                blobs["documents"].write(document or "")
+                blobs["metadatas"].write(json.dumps(metadata))
+                for key, value in metadata.items():
+                    values = metadata_values.setdefault(key, {})
+                    codes = metadata_codes.setdefault(
+                        key, np.full(count, -1, dtype=np.int32)
+                    )
+                    codes[position] = values.setdefault(value, len(values))
+            row = end
+
+        if row != count:
+            raise RuntimeError(
+                f"Collection changed during export: read {row} of {count} documents"
+            )
+
+        if embeddings is not None:
+            embeddings.flush()
+            del embeddings
+        np.save(os.path.join(staging, "squared_norms.npy"), squared_norms)
+        for blob in blobs.values():
+            blob.close()
+
+        metadata_columns = []
+        for key, values in metadata_values.items():
+            file_name = f"metadata.{len(metadata_columns)}.npy"
+            codes = metadata_codes[key]
+            if len(values) <= MAX_CATEGORIES:
+                np.save(os.path.join(staging, file_name), codes)
+                metadata_columns.append(
+                    {
+                        "key": key,
+                        "kind": "categorical",
+                        "values": list(values),
+                        "file": file_name,
+                    }
+                )
+                continue
+
+            hashes = np.asarray([_value_hash(value) for value in values], np.int64)
+            np.save(
+                os.path.join(staging, file_name),
+                np.where(codes >= 0, hashes[codes], 0),
+            )
+            metadata_columns.append({"key": key, "kind": "hashed", "file": file_name})
+
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "collection": collection.name,
+            "space": space,
+            "count": count,
+            "dimensions": dimensions,
+            "dtype": np.dtype(dtype).name,
+            "metadata_columns": metadata_columns,
+        }
+        with open(os.path.join(staging, "manifest.json"), "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+
+        previous = _publish_version(staging, path)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    _remove_old_versions(path, keep={os.path.realpath(staging), previous})
+    return manifest
+
+
+class SnapshotIndex:
+    """Read-only index served directly from a memory-mapped snapshot.
+
+    Nothing is copied into private memory: the embedding matrix, offsets and
+    metadata code columns are mapped from disk, so every process opening the
+    same snapshot shares one page-cache copy, and opening is instant regardless
+    of size. Strings are only decoded for the rows a query returns.
+
+    The snapshot path is resolved once and every file is opened from that
+    version directory, so an export switching the path mid-open cannot mix
+    files of two versions.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open a snapshot written by export_snapshot.
+
+        Args:
+            path: Snapshot directory
+        """
+        directory = os.path.realpath(path)
+        with open(os.path.join(directory, "manifest.json")) as manifest_file:
+            self.manifest = json.load(manifest_file)
+        if self.manifest["format_version"] not in READABLE_FORMAT_VERSIONS:
+            raise ValueError(
+                f"Unsupported snapshot format version {self.manifest['format_version']}"
+            )
+
+        self.path = path
+        self.directory = directory
+        self.space = self.manifest["space"]
+        self._size = self.manifest["count"]
+
+        embeddings_path = os.path.join(directory, "embeddings.npy")
+        if os.path.exists(embeddings_path):
+            self._matrix = np.load(embeddings_path, mmap_mode="r")
+        else:
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._squared_norms = np.load(
+            os.path.join(directory, "squared_norms.npy"), mmap_mode="r"
+        )
+        self._blobs = {name: _BlobReader(directory, name) for name in BLOB_NAMES}
+        # Hashed columns have no value-to-code mapping
+        self._columns: Dict[str, Tuple[Optional[Dict[Any, int]], np.ndarray]] = {}
+        for column in self.manifest["metadata_columns"]:
+            value_codes = None
+            if column.get("kind", "categorical") == "categorical":
+                value_codes = {
+                    value: code for code, value in enumerate(column["values"])
+                }
+            self._columns[column["key"]] = (
+                value_codes,
+                np.load(os.path.join(directory, column["file"]), mmap_mode="r"),
+            )
+        self._positions: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def query(
+        self,
+        embedding: List[float],
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, List[Any]]:
+        """Find the nearest rows to an embedding.
+
+        Args:
+            embedding: Query embedding
+            n_results: Number of results to return
+            where: Optional ChromaDB-style filter using equality, $eq, $in or $and
+                on metadata keys stored as columns
+
+        Returns:
+            Dict with documents, metadatas, distances and ids lists, nearest first
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        if self.space == "cosine":
+            query = query / max(float(np.linalg.norm(query)), np.finfo(np.float32).tiny)
+
+        rows = None
+        if where:
+            rows = np.flatnonzero(where_mask(where, self._value_mask, self._size))
+
+        candidates = self._size if rows is None else len(rows)
+        if candidates == 0 or n_results <= 0:
+            return {"documents": [], "metadatas": [], "distances": [], "ids": []}
+
+        matrix = self._matrix if rows is None else self._matrix[rows]
+        dots = matrix_dot(matrix, query)
+        if self.space == "l2":
+            squared_norms = (
+                self._squared_norms if rows is None else self._squared_norms[rows]
+            )
+            distances = np.maximum(squared_norms - 2 * dots + float(query @ query), 0.0)
+        else:
+            distances = 1.0 - dots
+
+        top = top_k(distances, min(n_results, candidates))
+        positions = top if rows is None else rows[top]
+        return {
+            "documents": [self._blobs["documents"][p] for p in positions],
+            "metadatas": [json.loads(self._blobs["metadatas"][p]) for p in positions],
+            "distances": distances[top].tolist(),
+            "ids": [self._blobs["ids"][p] for p in positions],
+        }
+
+    def get(self, ids: List[str]) -> Dict[str, List[Any]]:
+        """Look up rows by ID, skipping IDs that are not in the snapshot.
+
+        The ID-to-row mapping is built on first use, decoding every ID once.
+
+        Returns:
+            Dict with documents, metadatas and ids lists in the order of ids
+        """
+        if self._positions is None:
+            self._positions = {self._blobs["ids"][p]: p for p in range(self._size)}
+        positions = [self._positions[id_] for id_ in ids if id_ in self._positions]
+        return {
+            "documents": [self._blobs["documents"][p] for p in positions],
+            "metadatas": [json.loads(self._blobs["metadatas"][p]) for p in positions],
+            "ids": [self._blobs["ids"][p] for p in positions],
+        }
+
+    def supports_filter(self, where: Optional[Dict[str, Any]]) -> bool:
+        """Check whether a where filter can be answered from the stored columns."""
+        try:
+            where_mask(where or {}, self._value_mask, self._size)
+        except UnsupportedFilterError:
+            return False
+        return True
+
+    def _value_mask(self, key: str, value: Any) -> np.ndarray:
+        if key not in self._columns:
+            if self.manifest["format_version"] == 1:
+                raise UnsupportedFilterError(
+                    f"Metadata key '{key}' is not filterable in this snapshot"
+                )
+            # Every key is stored, so no row has this one
+            return np.zeros(self._size, dtype=bool)
+
+        value_codes, codes = self._columns[key]
+        if value_codes is None:
+            mask = np.array(codes == _value_hash(value))
+            # Rule out hash collisions against the stored metadata
+            for position in np.flatnonzero(mask):
+                metadata = json.loads(self._blobs["metadatas"][position])
+                if metadata.get(key) != value:
+                    mask[position] = False
+            return mask
+        if value not in value_codes:
+            return np.zeros(self._size, dtype=bool)
+        return np.asarray(codes == value_codes[value])
+
+
+def _value_hash(value: Any) -> int:
+    """Stable 64-bit hash of a metadata value, the same in every process."""
+    digest = hashlib.blake2b(json.dumps(value).encode("utf-8"), digest_size=8)
+    return int.from_bytes(digest.digest(), "little", signed=True)
+
+
+def _version_prefix(name: str) -> str:
+    return f".{name}.snapshot-"
+
+
+def _publish_version(version: str, path: str) -> Optional[str]:
+    """Atomically point the snapshot path at a version directory.
+
+    Returns:
+        Optional[str]: The version directory path pointed to before, if any
+    """
+    parent, name = os.path.split(path)
+    previous = None
+    if os.path.islink(path):
+        previous = os.path.realpath(path)
+    elif os.path.isdir(path):
+        # A snapshot exported before versioning is moved aside once, which is
+        # the only time the path briefly does not exist
+        previous = tempfile.mkdtemp(prefix=_version_prefix(name), dir=parent)
+        os.rename(path, previous)
+
+    # A relative target keeps the snapshot valid if its parent is moved
+    link = os.path.join(parent, f".{name}.link-{uuid.uuid4().hex}")
+    os.symlink(os.path.basename(version), link)
+    os.replace(link, path)
+    return previous
+
+
+def _remove_old_versions(path: str, keep: Set[Optional[str]]) -> None:
+    """Delete complete version directories of a snapshot other than keep."""
+    parent, name = os.path.split(path)
+    prefix = _version_prefix(name)
+    for entry in os.listdir(parent):
+        candidate = os.path.join(parent, entry)
+        if (
+            entry.startswith(prefix)
+            and not os.path.islink(candidate)
+            and os.path.realpath(candidate) not in keep
+            # Exports still being written have no manifest yet
+            and os.path.exists(os.path.join(candidate, "manifest.json"))
+        ):
+            shutil.rmtree(candidate, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    from chat_with_memory.services.chroma_db import (
+        ChromaDBService,
+        PrecomputedEmbeddingFunction,
+    )
+
+    parser = argparse.ArgumentParser(
+        description="Export a memory collection to a memory-mapped snapshot"
+    )
+    parser.add_argument("output", help="Snapshot directory to write")
+    parser.add_argument("--collection", default="chat_memories")
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    chroma_db_service = ChromaDBService(
+        collection_name=args.collection,
+        persist_directory=args.persist_directory,
+        backend="chroma",
+        embedding_function=PrecomputedEmbeddingFunction(),
+    )
+    manifest = chroma_db_service.export_snapshot(
+        args.output, dtype=args.dtype, overwrite=args.overwrite
+    )
+    print(
+        f"Exported {manifest['count']} memories from '{manifest['collection']}' "
+        f"to {args.output}"
+    )
@@ -0,0 +1,343 @@
+import fcntl
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import openai
+
+from chat_with_memory.services.embedding_dispatcher import RETRYABLE_STATUSES
+
+# Truncate the log once everything in it is flushed and it has grown this large
+MAX_LOG_BYTES = 1024 * 1024
+
+Entry = Tuple[int, Dict[str, Any]]
+
+# Errors that applying the same payload again would raise again, such as a
+# missing key or a failed validation (pydantic's ValidationError is a ValueError)
+PERMANENT_ERRORS = (KeyError, TypeError, ValueError)
+
+
+class WriteAheadLog:
+    """Append-only JSON lines log of writes that have not reached the store yet.
+
+    Appends are fsynced before they return, so an entry survives a crash as soon
+    as append() does. A checkpoint file records the sequence number of the last
+    entry applied to the store; entries after it are pending and are returned by
+    pending() again after a restart. Once every entry is applied and the log has
+    grown past max_log_bytes, it is truncated. Entries that can never be applied
+    are quarantined in a dead-letter file next to the log.
+
+    Only one writer may hold a log at a time: opening it takes an exclusive
+    lock on a lock file next to it, and a second open, from this process or any
+    other, fails immediately.
+    """
+
+    def __init__(
+        self, path: str, fsync: bool = True, max_log_bytes: int = MAX_LOG_BYTES
+    ) -> None:
+        """Open a log, recovering the entries that were not applied yet.
+
+        Args:
+            path: Path of the log file; the checkpoint is stored next to it
+            fsync: If True, appends are fsynced before returning
+            max_log_bytes: Size above which a fully applied log is truncated
+
+        Raises:
+            RuntimeError: If another writer already holds the log
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock_path = f"{path}.lock"
+        self._lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise RuntimeError(
+                f"Write-ahead log '{path}' is already open by another writer"
+            ) from None
+
+        self.path = path
+        self.checkpoint_path = f"{path}.checkpoint"
+        self.dead_letter_path = f"{path}.dead"
+        self.fsync = fsync
+        self.max_log_bytes = max_log_bytes
+        self._lock = threading.Lock()
+
+        self._checkpoint = 0
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as checkpoint_file:
+                self._checkpoint = int(checkpoint_file.read().strip() or 0)
+
+        self._pending: List[Entry] = []
+        self._last_seq = self._checkpoint
+        if os.path.exists(path):
+            self._recover()
+
+        self._log = open(path, "a", encoding="utf-8")
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def append(self, payloads: List[Dict[str, Any]]) -> List[int]:
+        """Durably record payloads and return their sequence numbers."""
+        with self._lock:
+            entries = []
+            for payload in payloads:
+                self._last_seq += 1
+                entries.append((self._last_seq, payload))
+            self._log.write(
+                "".join(
+                    json.dumps({"seq": seq, "payload": payload}) + "\n"
+                    for seq, payload in entries
+                )
+            )
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+            self._pending.extend(entries)
+            return [seq for seq, _ in entries]
+
+    def pending(self, limit: Optional[int] = None) -> List[Entry]:
+        """Return the oldest entries not applied to the store yet."""
+        with self._lock:
+            return list(self._pending[:limit])
+
+    def mark_applied(self, seq: int) -> None:
+        """Record that every entry up to and including seq reached the store."""
+        with self._lock:
+            if seq <= self._checkpoint:
+                return
+            self._write_checkpoint(seq)
+            self._pending = [entry for entry in self._pending if entry[0] > seq]
+
+            if not self._pending and self._log.tell() > self.max_log_bytes:
+                self._log.truncate(0)
+                self._log.seek(0)
+
+    def quarantine(self, entries: List[Entry], error: BaseException) -> None:
+        """Durably move entries that cannot be applied to the dead-letter file.
+
+        The entries stay pending until mark_applied() passes them, so the caller
+        decides when the checkpoint advances.
+        """
+        with self._lock, open(self.dead_letter_path, "a", encoding="utf-8") as dead:
+            dead.write(
+                "".join(
+                    json.dumps(
+                        {
+                            "seq": seq,
+                            "payload": payload,
+                            "error": f"{type(error).__name__}: {error}",
+                        }
+                    )
+                    + "\n"
+                    for seq, payload in entries
+                )
+            )
+            dead.flush()
+            if self.fsync:
+                os.fsync(dead.fileno())
+
+    def close(self) -> None:
+        with self._lock:
+            self._log.close()
+            # Closing the lock file releases the flock
+            self._lock_file.close()
+
+    def _write_checkpoint(self, seq: int) -> None:
+        temporary_path = f"{self.checkpoint_path}.tmp"
+        with open(temporary_path, "w") as checkpoint_file:
+            checkpoint_file.write(str(seq))
+            checkpoint_file.flush()
+            if self.fsync:
+                os.fsync(checkpoint_file.fileno())
+        os.replace(temporary_path, self.checkpoint_path)
+        self._checkpoint = seq
+
+    def _recover(self) -> None:
+        """Load pending entries and drop a torn final line left by a crash."""
+        valid_bytes = 0
+        with open(self.path, "rb") as log:
+            for line in log:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                valid_bytes += len(line)
+                self._last_seq = max(self._last_seq, record["seq"])
+                if record["seq"] > self._checkpoint:
+                    self._pending.append((record["seq"], record["payload"]))
+
+        if valid_bytes != os.path.getsize(self.path):
+            with open(self.path, "r+b") as log:
+                log.truncate(valid_bytes)
+
+
+class BackgroundFlusher:
+    """Thread applying pending write-ahead log entries to the store in batches.
+
+    The apply function must be idempotent: after a crash, entries that were
+    applied but not yet checkpointed are applied again. Batches failing with a
+    transient error stay in the log and are retried with exponential backoff.
+    When a batch fails with a permanent error, its entries are applied one at a
+    time and those failing permanently are quarantined in the log's dead-letter
+    file, so one bad entry does not block the log.
+    """
+
+    def __init__(
+        self,
+        wal: WriteAheadLog,
+        apply: Callable[[List[Dict[str, Any]]], None],
+        batch_size: int = 64,
+        interval: float = 0.2,
+        max_backoff: float = 30.0,
+        is_permanent: Optional[Callable[[Exception], bool]] = None,
+    ) -> None:
+        """Start flushing a log.
+
+        Args:
+            wal: Log to flush; entries pending from a previous run are applied first
+            apply: Function writing a batch of payloads to the store
+            batch_size: Maximum number of entries applied per call
+            interval: Seconds to wait for more entries before applying a partial batch
+            max_backoff: Upper bound of the retry backoff in seconds
+            is_permanent: Decides whether an error from apply would recur on every
+                retry; defaults to is_permanent_error
+        """
+        self.wal = wal
+        self.apply = apply
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.is_permanent = is_permanent or is_permanent_error
+        self.quarantined = 0
+        self.last_error: Optional[BaseException] = None
+
+        self._condition = threading.Condition()
+        self._closed = False
+        self._flush_waiters = 0
+        self._thread = threading.Thread(
+            target=self._run, name="wal-flusher", daemon=True
+        )
+        self._thread.start()
+
+    def notify(self) -> None:
+        """Wake the flusher after new entries were appended."""
+        with self._condition:
+            self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every pending entry is applied.
+
+        Returns:
+            bool: True if the log was fully applied within the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._flush_waiters += 1
+            self._condition.notify_all()
+            try:
+                while len(self.wal) and self._thread.is_alive():
+                    remaining = (
+                        None if deadline is None else deadline - time.monotonic()
+                    )
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+            finally:
+                self._flush_waiters -= 1
+        return not len(self.wal)
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """Flush pending entries, then stop the thread.
+
+        Entries still pending when the timeout expires stay in the log and are
+        applied on the next start.
+
+        Returns:
+            bool: True if the log was fully applied before stopping
+        """
+        flushed = self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        return flushed
+
+    def _run(self) -> None:
+        failures = 0
+        while True:
+            with self._condition:
+                if self._closed:
+                    return
+                if not len(self.wal):
+                    self._condition.wait()
+                    continue
+                # Let a few more writes join the batch unless someone is waiting
+                self._condition.wait_for(
+                    lambda: self._closed
+                    or self._flush_waiters > 0
+                    or len(self.wal) >= self.batch_size,
+                    timeout=self.interval,
+                )
+
+            batch = self.wal.pending(self.batch_size)
+            try:
+                self.apply([payload for _, payload in batch])
+                self.wal.mark_applied(batch[-1][0])
+                error = None
+            except Exception as e:
+                error = e if not self.is_permanent(e) else self._apply_each(batch)
+
+            if error is not None:
+                self.last_error = error
+                failures += 1
+                print(f"Memory flush failed, retrying: {str(error)}")
+                with self._condition:
+                    if not self._closed:
+                        self._condition.wait(
+                            min(self.max_backoff, self.interval * 2**failures)
+                        )
+                continue
+
+            failures = 0
+            self.last_error = None
+            with self._condition:
+                self._condition.notify_all()
+
+    def _apply_each(self, batch: List[Entry]) -> Optional[Exception]:
+        """Apply entries one at a time, quarantining those that fail permanently.
+
+        Returns:
+            Optional[Exception]: The transient error that stopped the pass, if any
+        """
+        for seq, payload in batch:
+            try:
+                self.apply([payload])
+            except Exception as e:
+                if not self.is_permanent(e):
+                    return e
+                self.wal.quarantine([(seq, payload)], e)
+                self.quarantined += 1
+                print(
+                    f"Memory could not be stored and was moved to "
+                    f"{self.wal.dead_letter_path}: {str(e)}"
+                )
+            self.wal.mark_applied(seq)
+        return None
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """Whether applying the same payload again would fail again.
+
+    Programming and validation errors are permanent, as are OpenAI errors with
+    a status that is not worth retrying (such as 400 for an invalid input).
+    Anything else, like a lost connection or a locked database, is retried.
+    """
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code not in RETRYABLE_STATUSES
+    return isinstance(error, PERMANENT_ERRORS)
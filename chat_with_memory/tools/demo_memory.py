@@ -1,10 +1,12 @@
+import argparse
 from datetime import datetime
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
-from typing import Any
+from typing import Any, Optional
 from pathlib import Path
 
+from chat_with_memory.profiling import ProfileMode, TurnProfiler
 from chat_with_memory.tools.memory_store_tool import (
     MemoryStoreTool,
     MemoryStoreInputSchema,
@@ -20,9 +22,18 @@ from chat_with_memory.tools.memory_models import (
 )
 
 
-def run_demo() -> None:
-    """Run the memory demo"""
+def run_demo(
+    profile_dir: Optional[str] = None, profile_mode: ProfileMode = "cprofile"
+) -> None:
+    """Run the memory demo
+
+    Args:
+        profile_dir: Optional directory to write profiles to; storing the examples
+            and each query are profiled as separate turns
+        profile_mode: "cprofile" or "sampling", see TurnProfiler
+    """
     console = Console()
+    profiler = TurnProfiler(profile_dir, mode=profile_mode)
     store_tool = MemoryStoreTool()
     query_tool = MemoryQueryTool()
 
@@ -42,10 +53,12 @@ def run_demo() -> None:
     # Store memories
     console.print("\n[bold blue]Storing Memories...[/bold blue]")
     stored_memories = []
-    for memory in example_memories:
-        result = store_tool.run(MemoryStoreInputSchema(memory=memory))
-        stored_memories.append(result.memory)
-        print_memory(console, result.memory, "Stored Memory")
+    with profiler.turn("Store example memories"):
+        for memory in example_memories:
+            with profiler.phase("store"):
+                result = store_tool.run(MemoryStoreInputSchema(memory=memory))
+            stored_memories.append(result.memory)
+            print_memory(console, result.memory, "Stored Memory")
 
     # Demo different query scenarios
     console.print("\n[bold blue]Demonstrating Queries...[/bold blue]")
@@ -55,24 +68,32 @@ def run_demo() -> None:
         console.print(
             f"\n[bold yellow]Querying {memory_type} memories...[/bold yellow]"
         )
-        query_result = query_tool.run(
-            MemoryQueryInputSchema(
-                query="Find relevant memories", n_results=5, memory_type=memory_type
-            )
-        )
-        for memory in query_result.memories:
-            print_memory(console, memory, f"Found {memory_type} Memory")
+        with profiler.turn(f"Query {memory_type} memories"):
+            with profiler.phase("retrieval"):
+                query_result = query_tool.run(
+                    MemoryQueryInputSchema(
+                        query="Find relevant memories",
+                        n_results=5,
+                        memory_type=memory_type,
+                    )
+                )
+            for memory in query_result.memories:
+                print_memory(console, memory, f"Found {memory_type} Memory")
 
     # Semantic search
     console.print("\n[bold yellow]Semantic Search Demo[/bold yellow]")
-    query_result = query_tool.run(
-        MemoryQueryInputSchema(
-            query="Find work-related content",
-            n_results=3,
-        )
-    )
-    for memory in query_result.memories:
-        print_memory(console, memory, "Found Memory (Semantic)")
+    with profiler.turn("Find work-related content"):
+        with profiler.phase("retrieval"):
+            query_result = query_tool.run(
+                MemoryQueryInputSchema(
+                    query="Find work-related content",
+                    n_results=3,
+                )
+            )
+        for memory in query_result.memories:
+            print_memory(console, memory, "Found Memory (Semantic)")
+
+    profiler.close(console)
 
 
 def print_memory(
@@ -105,7 +126,18 @@ def print_memory(
 
 
 def main() -> None:
-    run_demo()
+    parser = argparse.ArgumentParser(description="Store and query example memories")
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="Write per-step profiles and phase timings to DIR",
+    )
+    parser.add_argument(
+        "--profile-mode", choices=["cprofile", "sampling"], default="cprofile"
+    )
+    args = parser.parse_args()
+
+    run_demo(profile_dir=args.profile, profile_mode=args.profile_mode)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,308 @@
+import itertools
+import random
+from typing import Dict, List, Optional, TypedDict
+
+from chat_with_memory.tools.memory_models import (
+    BaseMemory,
+    CoreBioMemory,
+    EventMemory,
+    WorkProjectMemory,
+)
+
+# Fixed timestamp so every run stores identical documents and metadata
+FIXTURE_TIMESTAMP = "2024-06-01T12:00:00+00:00"
+
+
+class Conversation(TypedDict):
+    last_assistant_msg: str
+    last_user_msg: str
+
+
+class LabeledQuery(TypedDict):
+    query: str
+    relevant: List[str]
+    memory_type: Optional[str]
+
+
+# Conversation turns used by the memory formation demo
+TEST_CONVERSATIONS: List[Conversation] = [
+    # Core biographical memories - health
+    {
+        "last_assistant_msg": "Is there anything important I should know about your health?",
+        "last_user_msg": "Yes, actually - I have a severe shellfish allergy that was discovered when I was 7 years old. It causes anaphylaxis and I always carry an EpiPen. I also have mild asthma that acts up during pollen season. I've been feeling a bit under the weather lately with a cold, but that's temporary.",
+    },
+    # Core biographical memories - background
+    {
+        "last_assistant_msg": "Tell me about your background.",
+        "last_user_msg": "I come from a multicultural family - my mother is Japanese and my father is Brazilian. I grew up speaking three languages at home: Portuguese, Japanese, and English. I have a PhD in Quantum Computing from MIT, which I completed in 2019. I've been working in quantum cryptography ever since. My coffee machine broke this morning and I had a terrible commute, but that's just today's drama!",
+    },
+    # Significant events and relationships
+    {
+        "last_assistant_msg": "Any significant changes in your life recently?",
+        "last_user_msg": "Yes, actually - I just got engaged last month to Alex, whom I met during our medical residency at Mayo Clinic. We're planning to move to Boston next year for my new position as Head of Cardiology at Mass General. My sister Maria just had her first child too - I'm an aunt now! The weather's been awful lately, and I need to get my car fixed, but those are minor concerns.",
+    },
+    # Work and professional development
+    {
+        "last_assistant_msg": "Tell me about your work.",
+        "last_user_msg": "I'm leading Project Aurora, our company's quantum-resistant cryptography implementation. It's a $2.5M initiative in collaboration with IBM Quantum, targeting Q4 2024 for rollout. I manage a team of 15 people and we're pioneering new approaches in post-quantum security. My office chair is uncomfortable and the AC is acting up, but that's not important in the grand scheme of things.",
+    },
+    # Hobbies and routines
+    {
+        "last_assistant_msg": "What do you do in your free time?",
+        "last_user_msg": "I've been running for about ten years and I'm training for the Chicago Marathon in October. I also play cello in a community orchestra every Thursday evening. I binge-watched a baking show last night, which was fun.",
+    },
+    # Pets and home
+    {
+        "last_assistant_msg": "Do you have any pets?",
+        "last_user_msg": "We adopted a rescue greyhound named Biscuit two years ago. He's terrified of thunderstorms. We live in a small apartment in Cambridge with a rooftop garden where I grow tomatoes and basil.",
+    },
+    # Travel
+    {
+        "last_assistant_msg": "Any trips coming up?",
+        "last_user_msg": "I'm presenting a paper at the Crypto conference in Santa Barbara in August, and afterwards Alex and I are taking a week off to hike in Yosemite. Last spring we visited my grandparents in Osaka for my grandmother's 90th birthday.",
+    },
+    # Side projects
+    {
+        "last_assistant_msg": "Working on anything outside your main job?",
+        "last_user_msg": "I maintain an open-source Rust library for lattice-based signatures called latsig, and I mentor two graduate students on their thesis projects. Our team also started a weekly reading group on zero-knowledge proofs.",
+    },
+]
+
+
+def _core(content: str) -> CoreBioMemory:
+    return CoreBioMemory(content=content, timestamp=FIXTURE_TIMESTAMP)
+
+
+def _event(content: str) -> EventMemory:
+    return EventMemory(content=content, timestamp=FIXTURE_TIMESTAMP)
+
+
+def _work(content: str) -> WorkProjectMemory:
+    return WorkProjectMemory(content=content, timestamp=FIXTURE_TIMESTAMP)
+
+
+# Memories the formation agent is expected to form from TEST_CONVERSATIONS, keyed
+# by a stable label that the queries below refer to
+FIXTURE_MEMORIES: Dict[str, BaseMemory] = {
+    "shellfish_allergy": _core(
+        "Has a severe shellfish allergy since age 7 that causes anaphylaxis; always carries an EpiPen"
+    ),
+    "asthma": _core("Has mild asthma that flares up during pollen season"),
+    "heritage": _core("Mother is Japanese and father is Brazilian"),
+    "languages": _core("Speaks Portuguese, Japanese and English, learned at home"),
+    "phd": _core("Completed a PhD in Quantum Computing at MIT in 2019"),
+    "career": _core("Has worked in quantum cryptography since 2019"),
+    "engaged": _event("Got engaged to Alex last month"),
+    "met_alex": _event("Met fiance Alex during medical residency at Mayo Clinic"),
+    "boston_move": _event(
+        "Planning to move to Boston next year for a new position as Head of Cardiology at Mass General"
+    ),
+    "niece": _event("Sister Maria had her first child, making the user an aunt"),
+    "aurora_lead": _work(
+        "Leads Project Aurora, the company's quantum-resistant cryptography implementation"
+    ),
+    "aurora_budget": _work(
+        "Project Aurora is a $2.5M initiative with IBM Quantum targeting a Q4 2024 rollout"
+    ),
+    "team": _work(
+        "Manages a team of 15 people working on post-quantum security approaches"
+    ),
+    "running": _core("Has been running for about ten years"),
+    "marathon": _event("Training for the Chicago Marathon in October"),
+    "cello": _core("Plays cello in a community orchestra every Thursday evening"),
+    "dog": _core("Has a rescue greyhound named Biscuit, adopted two years ago"),
+    "dog_storms": _core("Their dog Biscuit is terrified of thunderstorms"),
+    "home": _core("Lives in a small apartment in Cambridge with a rooftop garden"),
+    "garden": _core("Grows tomatoes and basil in a rooftop garden"),
+    "crypto_talk": _work(
+        "Presenting a paper at the Crypto conference in Santa Barbara in August"
+    ),
+    "yosemite": _event(
+        "Taking a week off with Alex to hike in Yosemite after the conference"
+    ),
+    "osaka_trip": _event(
+        "Visited grandparents in Osaka last spring for their grandmother's 90th birthday"
+    ),
+    "latsig": _work(
+        "Maintains latsig, an open-source Rust library for lattice-based signatures"
+    ),
+    "mentoring": _work("Mentors two graduate students on their thesis projects"),
+    "zk_group": _work("Started a weekly team reading group on zero-knowledge proofs"),
+}
+
+
+# Queries with the labels of the memories a good retrieval should return
+LABELED_QUERIES: List[LabeledQuery] = [
+    {
+        "query": "What food allergies do they have?",
+        "relevant": ["shellfish_allergy"],
+        "memory_type": "core",
+    },
+    {
+        "query": "Any medical conditions I should keep in mind?",
+        "relevant": ["shellfish_allergy", "asthma"],
+        "memory_type": "core",
+    },
+    {
+        "query": "Where is their family from?",
+        "relevant": ["heritage", "osaka_trip"],
+        "memory_type": None,
+    },
+    {
+        "query": "Which languages do they speak?",
+        "relevant": ["languages"],
+        "memory_type": "core",
+    },
+    {
+        "query": "What is their educational background?",
+        "relevant": ["phd"],
+        "memory_type": "core",
+    },
+    {
+        "query": "Who is their partner?",
+        "relevant": ["engaged", "met_alex"],
+        "memory_type": "event",
+    },
+    {
+        "query": "Are they relocating anywhere?",
+        "relevant": ["boston_move"],
+        "memory_type": "event",
+    },
+    {
+        "query": "Tell me about their nieces and nephews",
+        "relevant": ["niece"],
+        "memory_type": "event",
+    },
+    {
+        "query": "What project are they leading at work?",
+        "relevant": ["aurora_lead", "aurora_budget"],
+        "memory_type": "work_project",
+    },
+    {
+        "query": "How big is the team they manage?",
+        "relevant": ["team"],
+        "memory_type": "work_project",
+    },
+    {
+        "query": "When is the Aurora rollout deadline?",
+        "relevant": ["aurora_budget"],
+        "memory_type": "work_project",
+    },
+    {
+        "query": "What sports or exercise do they do?",
+        "relevant": ["running", "marathon"],
+        "memory_type": None,
+    },
+    {
+        "query": "Do they play a musical instrument?",
+        "relevant": ["cello"],
+        "memory_type": "core",
+    },
+    {
+        "query": "Tell me about their dog",
+        "relevant": ["dog", "dog_storms"],
+        "memory_type": "core",
+    },
+    {
+        "query": "Where do they live?",
+        "relevant": ["home"],
+        "memory_type": "core",
+    },
+    {
+        "query": "What plants are they growing?",
+        "relevant": ["garden"],
+        "memory_type": "core",
+    },
+    {
+        "query": "What are their travel plans this summer?",
+        "relevant": ["crypto_talk", "yosemite"],
+        "memory_type": None,
+    },
+    {
+        "query": "Have they been to Japan recently?",
+        "relevant": ["osaka_trip"],
+        "memory_type": "event",
+    },
+    {
+        "query": "Which open-source software do they maintain?",
+        "relevant": ["latsig"],
+        "memory_type": "work_project",
+    },
+    {
+        "query": "Do they mentor or teach anyone?",
+        "relevant": ["mentoring", "zk_group"],
+        "memory_type": "work_project",
+    },
+]
+
+
+_DISTRACTOR_ACTIVITIES = [
+    "went hiking",
+    "tried a new bakery",
+    "repainted the kitchen",
+    "watched a documentary about volcanoes",
+    "fixed a leaking faucet",
+    "played board games with neighbours",
+    "started reading a mystery novel",
+    "went to a jazz concert",
+    "cleaned out the garage",
+    "took a pottery class",
+    "visited a farmers market",
+    "went birdwatching",
+]
+_DISTRACTOR_PLACES = [
+    "near the lake",
+    "downtown",
+    "at a friend's place",
+    "in the old town",
+    "by the river",
+    "at the community centre",
+    "in the countryside",
+    "at the mall",
+    "near the harbour",
+    "in the park",
+    "at the library",
+    "on the coast",
+    "in the suburbs",
+    "at the museum",
+    "in the hills",
+]
+_DISTRACTOR_TIMES = [
+    "last Monday",
+    "on a rainy Tuesday",
+    "over the weekend",
+    "two weeks ago",
+    "last autumn",
+    "during the holidays",
+    "on a Friday evening",
+    "early one morning",
+    "last spring",
+    "the day before yesterday",
+    "a month ago",
+    "on a sunny afternoon",
+]
+
+
+def distractor_memories(count: int, seed: int = 0) -> Dict[str, BaseMemory]:
+    """Unrelated everyday events that pad the fixture corpus to a realistic size.
+
+    None of them is relevant to a labeled query, so they only make retrieval
+    harder. Each combination of activity, place and time is used at most once.
+
+    Args:
+        count: Number of distractors, at most the number of combinations
+        seed: Random seed for picking combinations
+
+    Returns:
+        Dict[str, BaseMemory]: Distractor memories keyed by label
+    """
+    combinations = list(
+        itertools.product(_DISTRACTOR_ACTIVITIES, _DISTRACTOR_PLACES, _DISTRACTOR_TIMES)
+    )
+    if count > len(combinations):
+        raise ValueError(f"At most {len(combinations)} distractors are available")
+    picked = random.Random(seed).sample(combinations, count)
+    return {
+        f"distractor_{number}": _event(f"Casually {activity} {place} {time}")
+        for number, (activity, place, time) in enumerate(picked)
+    }
@@ -0,0 +1,198 @@
+import argparse
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import chromadb
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+from chat_with_memory.services.chroma_db import (
+    ChromaDBService,
+    PrecomputedEmbeddingFunction,
+)
+from chat_with_memory.services.index_profiles import (
+    INDEX_PROFILES,
+    DistanceMetric,
+    IndexProfile,
+    get_index_profile,
+)
+
+
+def exact_neighbours(
+    corpus: np.ndarray, queries: np.ndarray, k: int, space: DistanceMetric
+) -> np.ndarray:
+    """Compute the exact top-k neighbour indices of each query by brute force."""
+    if space == "l2":
+        distances = (
+            (queries**2).sum(axis=1)[:, None]
+            - 2 * queries @ corpus.T
+            + (corpus**2).sum(axis=1)[None, :]
+        )
+    elif space == "cosine":
+        corpus_norm = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+        query_norm = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        distances = 1.0 - query_norm @ corpus_norm.T
+    else:
+        distances = 1.0 - queries @ corpus.T
+
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def sweep_profile(
+    profile: IndexProfile,
+    ids: List[str],
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+) -> Dict[str, float]:
+    """Build a scratch collection with the given profile and measure it.
+
+    Args:
+        profile: Index profile to evaluate
+        ids: IDs of the corpus rows
+        corpus: Embedding matrix of the sampled collection
+        queries: Embedding matrix of the query sample
+        k: Number of neighbours to retrieve per query
+
+    Returns:
+        Dict[str, float]: Build time, recall@k and latency percentiles
+    """
+    # Persistent segments are used so batch and sync parameters take effect
+    with tempfile.TemporaryDirectory(prefix="index-sweep-") as scratch_directory:
+        client = chromadb.PersistentClient(path=scratch_directory)
+        collection = client.create_collection(
+            name="sweep", metadata=profile.to_metadata()
+        )
+
+        start = time.perf_counter()
+        for offset in range(0, len(ids), 1000):
+            collection.add(
+                ids=ids[offset : offset + 1000],
+                embeddings=corpus[offset : offset + 1000].tolist(),
+            )
+        build_seconds = time.perf_counter() - start
+
+        truth = exact_neighbours(corpus, queries, k, profile.space)
+        id_positions = {id_: position for position, id_ in enumerate(ids)}
+
+        latencies = []
+        hits = 0
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            result = collection.query(query_embeddings=[query.tolist()], n_results=k)
+            latencies.append(time.perf_counter() - start)
+
+            found = {id_positions[id_] for id_ in result["ids"][0]}
+            hits += len(found.intersection(expected.tolist()))
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "build_seconds": build_seconds,
+        "recall": hits / (len(queries) * k),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+
+
+def run_sweep(
+    collection_name: str = "chat_memories",
+    persist_directory: str = "./chroma_db",
+    profiles: Optional[List[str]] = None,
+    distances: Optional[List[DistanceMetric]] = None,
+    sample_size: int = 200,
+    max_corpus: int = 20000,
+    k: int = 10,
+    seed: int = 0,
+) -> None:
+    """Compare recall and latency of index profiles on a sample of a real collection.
+
+    Stored embeddings are reused, so the sweep makes no embedding API calls.
+    Queries are drawn from the sampled corpus and ground truth is computed by
+    exact search over the same sample.
+    """
+    console = Console()
+    db_service = ChromaDBService(
+        collection_name=collection_name,
+        persist_directory=persist_directory,
+        backend="chroma",
+        embedding_function=PrecomputedEmbeddingFunction(),
+    )
+
+    total = db_service.get_count()
+    if total == 0:
+        console.print(f"[bold red]Collection '{collection_name}' is empty[/bold red]")
+        return
+
+    rng = np.random.default_rng(seed)
+    offset = int(rng.integers(0, max(1, total - max_corpus + 1)))
+    sample = db_service.collection.get(
+        limit=max_corpus, offset=offset, include=["embeddings"]
+    )
+    ids = sample["ids"]
+    corpus = np.asarray(sample["embeddings"], dtype=np.float32)
+    queries = corpus[
+        rng.choice(len(ids), size=min(sample_size, len(ids)), replace=False)
+    ]
+    k = min(k, len(ids))
+
+    console.print(
+        f"\n[bold blue]Sweeping {len(ids)} of {total} memories "
+        f"with {len(queries)} queries (k={k})[/bold blue]"
+    )
+
+    table = Table(title="Index profile sweep")
+    table.add_column("Profile", style="cyan")
+    table.add_column("Space")
+    table.add_column("M / ef_c / ef_s")
+    table.add_column("Build (s)", justify="right")
+    table.add_column(f"Recall@{k}", justify="right", style="green")
+    table.add_column("p50 (ms)", justify="right")
+    table.add_column("p99 (ms)", justify="right")
+
+    for profile_name in profiles or list(INDEX_PROFILES):
+        for distance in distances or [None]:
+            profile = get_index_profile(profile_name, distance)
+            metrics = sweep_profile(profile, ids, corpus, queries, k)
+            table.add_row(
+                profile.name,
+                profile.space,
+                f"{profile.M} / {profile.construction_ef} / {profile.search_ef}",
+                f"{metrics['build_seconds']:.2f}",
+                f"{metrics['recall']:.3f}",
+                f"{metrics['p50_ms']:.2f}",
+                f"{metrics['p99_ms']:.2f}",
+            )
+
+    console.print(table)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Recall-vs-latency sweep of HNSW index profiles"
+    )
+    parser.add_argument("--collection", default="chat_memories")
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument("--profiles", nargs="+", choices=list(INDEX_PROFILES))
+    parser.add_argument("--distances", nargs="+", choices=["cosine", "l2", "ip"])
+    parser.add_argument("--sample-size", type=int, default=200)
+    parser.add_argument("--max-corpus", type=int, default=20000)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    run_sweep(
+        collection_name=args.collection,
+        persist_directory=args.persist_directory,
+        profiles=args.profiles,
+        distances=args.distances,
+        sample_size=args.sample_size,
+        max_corpus=args.max_corpus,
+        k=args.k,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
-from typing import Literal, Optional
+from typing import Dict, Literal, Optional, Type
 from pydantic import Field, BaseModel
+from pydantic.json_schema import SkipJsonSchema
 from datetime import datetime, timezone
 from atomic_agents.lib.base.base_io_schema import BaseIOSchema
 
@@ -12,6 +13,10 @@ class BaseMemory(BaseIOSchema):
         default_factory=lambda: datetime.now(timezone.utc).isoformat(),
         description="ISO format timestamp of when the memory was created",
     )
+    # Assigned by the store, so it is hidden from the schema the LLM fills in
+    id: SkipJsonSchema[Optional[str]] = Field(
+        default=None, description="ID of the memory in the store"
+    )
 
 
 class CoreBioMemory(BaseMemory):
@@ -30,3 +35,16 @@ class WorkProjectMemory(BaseMemory):
     """This memory contains information about a work or project that the user has been involved in, such as a project, a task, or a significant experience"""
 
     memory_type: Literal["work_project"] = Field(default="work_project")
+
+
+# Storage representation of each memory class, shared by the store and query tools
+MEMORY_TYPE_BY_CLASS: Dict[Type[BaseMemory], str] = {
+    CoreBioMemory: "core_memory",
+    EventMemory: "event_memory",
+    WorkProjectMemory: "work_project_memory",
+    BaseMemory: "base_memory",
+}
+MEMORY_CLASS_BY_TYPE: Dict[str, Type[BaseMemory]] = {
+    memory_type: memory_class
+    for memory_class, memory_type in MEMORY_TYPE_BY_CLASS.items()
+}
@@ -6,12 +6,15 @@ import json
 from atomic_agents.lib.base.base_tool import BaseTool, BaseToolConfig
 from atomic_agents.lib.base.base_io_schema import BaseIOSchema
 from chat_with_memory.services.chroma_db import ChromaDBService, QueryResult
-from chat_with_memory.tools.memory_models import (
-    CoreBioMemory,
-    EventMemory,
-    WorkProjectMemory,
-    BaseMemory,
-)
+from chat_with_memory.services.sharded_chroma_db import get_sharded_service
+from chat_with_memory.tools.memory_models import BaseMemory, MEMORY_CLASS_BY_TYPE
+
+# Map query types to stored types
+QUERY_TYPE_MAPPING = {
+    "core": "core_memory",
+    "event": "event_memory",
+    "work_project": "work_project_memory",
+}
 
 
 class MemoryQueryInputSchema(BaseIOSchema):
@@ -24,6 +27,21 @@ class MemoryQueryInputSchema(BaseIOSchema):
     memory_type: Optional[str] = Field(
         default=None, description="Optional memory type to filter memories"
     )
+    expand_neighbours: Optional[int] = Field(
+        default=0,
+        description="Number of linked memories to follow per retrieved memory",
+    )
+    expand_hops: Optional[int] = Field(
+        default=1, description="Number of link hops to follow when expanding"
+    )
+    n_summaries: Optional[int] = Field(
+        default=0,
+        description="Number of summaries of the nearest memory clusters to include",
+    )
+    tenant: Optional[str] = Field(
+        default=None,
+        description="Optional tenant (such as a user ID) to only retrieve memories of",
+    )
 
 
 class MemoryQueryOutputSchema(BaseIOSchema):
@@ -32,6 +50,9 @@ class MemoryQueryOutputSchema(BaseIOSchema):
     memories: List[BaseMemory] = Field(
         default_factory=list, description="Retrieved memories"
     )
+    summaries: List[str] = Field(
+        default_factory=list, description="Summaries of the nearest memory clusters"
+    )
 
 
 class MemoryQueryConfig(BaseToolConfig):
@@ -43,6 +64,48 @@ class MemoryQueryConfig(BaseToolConfig):
     persist_directory: str = Field(
         default="./chroma_db", description="Directory to persist ChromaDB data"
     )
+    shards: Optional[List[str]] = Field(
+        default=None,
+        description="Persist directories to shard memories across instead of persist_directory",
+    )
+    shard_by: Literal["id", "tenant"] = Field(
+        default="id",
+        description="Place memories on shards by their ID, or by their tenant metadata",
+    )
+    tenant_key: str = Field(
+        default="tenant",
+        description="Metadata field storing the tenant of a memory, also used by shard_by='tenant'",
+    )
+    index_profile: Optional[str] = Field(
+        default=None,
+        description="HNSW index profile for new collections: 'small', 'large' or 'bulk_load'",
+    )
+    distance: Optional[Literal["cosine", "l2", "ip"]] = Field(
+        default=None, description="Distance metric overriding the index profile's"
+    )
+    backend: Literal["auto", "chroma", "numpy", "clustered"] = Field(
+        default="chroma",
+        description="Query backend; 'auto' uses an in-memory index for small collections",
+    )
+    cluster_probes: int = Field(
+        default=4,
+        description="Number of memory clusters searched per query by the 'clustered' backend",
+    )
+    embedding_dimensions: Optional[int] = Field(
+        default=None,
+        description="Optional Matryoshka truncation of embeddings to their leading dimensions",
+    )
+    quantization: Optional[Literal["int8", "pq"]] = Field(
+        default=None, description="Optional quantization of the in-memory index"
+    )
+    snapshot_path: Optional[str] = Field(
+        default=None,
+        description="Optional memory-mapped snapshot to serve read-only queries from",
+    )
+    coalesce_embeddings: bool = Field(
+        default=False,
+        description="Batch embedding calls made concurrently from several threads",
+    )
 
 
 class MemoryQueryTool(BaseTool):
@@ -51,57 +114,115 @@ class MemoryQueryTool(BaseTool):
     input_schema = MemoryQueryInputSchema
     output_schema = MemoryQueryOutputSchema
 
-    def __init__(self, config: MemoryQueryConfig = MemoryQueryConfig()):
+    def __init__(
+        self,
+        config: MemoryQueryConfig = MemoryQueryConfig(),
+        db_service: Optional[ChromaDBService] = None,
+    ):
+        """Initialize the tool.
+
+        Args:
+            config: Tool configuration
+            db_service: Optional ChromaDBService to share instead of creating one
+                from the configuration
+        """
         super().__init__(config)
-        self.db_service = ChromaDBService(
-            collection_name=config.collection_name,
-            persist_directory=config.persist_directory,
-        )
+        self.tenant_key = config.tenant_key
+        self.db_service = db_service
+        if self.db_service is None and config.shards:
+            self.db_service = get_sharded_service(
+                config.collection_name,
+                config.shards,
+                shard_by=config.shard_by,
+                tenant_key=config.tenant_key,
+                embedding_dimensions=config.embedding_dimensions,
+                coalesce_embeddings=config.coalesce_embeddings,
+                index_profile=config.index_profile,
+                distance=config.distance,
+                backend=config.backend,
+                cluster_probes=config.cluster_probes,
+                quantization=config.quantization,
+            )
+        if self.db_service is None:
+            self.db_service = ChromaDBService(
+                collection_name=config.collection_name,
+                persist_directory=config.persist_directory,
+                index_profile=config.index_profile,
+                distance=config.distance,
+                backend=config.backend,
+                cluster_probes=config.cluster_probes,
+                embedding_dimensions=config.embedding_dimensions,
+                quantization=config.quantization,
+                coalesce_embeddings=config.coalesce_embeddings,
+                snapshot_path=config.snapshot_path,
+            )
 
     def run(self, params: MemoryQueryInputSchema) -> MemoryQueryOutputSchema:
         """Query for relevant memories using semantic search"""
-        where_filter = None
+        conditions = []
         if params.memory_type:
-            # Map query types to stored types
-            type_mapping = {
-                "core": "core_memory",
-                "event": "event_memory",
-                "work_project": "work_project_memory",
-            }
-            memory_type = type_mapping[params.memory_type]
-            where_filter = {"memory_type": memory_type}
+            memory_type = QUERY_TYPE_MAPPING[params.memory_type]
+            conditions.append({"memory_type": memory_type})
+        if params.tenant is not None:
+            conditions.append({self.tenant_key: params.tenant})
+        where_filter = None
+        if len(conditions) == 1:
+            where_filter = conditions[0]
+        elif conditions:
+            where_filter = {"$and": conditions}
 
         try:
-            results: QueryResult = self.db_service.query(
-                query_text=params.query,
-                n_results=params.n_results,
-                where=where_filter,
+            # Embed once for both the search and the cluster summaries
+            embedding = self.db_service.embedding_function([params.query])[0]
+            results: QueryResult = self.db_service.query_embedding(
+                embedding, n_results=params.n_results, where=where_filter
+            )
+            summaries = []
+            if params.n_summaries:
+                summaries = self.db_service.cluster_summaries(
+                    embedding, params.n_summaries, where=where_filter
+                )
+
+            documents = list(results["documents"])
+            metadatas = list(results["metadatas"])
+            ids = list(results["ids"])
+
+            # Follow links between memories instead of running more searches
+            if params.expand_neighbours:
+                linked_ids = self.db_service.memory_graph.neighbours(
+                    ids, limit=params.expand_neighbours, hops=params.expand_hops
+                )
+                if linked_ids:
+                    linked = self.db_service.get_documents(linked_ids)
+                    for doc, meta, id_ in zip(
+                        linked["documents"], linked["metadatas"], linked["ids"]
+                    ):
+                        if (
+                            params.memory_type
+                            and meta.get("memory_type") != memory_type
+                        ):
+                            continue
+                        if (
+                            params.tenant is not None
+                            and meta.get(self.tenant_key) != params.tenant
+                        ):
+                            continue
+                        documents.append(doc)
+                        metadatas.append(meta)
+                        ids.append(id_)
+
+            # Rows come from our own store, so the models are built without
+            # re-validating every field
+            memories = [
+                MEMORY_CLASS_BY_TYPE[
+                    meta.get("memory_type", "base_memory")
+                ].model_construct(id=id_, content=doc, timestamp=meta["timestamp"])
+                for doc, meta, id_ in zip(documents, metadatas, ids)
+            ]
+
+            return MemoryQueryOutputSchema.model_construct(
+                memories=memories, summaries=summaries
             )
-
-            # Map stored types back to memory classes
-            memory_class_mapping = {
-                "core_memory": CoreBioMemory,
-                "event_memory": EventMemory,
-                "work_project_memory": WorkProjectMemory,
-                "base_memory": BaseMemory,
-            }
-
-            memories = []
-            if results["documents"]:
-                for doc, meta, id_ in zip(
-                    results["documents"], results["metadatas"], results["ids"]
-                ):
-                    memory_type = meta.get("memory_type", "base_memory")
-                    memory_class = memory_class_mapping[memory_type]
-
-                    base_data = {
-                        "id": id_,
-                        "content": doc,
-                        "timestamp": meta["timestamp"],
-                    }
-                    memories.append(memory_class(**base_data))
-
-            return MemoryQueryOutputSchema(memories=memories)
         except Exception as e:
             print(f"Query error: {str(e)}")
             return MemoryQueryOutputSchema(memories=[])
@@ -1,13 +1,17 @@
+import itertools
+import uuid
+from typing import Any, Dict, List, Literal, Optional
 from pydantic import Field
 
 from atomic_agents.lib.base.base_tool import BaseTool, BaseToolConfig
 from atomic_agents.lib.base.base_io_schema import BaseIOSchema
 from chat_with_memory.services.chroma_db import ChromaDBService
+from chat_with_memory.services.sharded_chroma_db import get_sharded_service
+from chat_with_memory.services.write_ahead_log import BackgroundFlusher, WriteAheadLog
 from chat_with_memory.tools.memory_models import (
     BaseMemory,
-    CoreBioMemory,
-    EventMemory,
-    WorkProjectMemory,
+    MEMORY_CLASS_BY_TYPE,
+    MEMORY_TYPE_BY_CLASS,
 )
 
 
@@ -15,6 +19,10 @@ class MemoryStoreInputSchema(BaseIOSchema):
     """Schema for storing memories"""
 
     memory: BaseMemory = Field(..., description="Memory to store")
+    tenant: Optional[str] = Field(
+        default=None,
+        description="Optional tenant (such as a user ID) the memory belongs to",
+    )
 
 
 class MemoryStoreOutputSchema(BaseIOSchema):
@@ -32,6 +40,52 @@ class MemoryStoreConfig(BaseToolConfig):
     persist_directory: str = Field(
         default="./chroma_db", description="Directory to persist ChromaDB data"
     )
+    shards: Optional[List[str]] = Field(
+        default=None,
+        description="Persist directories to shard memories across instead of persist_directory",
+    )
+    shard_by: Literal["id", "tenant"] = Field(
+        default="id",
+        description="Place memories on shards by their ID, or by their tenant metadata",
+    )
+    tenant_key: str = Field(
+        default="tenant",
+        description="Metadata field storing the tenant of a memory, also used by shard_by='tenant'",
+    )
+    index_profile: Optional[str] = Field(
+        default=None,
+        description="HNSW index profile for new collections: 'small', 'large' or 'bulk_load'",
+    )
+    distance: Optional[Literal["cosine", "l2", "ip"]] = Field(
+        default=None, description="Distance metric overriding the index profile's"
+    )
+    backend: Literal["auto", "chroma", "numpy", "clustered"] = Field(
+        default="chroma",
+        description="Query backend; 'auto' uses an in-memory index for small collections",
+    )
+    cluster_probes: int = Field(
+        default=4,
+        description="Number of memory clusters searched per query by the 'clustered' backend",
+    )
+    embedding_dimensions: Optional[int] = Field(
+        default=None,
+        description="Optional Matryoshka truncation of embeddings to their leading dimensions",
+    )
+    quantization: Optional[Literal["int8", "pq"]] = Field(
+        default=None, description="Optional quantization of the in-memory index"
+    )
+    coalesce_embeddings: bool = Field(
+        default=False,
+        description="Batch embedding calls made concurrently from several threads",
+    )
+    graph_neighbours: int = Field(
+        default=3,
+        description="Number of nearest existing memories each new memory is linked to",
+    )
+    write_ahead_log: bool = Field(
+        default=False,
+        description="Record memories in a local write-ahead log and store them in the background",
+    )
 
 
 class MemoryStoreTool(BaseTool):
@@ -40,35 +94,170 @@ class MemoryStoreTool(BaseTool):
     input_schema = MemoryStoreInputSchema
     output_schema = MemoryStoreOutputSchema
 
-    def __init__(self, config: MemoryStoreConfig = MemoryStoreConfig()):
+    def __init__(
+        self,
+        config: MemoryStoreConfig = MemoryStoreConfig(),
+        db_service: Optional[ChromaDBService] = None,
+    ):
+        """Initialize the tool.
+
+        Args:
+            config: Tool configuration
+            db_service: Optional ChromaDBService to share instead of creating one
+                from the configuration
+        """
         super().__init__(config)
-        self.db_service = ChromaDBService(
-            collection_name=config.collection_name,
-            persist_directory=config.persist_directory,
-        )
+        self.graph_neighbours = config.graph_neighbours
+        self.tenant_key = config.tenant_key
+        self.db_service = db_service
+        if self.db_service is None and config.shards:
+            self.db_service = get_sharded_service(
+                config.collection_name,
+                config.shards,
+                shard_by=config.shard_by,
+                tenant_key=config.tenant_key,
+                embedding_dimensions=config.embedding_dimensions,
+                coalesce_embeddings=config.coalesce_embeddings,
+                index_profile=config.index_profile,
+                distance=config.distance,
+                backend=config.backend,
+                cluster_probes=config.cluster_probes,
+                quantization=config.quantization,
+            )
+        if self.db_service is None:
+            self.db_service = ChromaDBService(
+                collection_name=config.collection_name,
+                persist_directory=config.persist_directory,
+                index_profile=config.index_profile,
+                distance=config.distance,
+                backend=config.backend,
+                cluster_probes=config.cluster_probes,
+                embedding_dimensions=config.embedding_dimensions,
+                quantization=config.quantization,
+                coalesce_embeddings=config.coalesce_embeddings,
+            )
+
+        # Memories logged but not stored before the last exit are stored first
+        self.wal: Optional[WriteAheadLog] = None
+        self.flusher: Optional[BackgroundFlusher] = None
+        if config.write_ahead_log:
+            self.wal = WriteAheadLog(self.db_service.data_path(".wal"))
+            self.flusher = BackgroundFlusher(self.wal, self._apply_log_entries)
 
     def run(self, params: MemoryStoreInputSchema) -> MemoryStoreOutputSchema:
         """Store a new memory in ChromaDB"""
         memory = params.memory
+        if self.flusher is None:
+            self.store_memories([memory], tenant=params.tenant)
+            return MemoryStoreOutputSchema(memory=memory)
+
+        # The ID is assigned before logging so replaying the log is idempotent
+        if not memory.id:
+            memory.id = str(uuid.uuid4())
+        self.wal.append(
+            [
+                {
+                    "memory_type": MEMORY_TYPE_BY_CLASS.get(
+                        type(memory), "base_memory"
+                    ),
+                    "memory": memory.model_dump(),
+                    "tenant": params.tenant,
+                }
+            ]
+        )
+        self.flusher.notify()
+        return MemoryStoreOutputSchema(memory=memory)
+
+    def store_memories(
+        self, memories: List[BaseMemory], tenant: Optional[str] = None
+    ) -> List[BaseMemory]:
+        """Store memories in ChromaDB and link them in the memory graph.
 
-        # Map memory types to their storage representation
-        memory_type_mapping = {
-            CoreBioMemory: "core_memory",
-            EventMemory: "event_memory",
-            WorkProjectMemory: "work_project_memory",
-        }
+        Args:
+            memories: Memories to store; each gets its assigned ID set
+            tenant: Optional tenant the memories belong to. It is stored in their
+                metadata, and they are only linked to memories of the same tenant.
 
-        # Get the specific memory type
-        memory_type = memory_type_mapping.get(type(memory), "base_memory")
+        Returns:
+            List[BaseMemory]: The stored memories
+        """
+        documents = [memory.content for memory in memories]
 
         # Base metadata with all values as strings
-        metadata = {
-            "timestamp": memory.timestamp,
-            "memory_type": memory_type,
-        }
+        metadatas = [
+            {
+                "timestamp": memory.timestamp,
+                "memory_type": MEMORY_TYPE_BY_CLASS.get(type(memory), "base_memory"),
+            }
+            for memory in memories
+        ]
+        if tenant is not None:
+            for metadata in metadatas:
+                metadata[self.tenant_key] = tenant
 
-        self.db_service.add_documents(
-            documents=[memory.content], metadatas=[metadata]
+        # Find the neighbours to link to before the memories are added, reusing
+        # the embeddings for the add
+        embeddings = None
+        neighbours: List[List[Any]] = [[] for _ in memories]
+        if self.graph_neighbours:
+            embeddings = self.db_service.embedding_function(documents)
+            for position, embedding in enumerate(embeddings):
+                similar = self.db_service.query_embedding(
+                    embedding,
+                    n_results=self.graph_neighbours,
+                    where={self.tenant_key: tenant} if tenant is not None else None,
+                )
+                neighbours[position] = list(zip(similar["ids"], similar["distances"]))
+
+        # Memories that already carry an ID keep it, so storing them again
+        # doesn't create duplicates
+        ids = self.db_service.add_documents(
+            documents=documents,
+            metadatas=metadatas,
+            ids=[memory.id or str(uuid.uuid4()) for memory in memories],
+            embeddings=embeddings,
         )
+        for memory, id_, links in zip(memories, ids, neighbours):
+            memory.id = id_
+            self.db_service.memory_graph.add_memory(
+                id_, memory.content, links, tenant=tenant
+            )
+        return memories
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until memories recorded in the write-ahead log are stored.
+
+        Returns:
+            bool: True if nothing is left to store
+        """
+        return self.flusher is None or self.flusher.flush(timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> bool:
+        """Store pending memories and stop the background flusher.
+
+        Memories that could not be stored within the timeout stay in the
+        write-ahead log and are stored the next time the tool starts.
+
+        Returns:
+            bool: True if nothing was left to store
+        """
+        if self.flusher is None:
+            return True
+        flushed = self.flusher.close(timeout)
+        self.wal.close()
+        self.flusher = None
+        return flushed
 
-        return MemoryStoreOutputSchema(memory=memory.model_copy())
+    def _apply_log_entries(self, payloads: List[Dict[str, Any]]) -> None:
+        for tenant, group in itertools.groupby(
+            payloads, key=lambda payload: payload.get("tenant")
+        ):
+            self.store_memories(
+                [
+                    MEMORY_CLASS_BY_TYPE[payload["memory_type"]].model_validate(
+                        payload["memory"]
+                    )
+                    for payload in group
+                ],
+                tenant=tenant,
+            )
@@ -0,0 +1,232 @@
+import argparse
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+from chat_with_memory.services.chroma_db import (
+    ChromaDBService,
+    PrecomputedEmbeddingFunction,
+)
+from chat_with_memory.services.index_profiles import DistanceMetric
+from chat_with_memory.services.numpy_index import NumpyIndex
+from chat_with_memory.services.quantization import (
+    create_quantizer,
+    truncate_embeddings,
+)
+from chat_with_memory.tools.index_sweep import exact_neighbours
+
+
+def benchmark_index(
+    index: NumpyIndex,
+    ids: List[str],
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    truth: np.ndarray,
+    k: int,
+) -> Dict[str, float]:
+    """Load an index and measure its recall against exact neighbours.
+
+    Args:
+        index: Empty index to evaluate
+        ids: IDs of the corpus rows
+        vectors: Corpus embeddings in the representation the index stores
+        queries: Query embeddings in the same representation
+        truth: Exact top-k row indices computed at full precision
+        k: Number of neighbours to retrieve per query
+
+    Returns:
+        Dict[str, float]: Bytes per vector, recall@k and mean query latency
+    """
+    index.add(ids, vectors)
+    positions = {id_: position for position, id_ in enumerate(ids)}
+
+    hits = 0
+    latencies = []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        result = index.query(query, n_results=k)
+        latencies.append(time.perf_counter() - start)
+        found = {positions[id_] for id_ in result["ids"]}
+        hits += len(found.intersection(expected.tolist()))
+
+    return {
+        "bytes_per_vector": index.nbytes / len(index),
+        "recall": hits / (len(queries) * k),
+        "mean_ms": float(np.mean(latencies) * 1000),
+    }
+
+
+def run_benchmark(
+    collection_name: str = "chat_memories",
+    persist_directory: str = "./chroma_db",
+    synthetic: Optional[int] = None,
+    dimensions: int = 1536,
+    space: Optional[DistanceMetric] = None,
+    sample_size: int = 200,
+    truncations: Optional[List[int]] = None,
+    pq_subspaces: int = 64,
+    rerank_factor: int = 4,
+    k: int = 10,
+    seed: int = 0,
+) -> None:
+    """Compare recall and memory of float, quantized and truncated embedding storage.
+
+    Embeddings are read from a real collection, or generated when synthetic is
+    set. Random vectors have no Matryoshka structure, so truncation results are
+    only meaningful on real embeddings. Memory is that of the in-memory index
+    relative to float32 rows; ChromaDB's own float32 vectors are not included.
+    """
+    console = Console()
+    rng = np.random.default_rng(seed)
+
+    if synthetic:
+        ids = [str(i) for i in range(synthetic)]
+        corpus = rng.normal(size=(synthetic, dimensions)).astype(np.float32)
+        corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+        space = space or "cosine"
+    else:
+        db_service = ChromaDBService(
+            collection_name=collection_name,
+            persist_directory=persist_directory,
+            backend="chroma",
+            embedding_function=PrecomputedEmbeddingFunction(),
+        )
+        stored = db_service.collection.get(include=["embeddings"])
+        if not stored["ids"]:
+            console.print(
+                f"[bold red]Collection '{collection_name}' is empty[/bold red]"
+            )
+            return
+        ids = stored["ids"]
+        corpus = np.asarray(stored["embeddings"], dtype=np.float32)
+        space = space or (db_service.collection.metadata or {}).get("hnsw:space", "l2")
+
+    queries = corpus[
+        rng.choice(len(ids), size=min(sample_size, len(ids)), replace=False)
+    ]
+    k = min(k, len(ids))
+    truth = exact_neighbours(corpus, queries, k, space)
+
+    positions = {id_: position for position, id_ in enumerate(ids)}
+
+    def full_precision(id_list: List[str]) -> np.ndarray:
+        return corpus[[positions[id_] for id_ in id_list]]
+
+    console.print(
+        f"\n[bold blue]Benchmarking {len(ids)} x {corpus.shape[1]} embeddings "
+        f"({space}) with {len(queries)} queries (k={k})[/bold blue]"
+    )
+
+    table = Table(title="Quantization benchmark")
+    table.add_column("Storage", style="cyan")
+    table.add_column("Bytes / vector", justify="right")
+    table.add_column("Index memory saved", justify="right")
+    table.add_column(f"Recall@{k}", justify="right", style="green")
+    table.add_column("Mean query (ms)", justify="right")
+
+    configurations = [
+        ("float32", dict(dtype=np.float32), corpus, queries),
+        ("float16", dict(dtype=np.float16), corpus, queries),
+        ("int8", dict(quantizer=create_quantizer("int8")), corpus, queries),
+        (
+            f"int8 + rerank x{rerank_factor}",
+            dict(
+                quantizer=create_quantizer("int8"),
+                rerank_source=full_precision,
+                rerank_factor=rerank_factor,
+            ),
+            corpus,
+            queries,
+        ),
+    ]
+    if corpus.shape[1] % pq_subspaces == 0:
+        configurations += [
+            (
+                f"pq{pq_subspaces}",
+                dict(quantizer=create_quantizer("pq", pq_subspaces)),
+                corpus,
+                queries,
+            ),
+            (
+                f"pq{pq_subspaces} + rerank x{rerank_factor}",
+                dict(
+                    quantizer=create_quantizer("pq", pq_subspaces),
+                    rerank_source=full_precision,
+                    rerank_factor=rerank_factor,
+                ),
+                corpus,
+                queries,
+            ),
+        ]
+    for truncation in truncations or [512, 256]:
+        if truncation < corpus.shape[1]:
+            configurations.append(
+                (
+                    f"truncated to {truncation}",
+                    dict(dtype=np.float32),
+                    np.asarray(truncate_embeddings(corpus, truncation)),
+                    np.asarray(truncate_embeddings(queries, truncation)),
+                )
+            )
+
+    baseline_bytes = None
+    for name, options, vectors, query_vectors in configurations:
+        # The corpus is added in one batch, so quantizers train on all of it
+        index = NumpyIndex(
+            space=space,
+            initial_capacity=len(ids),
+            min_training_rows=len(ids),
+            **options,
+        )
+        metrics = benchmark_index(index, ids, vectors, query_vectors, truth, k)
+        baseline_bytes = baseline_bytes or metrics["bytes_per_vector"]
+        table.add_row(
+            name,
+            f"{metrics['bytes_per_vector']:.0f}",
+            f"{1 - metrics['bytes_per_vector'] / baseline_bytes:.0%}",
+            f"{metrics['recall']:.3f}",
+            f"{metrics['mean_ms']:.2f}",
+        )
+
+    console.print(table)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Recall vs. memory benchmark of embedding quantization"
+    )
+    parser.add_argument("--collection", default="chat_memories")
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument(
+        "--synthetic", type=int, help="Benchmark N random vectors instead"
+    )
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--space", choices=["cosine", "l2", "ip"])
+    parser.add_argument("--sample-size", type=int, default=200)
+    parser.add_argument("--truncations", type=int, nargs="+")
+    parser.add_argument("--pq-subspaces", type=int, default=64)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    run_benchmark(
+        collection_name=args.collection,
+        persist_directory=args.persist_directory,
+        synthetic=args.synthetic,
+        dimensions=args.dimensions,
+        space=args.space,
+        sample_size=args.sample_size,
+        truncations=args.truncations,
+        pq_subspaces=args.pq_subspaces,
+        rerank_factor=args.rerank_factor,
+        k=args.k,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
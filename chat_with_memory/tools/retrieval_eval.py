@@ -0,0 +1,331 @@
+import argparse
+import os
+import random
+import re
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Literal, Optional, Sequence
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from rich.console import Console
+from rich.table import Table
+
+from chat_with_memory.services.chroma_db import ChromaDBService
+from chat_with_memory.services.hash_embeddings import HashEmbeddingFunction
+from chat_with_memory.services.quantization import QuantizationMethod
+from chat_with_memory.tools.eval_fixtures import (
+    FIXTURE_MEMORIES,
+    LABELED_QUERIES,
+    LabeledQuery,
+    distractor_memories,
+)
+from chat_with_memory.tools.memory_models import BaseMemory
+from chat_with_memory.tools.memory_query_tool import (
+    MemoryQueryInputSchema,
+    MemoryQueryTool,
+)
+from chat_with_memory.tools.memory_store_tool import (
+    MemoryStoreInputSchema,
+    MemoryStoreTool,
+)
+
+Reranker = Callable[[str, List[BaseMemory]], List[BaseMemory]]
+
+
+class EmbeddingCache(EmbeddingFunction[Documents]):
+    """Embedding function that remembers every vector it has produced.
+
+    With a cache file, a run that embedded the fixtures once can be replayed
+    offline, and every configuration is scored on identical vectors.
+    """
+
+    def __init__(
+        self,
+        embedding_function: Optional[EmbeddingFunction[Documents]],
+        cache_path: Optional[str] = None,
+    ) -> None:
+        """Initialize the cache.
+
+        Args:
+            embedding_function: Embedding function used for texts not in the cache.
+                If None, only cached texts can be embedded.
+            cache_path: Optional .npz file the cache is loaded from and saved to
+        """
+        self.embedding_function = embedding_function
+        self.cache_path = cache_path
+        self.vectors: Dict[str, np.ndarray] = {}
+        if cache_path and os.path.exists(cache_path):
+            with np.load(cache_path) as cached:
+                self.vectors = dict(zip(cached["texts"].tolist(), cached["vectors"]))
+
+    def __call__(self, input: Documents) -> Embeddings:
+        missing = [text for text in dict.fromkeys(input) if text not in self.vectors]
+        if missing:
+            if self.embedding_function is None:
+                raise KeyError(f"{len(missing)} texts are not in the embedding cache")
+            for text, vector in zip(missing, self.embedding_function(missing)):
+                self.vectors[text] = np.asarray(vector, dtype=np.float32)
+        return [self.vectors[text] for text in input]
+
+    def save(self) -> None:
+        if not self.cache_path or not self.vectors:
+            return
+        texts = list(self.vectors)
+        np.savez(
+            self.cache_path,
+            texts=np.asarray(texts),
+            vectors=np.stack([self.vectors[text] for text in texts]),
+        )
+
+
+def lexical_rerank(query: str, memories: List[BaseMemory]) -> List[BaseMemory]:
+    """Re-rank by the number of query words a memory contains, keeping ties in order."""
+    query_words = set(re.findall(r"\w+", query.lower()))
+    overlaps = [
+        len(query_words.intersection(re.findall(r"\w+", memory.content.lower())))
+        for memory in memories
+    ]
+    order = sorted(range(len(memories)), key=lambda i: -overlaps[i])
+    return [memories[i] for i in order]
+
+
+RERANKERS: Dict[str, Reranker] = {"lexical": lexical_rerank}
+
+
+@dataclass(frozen=True)
+class RetrievalConfig:
+    """A retrieval setup to evaluate."""
+
+    name: str
+    n_results: int = 5
+    type_filter: bool = False
+    backend: Literal["auto", "chroma", "numpy", "clustered"] = "chroma"
+    index_profile: Optional[str] = None
+    quantization: Optional[QuantizationMethod] = None
+    reranker: Optional[str] = None
+    rerank_depth: int = 3
+    distractors: int = 0
+
+
+DEFAULT_CONFIGS = [
+    RetrievalConfig("chroma k=5"),
+    RetrievalConfig("chroma k=3", n_results=3),
+    RetrievalConfig("chroma k=5 + type filter", type_filter=True),
+    RetrievalConfig("chroma large k=5", index_profile="large"),
+    RetrievalConfig("chroma k=5 + lexical rerank", reranker="lexical"),
+    RetrievalConfig("numpy k=5", backend="numpy"),
+    RetrievalConfig("numpy int8 k=5", backend="numpy", quantization="int8"),
+    RetrievalConfig("numpy pq k=5", backend="numpy", quantization="pq"),
+    RetrievalConfig("clustered k=5", backend="clustered"),
+    # Large enough for the quantizers to be trained while memories arrive one
+    # at a time, as they do in a conversation
+    RetrievalConfig("numpy k=5 + 2000 distractors", backend="numpy", distractors=2000),
+    RetrievalConfig(
+        "numpy int8 k=5 + 2000 distractors",
+        backend="numpy",
+        quantization="int8",
+        distractors=2000,
+    ),
+    RetrievalConfig(
+        "numpy pq k=5 + 2000 distractors",
+        backend="numpy",
+        quantization="pq",
+        distractors=2000,
+    ),
+]
+
+
+def evaluate_config(
+    config: RetrievalConfig,
+    db_service: ChromaDBService,
+    memories: Dict[str, BaseMemory],
+    queries: Sequence[LabeledQuery],
+    repeats: int = 5,
+) -> Dict[str, float]:
+    """Store the fixture memories, run the labeled queries and score the results.
+
+    Memories, including the config's distractors, are stored one at a time in a
+    shuffled order. Queries are run once untimed so embeddings and in-memory
+    indexes are warm; latency then covers only the retrieval path, measured over
+    repeats passes.
+
+    Args:
+        config: Retrieval configuration to evaluate
+        db_service: Empty service built for the configuration
+        memories: Fixture memories keyed by label, including any distractors
+        queries: Labeled queries referring to memory labels
+        repeats: Number of timed passes over the queries
+
+    Returns:
+        Dict[str, float]: recall@k, MRR and p50/p99 latency in milliseconds
+    """
+    store_tool = MemoryStoreTool(db_service=db_service)
+    query_tool = MemoryQueryTool(db_service=db_service)
+    stored = list(memories.values())
+    random.Random(0).shuffle(stored)
+    for memory in stored:
+        store_tool.run(MemoryStoreInputSchema(memory=memory))
+    labels = {memory.content: label for label, memory in memories.items()}
+    reranker = RERANKERS[config.reranker] if config.reranker else None
+    fetch = config.n_results * (config.rerank_depth if reranker else 1)
+
+    def retrieve(labeled_query: LabeledQuery) -> List[str]:
+        retrieved = query_tool.run(
+            MemoryQueryInputSchema(
+                query=labeled_query["query"],
+                n_results=fetch,
+                memory_type=(
+                    labeled_query["memory_type"] if config.type_filter else None
+                ),
+            )
+        ).memories
+        if reranker:
+            retrieved = reranker(labeled_query["query"], retrieved)
+        return [labels[memory.content] for memory in retrieved[: config.n_results]]
+
+    recalls = []
+    reciprocal_ranks = []
+    for labeled_query in queries:
+        ranked = retrieve(labeled_query)
+        relevant = set(labeled_query["relevant"])
+        recalls.append(len(relevant.intersection(ranked)) / len(relevant))
+        reciprocal_ranks.append(
+            next(
+                (1 / rank for rank, label in enumerate(ranked, 1) if label in relevant),
+                0.0,
+            )
+        )
+
+    latencies = []
+    for _ in range(repeats):
+        for labeled_query in queries:
+            start = time.perf_counter()
+            retrieve(labeled_query)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "recall": float(np.mean(recalls)),
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def run_eval(
+    configs: Optional[List[RetrievalConfig]] = None,
+    stub_embeddings: bool = False,
+    cache_path: Optional[str] = None,
+    repeats: int = 5,
+) -> Dict[str, Dict[str, float]]:
+    """Evaluate retrieval configurations on the fixture corpus side by side.
+
+    Args:
+        configs: Configurations to evaluate; defaults to DEFAULT_CONFIGS
+        stub_embeddings: If True, uses deterministic hashed embeddings instead of
+            OpenAI, so the run needs no network access
+        cache_path: Optional .npz file caching embeddings between runs
+        repeats: Number of timed passes over the queries per configuration
+
+    Returns:
+        Dict[str, Dict[str, float]]: Metrics per configuration name
+    """
+    console = Console()
+    if stub_embeddings:
+        base_embedding_function = HashEmbeddingFunction()
+    else:
+        from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+
+        base_embedding_function = OpenAIEmbeddingFunction(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            model_name="text-embedding-3-small",
+        )
+    embedding_function = EmbeddingCache(base_embedding_function, cache_path)
+
+    console.print(
+        f"\n[bold blue]Evaluating {len(configs or DEFAULT_CONFIGS)} configurations "
+        f"on {len(FIXTURE_MEMORIES)} memories and {len(LABELED_QUERIES)} "
+        f"queries[/bold blue]"
+    )
+
+    table = Table(title="Retrieval evaluation")
+    table.add_column("Configuration", style="cyan")
+    table.add_column("Recall@k", justify="right", style="green")
+    table.add_column("MRR", justify="right", style="green")
+    table.add_column("p50 (ms)", justify="right")
+    table.add_column("p99 (ms)", justify="right")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as persist_directory:
+        for position, config in enumerate(configs or DEFAULT_CONFIGS):
+            memories = {
+                **FIXTURE_MEMORIES,
+                **distractor_memories(config.distractors),
+            }
+            # Embed the whole corpus in one batch rather than a call per memory
+            embedding_function([memory.content for memory in memories.values()])
+            db_service = ChromaDBService(
+                collection_name=f"eval_{position}",
+                persist_directory=persist_directory,
+                index_profile=config.index_profile,
+                backend=config.backend,
+                quantization=config.quantization,
+                embedding_function=embedding_function,
+            )
+            metrics = evaluate_config(
+                config, db_service, memories, LABELED_QUERIES, repeats
+            )
+            results[config.name] = metrics
+            table.add_row(
+                f"{config.name}",
+                f"{metrics['recall']:.3f}",
+                f"{metrics['mrr']:.3f}",
+                f"{metrics['p50_ms']:.2f}",
+                f"{metrics['p99_ms']:.2f}",
+            )
+
+    embedding_function.save()
+    console.print(table)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Offline retrieval quality vs. latency evaluation"
+    )
+    parser.add_argument(
+        "--stub-embeddings",
+        action="store_true",
+        help="Use deterministic hashed embeddings instead of OpenAI",
+    )
+    parser.add_argument(
+        "--cache", help="Embedding cache file (.npz) to replay runs offline"
+    )
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument(
+        "--configs",
+        nargs="+",
+        help="Names of the configurations to run (default: all)",
+    )
+    args = parser.parse_args()
+
+    configs = DEFAULT_CONFIGS
+    if args.configs:
+        configs = [config for config in DEFAULT_CONFIGS if config.name in args.configs]
+        if not configs:
+            parser.error(
+                "No matching configurations. Available: "
+                + ", ".join(config.name for config in DEFAULT_CONFIGS)
+            )
+
+    run_eval(
+        configs=configs,
+        stub_embeddings=args.stub_embeddings,
+        cache_path=args.cache,
+        repeats=args.repeats,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from chat_with_memory.services.numpy_index import NumpyIndex
+from chat_with_memory.services.quantization import create_quantizer
+
+ROWS = 1500
+DIMENSIONS = 64
+K = 5
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(ROWS, DIMENSIONS)).astype(np.float32)
+    queries = vectors[:50] + 0.1 * rng.normal(size=(50, DIMENSIONS)).astype(
+        np.float32
+    )
+    return vectors, queries
+
+
+def exact_top_k(vectors, query, k):
+    return set(np.argsort(((vectors - query) ** 2).sum(axis=1))[:k].tolist())
+
+
+def build_incrementally(vectors, **options):
+    """Store rows one at a time, the way memories are stored during a chat."""
+    index = NumpyIndex(space="l2", initial_capacity=16, **options)
+    for row, vector in enumerate(vectors):
+        index.add([str(row)], [vector], metadatas=[{"row": row}])
+    return index
+
+
+def recall(index, vectors, queries):
+    hits = 0
+    for query in queries:
+        found = {int(id_) for id_ in index.query(query, K)["ids"]}
+        hits += len(found & exact_top_k(vectors, query, K))
+    return hits / (K * len(queries))
+
+
+@pytest.mark.parametrize(
+    "method, options",
+    [
+        ("int8", {}),
+        ("pq", {"rerank": True}),
+    ],
+)
+def test_incremental_quantized_recall(corpus, method, options):
+    vectors, queries = corpus
+    rerank_source = None
+    if options.get("rerank"):
+        rerank_source = lambda ids: vectors[[int(id_) for id_ in ids]]
+    index = build_incrementally(
+        vectors,
+        quantizer=create_quantizer(method, pq_subspaces=16),
+        rerank_source=rerank_source,
+        min_training_rows=256,
+    )
+
+    assert index.quantized
+    assert recall(index, vectors, queries) >= 0.9
+
+
+def test_rows_stay_float_until_training(corpus):
+    vectors, queries = corpus
+    index = build_incrementally(
+        vectors[:100], quantizer=create_quantizer("int8"), min_training_rows=256
+    )
+
+    assert not index.quantized
+    assert index.dtype == np.float32
+    assert recall(index, vectors[:100], queries[:10]) == 1.0
+
+
+def test_needs_rebuild_after_growth(corpus):
+    vectors, _ = corpus
+    index = build_incrementally(
+        vectors[:600],
+        quantizer=create_quantizer("int8"),
+        min_training_rows=256,
+        retrain_growth=1.0,
+    )
+    assert index.needs_rebuild
+
+    rebuilt = NumpyIndex(
+        space="l2", quantizer=create_quantizer("int8"), min_training_rows=256
+    )
+    rebuilt.add([str(row) for row in range(600)], vectors[:600])
+    assert rebuilt.quantized
+    assert not rebuilt.needs_rebuild
@@ -0,0 +1,130 @@
+import os
+
+import pytest
+
+from chat_with_memory.services.hash_embeddings import HashEmbeddingFunction
+from chat_with_memory.services.sharded_chroma_db import (
+    SHARD_ID_FILE,
+    ShardedChromaDBService,
+    read_shard_id,
+)
+
+TENANTS = [f"user-{number}" for number in range(8)]
+
+
+@pytest.fixture
+def open_service(tmp_path):
+    services = []
+
+    def open_service(shard_names, **options):
+        service = ShardedChromaDBService(
+            "memories",
+            [str(tmp_path / name) for name in shard_names],
+            embedding_function=HashEmbeddingFunction(),
+            **options,
+        )
+        services.append(service)
+        return service
+
+    yield open_service
+    for service in services:
+        service.close()
+
+
+def add_memories(service, count):
+    ids = [f"memory-{number}" for number in range(count)]
+    service.add_documents(
+        [f"memory number {number}" for number in range(count)],
+        [{"tenant": TENANTS[number % len(TENANTS)]} for number in range(count)],
+        ids,
+    )
+    return ids
+
+
+def test_delete_during_add_shard_is_not_revived(tmp_path, open_service):
+    service = open_service(["shard-0"])
+    ids = add_memories(service, 40)
+
+    # Delete a row after the move read it but before its copy is written
+    submit = service._submit
+    deleted = []
+
+    def submit_deleting_first_copied_row(shard, method, *args):
+        if method == "add_documents" and service._rebalancing and not deleted:
+            deleted.append(args[2][0])
+            service.delete_by_ids(deleted)
+        return submit(shard, method, *args)
+
+    service._submit = submit_deleting_first_copied_row
+    moved = service.add_shard(str(tmp_path / "shard-1"))
+    service._submit = submit
+
+    assert moved > 0 and deleted
+    assert service.get_count() == len(ids) - 1
+    assert service.get_documents(deleted)["ids"] == []
+    remaining = [id_ for id_ in ids if id_ not in deleted]
+    assert service.get_documents(remaining)["ids"] == remaining
+
+
+def test_rows_on_two_shards_are_merged(open_service):
+    service = open_service(["shard-0", "shard-1"])
+    add_memories(service, 10)
+
+    # A row being moved exists on its old and its new shard for a moment
+    embedding = service.embedding_function(["memory number 3"])[0]
+    for shard in service.shards:
+        service._submit(
+            shard,
+            "add_documents",
+            ["memory number 3"],
+            [{"tenant": TENANTS[3]}],
+            ["memory-3"],
+            [embedding],
+        ).result()
+
+    results = service.query_embedding(embedding, n_results=5)
+    assert results["ids"].count("memory-3") == 1
+    assert len(results["ids"]) == len(set(results["ids"])) == 5
+    assert service.get_documents(["memory-3"])["ids"] == ["memory-3"]
+
+
+def test_tenant_rows_and_queries_stay_on_one_shard(open_service):
+    service = open_service(["shard-0", "shard-1", "shard-2"], shard_by="tenant")
+    add_memories(service, 48)
+
+    for tenant in TENANTS:
+        owner = service.shard_for(tenant)
+        for shard in service.shards:
+            rows = service._submit(shard, "routing_keys", "tenant").result()
+            holds_tenant = any(key == tenant for _, key in rows)
+            assert holds_tenant == (shard == owner)
+
+    queried = []
+    submit = service._submit
+
+    def recording_submit(shard, method, *args):
+        if method == "query_embedding":
+            queried.append(shard)
+        return submit(shard, method, *args)
+
+    service._submit = recording_submit
+    embedding = service.embedding_function(["memory number"])[0]
+    results = service.query_embedding(
+        embedding, n_results=10, where={"tenant": TENANTS[2]}
+    )
+    service._submit = submit
+
+    assert queried == [service.shard_for(TENANTS[2])]
+    assert len(results["ids"]) == 6
+    assert {metadata["tenant"] for metadata in results["metadatas"]} == {TENANTS[2]}
+
+
+def test_existing_directory_gets_a_random_shard_id(tmp_path):
+    directory = tmp_path / "shard-0"
+    directory.mkdir()
+    (directory / "chroma.sqlite3").write_text("")
+
+    shard_id = read_shard_id(str(directory))
+    assert shard_id != os.path.normpath(str(directory))
+    assert (directory / SHARD_ID_FILE).read_text() == shard_id
+    assert read_shard_id(str(directory)) == shard_id
@@ -0,0 +1,123 @@
+import json
+import os
+
+import pytest
+
+from chat_with_memory.services.write_ahead_log import BackgroundFlusher, WriteAheadLog
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return str(tmp_path / "memories.wal")
+
+
+def payloads(wal):
+    return [payload for _, payload in wal.pending()]
+
+
+def test_torn_final_line_is_dropped(log_path):
+    wal = WriteAheadLog(log_path)
+    wal.append([{"n": 1}, {"n": 2}])
+    wal.close()
+    intact_size = os.path.getsize(log_path)
+    with open(log_path, "a") as log:
+        log.write('{"seq": 3, "payload": {"n"')
+
+    wal = WriteAheadLog(log_path)
+    assert payloads(wal) == [{"n": 1}, {"n": 2}]
+    assert os.path.getsize(log_path) == intact_size
+
+    # Appends continue after the last intact entry
+    assert wal.append([{"n": 3}]) == [3]
+    wal.close()
+    wal = WriteAheadLog(log_path)
+    assert payloads(wal) == [{"n": 1}, {"n": 2}, {"n": 3}]
+    wal.close()
+
+
+def test_checkpoint_replays_only_unapplied_entries(log_path):
+    wal = WriteAheadLog(log_path)
+    wal.append([{"n": 1}, {"n": 2}, {"n": 3}])
+    wal.mark_applied(2)
+    wal.close()
+
+    wal = WriteAheadLog(log_path)
+    assert wal.pending() == [(3, {"n": 3})]
+    wal.mark_applied(3)
+    wal.close()
+
+    wal = WriteAheadLog(log_path)
+    assert wal.pending() == []
+    assert wal.append([{"n": 4}]) == [4]
+    wal.close()
+
+
+def test_fully_applied_log_is_truncated(log_path):
+    wal = WriteAheadLog(log_path, max_log_bytes=0)
+    wal.append([{"n": 1}])
+    wal.mark_applied(1)
+    wal.append([{"n": 2}])
+    wal.close()
+
+    with open(log_path) as log:
+        assert [json.loads(line)["seq"] for line in log] == [2]
+    wal = WriteAheadLog(log_path)
+    assert wal.pending() == [(2, {"n": 2})]
+    wal.close()
+
+
+def test_permanent_failures_are_quarantined(log_path):
+    applied = []
+
+    def apply(batch):
+        if any(payload.get("bad") for payload in batch):
+            raise ValueError("invalid memory")
+        applied.extend(payload["n"] for payload in batch)
+
+    wal = WriteAheadLog(log_path)
+    flusher = BackgroundFlusher(wal, apply, interval=0.01)
+    wal.append([{"n": 1}, {"n": 2, "bad": True}, {"n": 3}])
+    flusher.notify()
+    assert flusher.close(timeout=10)
+    wal.close()
+
+    assert applied == [1, 3]
+    assert flusher.quarantined == 1
+    with open(f"{log_path}.dead") as dead:
+        records = [json.loads(line) for line in dead]
+    assert [(record["seq"], record["payload"]["n"]) for record in records] == [(2, 2)]
+    assert records[0]["error"] == "ValueError: invalid memory"
+
+    # Quarantined entries are not replayed after a restart
+    wal = WriteAheadLog(log_path)
+    assert wal.pending() == []
+    wal.close()
+
+
+def test_transient_failures_are_retried(log_path):
+    applied = []
+    failures = [ConnectionError("connection reset")]
+
+    def apply(batch):
+        if failures:
+            raise failures.pop()
+        applied.extend(payload["n"] for payload in batch)
+
+    wal = WriteAheadLog(log_path)
+    flusher = BackgroundFlusher(wal, apply, interval=0.01)
+    wal.append([{"n": 1}, {"n": 2}])
+    flusher.notify()
+    assert flusher.close(timeout=10)
+    wal.close()
+
+    assert applied == [1, 2]
+    assert flusher.quarantined == 0
+
+
+def test_second_writer_is_rejected(log_path):
+    wal = WriteAheadLog(log_path)
+    with pytest.raises(RuntimeError):
+        WriteAheadLog(log_path)
+    wal.close()
+
+    WriteAheadLog(log_path).close()